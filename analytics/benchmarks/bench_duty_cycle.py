@@ -0,0 +1,65 @@
+"""
+Crunches 90 days of synthetic 5-minute heartbeats for a fleet and compares
+the vectorized duty-cycle code with a per-event Python loop. The vectorized
+reports should take under BUDGET_SECONDS per 100 devices.
+
+Usage: python analytics/benchmarks/bench_duty_cycle.py [devices]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from analytics.duty_cycle import DAY, DEFAULT_MAX_GAP, daily_report, summarize
+from analytics.events import EventArrays, STATE_ON
+
+START = 1767225600
+DAYS = 90
+BUDGET_SECONDS = 5.0
+
+
+def synthetic_fleet(devices, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = START + np.arange(0, DAYS * DAY, 300, dtype=np.int64)
+    return [EventArrays(f"boiler-{n}", timestamps, (rng.random(len(timestamps)) < 0.3).astype(np.int8))
+            for n in range(devices)]
+
+
+def loop_on_seconds(events, end):
+    """The straightforward per-event version, for comparison"""
+    total = 0
+    timestamps, states = events.timestamps.tolist(), events.states.tolist()
+    for i, (timestamp, state) in enumerate(zip(timestamps, states)):
+        following = timestamps[i + 1] if i + 1 < len(timestamps) else end
+        if state == STATE_ON and following - timestamp <= DEFAULT_MAX_GAP:
+            total += following - timestamp
+    return total
+
+
+def run(devices):
+    fleet = synthetic_fleet(devices)
+    end = START + DAYS * DAY
+    print(f"{devices} devices x {DAYS} days = {devices * len(fleet[0].timestamps):,} events")
+
+    started = time.perf_counter()
+    for events in fleet:
+        daily_report(events, START, end)
+        summarize(events, START, end)
+    vectorized = time.perf_counter() - started
+    budget = BUDGET_SECONDS * devices / 100
+    verdict = "within" if vectorized < budget else "OVER"
+    print(f"vectorized daily report + summary: {vectorized:.2f}s ({verdict} the {budget:.1f}s budget)")
+
+    started = time.perf_counter()
+    sample = fleet[:max(1, devices // 10)]
+    for events in sample:
+        assert loop_on_seconds(events, end) == summarize(events, START, end).on_seconds
+    loop = (time.perf_counter() - started) / len(sample) * devices
+    print(f"per-event loop (on-time only, extrapolated): {loop:.2f}s")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,118 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .events import STATE_ON, STATE_UNKNOWN
+
+# Runtime analytics over event arrays (see events.py), using interval
+# arithmetic instead of per-event loops. Event i holds from timestamps[i]
+# until the next event; an interval longer than `max_gap` means the device
+# was silent, so its state over that interval is unknown.
+
+DAY = 86400
+HOUR = 3600
+
+# The edge publishes on every state change plus a heartbeat once a day
+# (HEARTBEAT_INTERVAL in hardware/src/monitor.py), so a pump can run for hours
+# between two events. Only a missed heartbeat, with the same grace as the
+# liveness check (infrastructure/stacks/heating_monitor_stack.py), is an outage.
+HEARTBEAT_INTERVAL = DAY
+HEARTBEAT_GRACE = HOUR
+DEFAULT_MAX_GAP = HEARTBEAT_INTERVAL + HEARTBEAT_GRACE
+
+# Cycle-length histogram bins, in minutes
+DEFAULT_CYCLE_BINS = (0, 1, 2, 5, 10, 15, 30, 60, 120, 240, np.inf)
+
+Intervals = namedtuple("Intervals", ["starts", "durations", "on", "gap"])
+Summary = namedtuple("Summary", [
+    "device_id", "on_seconds", "known_seconds", "duty_cycle", "cycles", "mean_cycle_seconds",
+    "gap_seconds", "gaps",
+])
+
+
+def intervals(events, start, end, max_gap=DEFAULT_MAX_GAP):
+    """Per-event intervals clipped to [start, end): when each state began, how long it held, on/gap flags"""
+    timestamps = np.clip(events.timestamps, start, end)
+    durations = np.diff(np.append(timestamps, end))
+    gap = durations > max_gap
+    on = (events.states == STATE_ON) & ~gap
+    unknown = events.states == STATE_UNKNOWN
+    return Intervals(timestamps, durations, on, gap | unknown)
+
+
+def cumulative_on(iv, points):
+    """On-seconds from the first event up to each of `points` (sorted), vectorized"""
+    if len(iv.starts) == 0:
+        return np.zeros(len(points), dtype=np.int64)
+    on_durations = np.where(iv.on, iv.durations, 0)
+    before = np.concatenate(([0], np.cumsum(on_durations)))
+    index = np.searchsorted(iv.starts, points, side="right") - 1
+    inside = index >= 0
+    safe = np.maximum(index, 0)
+    partial = np.clip(points - iv.starts[safe], 0, iv.durations[safe]) * iv.on[safe]
+    return np.where(inside, before[safe] + partial, 0)
+
+
+def on_time_per_bucket(iv, start, end, bucket=DAY):
+    """Bucket start times and on-seconds per bucket over [start, end)"""
+    edges = np.arange(start, end + bucket, bucket, dtype=np.int64)
+    edges[-1] = min(edges[-1], end)
+    return edges[:-1], np.diff(cumulative_on(iv, edges))
+
+
+def cycles(iv):
+    """(start, length) arrays of every on-cycle: consecutive on intervals, however many heartbeats they span"""
+    on = iv.on.astype(np.int8)
+    change = np.diff(np.concatenate(([0], on, [0])))
+    first = np.flatnonzero(change == 1)
+    last = np.flatnonzero(change == -1) - 1
+    starts = iv.starts[first]
+    ends = iv.starts[last] + iv.durations[last]
+    return starts, ends - starts
+
+
+def cycles_per_bucket(cycle_starts, start, end, bucket=DAY):
+    edges = np.arange(start, end + bucket, bucket, dtype=np.int64)
+    counts, _ = np.histogram(cycle_starts, bins=edges)
+    return counts
+
+
+def cycle_histogram(cycle_lengths, bins=DEFAULT_CYCLE_BINS):
+    """Counts of cycle lengths per bin (bins in minutes)"""
+    counts, _ = np.histogram(cycle_lengths / 60.0, bins=np.asarray(bins, dtype=float))
+    return counts
+
+
+def gaps(iv):
+    """(start, duration) arrays of the silent or unknown stretches"""
+    return iv.starts[iv.gap], iv.durations[iv.gap]
+
+
+def summarize(events, start, end, max_gap=DEFAULT_MAX_GAP):
+    iv = intervals(events, start, end, max_gap)
+    cycle_starts, cycle_lengths = cycles(iv)
+    gap_starts, gap_durations = gaps(iv)
+    on_seconds = int(iv.durations[iv.on].sum())
+    gap_seconds = int(gap_durations.sum())
+    # Before the first event nothing is known either
+    leading = int(iv.starts[0] - start) if len(iv.starts) else end - start
+    known_seconds = end - start - gap_seconds - leading
+    return Summary(
+        device_id=events.device_id,
+        on_seconds=on_seconds,
+        known_seconds=known_seconds,
+        duty_cycle=on_seconds / known_seconds if known_seconds else 0.0,
+        cycles=len(cycle_starts),
+        mean_cycle_seconds=float(cycle_lengths.mean()) if len(cycle_lengths) else 0.0,
+        gap_seconds=gap_seconds + leading,
+        gaps=len(gap_starts) + (1 if leading else 0),
+    )
+
+
+def daily_report(events, start, end, max_gap=DEFAULT_MAX_GAP):
+    """Rows of (day start, on hours, cycles started) for every day in [start, end); `start` should be a midnight"""
+    iv = intervals(events, start, end, max_gap)
+    days, on_seconds = on_time_per_bucket(iv, start, end, DAY)
+    cycle_starts, _ = cycles(iv)
+    counts = cycles_per_bucket(cycle_starts, start, end, DAY)
+    return list(zip(days.tolist(), (on_seconds / HOUR).round(2).tolist(), counts.tolist()))
@@ -0,0 +1,114 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Reads a device's history from HeatingEventsTable (partition key device_id,
+# sort key timestamp) straight into NumPy arrays. A time range is split into
+# segments that are queried and paginated concurrently.
+
+# Pump state per event, from sensor_voltage (1 while the pump runs, also in heartbeats)
+STATE_OFF = 0
+STATE_ON = 1
+STATE_UNKNOWN = -1
+
+DEFAULT_SEGMENTS = 4
+PAGE_SIZE = 1000
+
+EventArrays = namedtuple("EventArrays", ["device_id", "timestamps", "states"])
+
+# "timestamp" and "status" are DynamoDB reserved words
+_NAMES = {"#ts": "timestamp", "#st": "status"}
+_PROJECTION = "#ts, #st, sensor_voltage"
+
+# Payload 2.0 sort keys are seconds with six decimals (milliseconds and a
+# sequence number, infrastructure/stacks/iot_rules.py); 1.0 keys are whole seconds
+LAST_KEY_IN_SECOND = ".999999"
+
+
+def item_state(item):
+    status = item.get("status", {}).get("S")
+    if status == "UNKNOWN" or "sensor_voltage" not in item:
+        return STATE_UNKNOWN
+    return STATE_ON if item["sensor_voltage"]["N"] == "1" else STATE_OFF
+
+
+def _query_pages(client, table_name, device_id, low, high):
+    """All items of one device in the whole seconds low..high, page by page"""
+    kwargs = {
+        "TableName": table_name,
+        "KeyConditionExpression": "device_id = :d AND #ts BETWEEN :lo AND :hi",
+        "ExpressionAttributeNames": _NAMES,
+        "ExpressionAttributeValues": {
+            ":d": {"S": device_id}, ":lo": {"N": str(low)}, ":hi": {"N": f"{high}{LAST_KEY_IN_SECOND}"}
+        },
+        "ProjectionExpression": _PROJECTION,
+        "Limit": PAGE_SIZE,
+    }
+    items = []
+    while True:
+        response = client.query(**kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _state_before(client, table_name, device_id, start):
+    """The last event before `start`, which says what the pump was doing when the range begins"""
+    response = client.query(
+        TableName=table_name,
+        KeyConditionExpression="device_id = :d AND #ts < :start",
+        ExpressionAttributeNames=_NAMES,
+        ExpressionAttributeValues={":d": {"S": device_id}, ":start": {"N": str(start)}},
+        ProjectionExpression=_PROJECTION,
+        ScanIndexForward=False,
+        Limit=1,
+    )
+    return response.get("Items", [])
+
+
+def _to_arrays(device_id, items):
+    # Whole seconds: events within one second become zero-length intervals
+    timestamps = np.fromiter((int(float(item["timestamp"]["N"])) for item in items), dtype=np.int64, count=len(items))
+    states = np.fromiter((item_state(item) for item in items), dtype=np.int8, count=len(items))
+    return EventArrays(device_id, timestamps, states)
+
+
+def segment_bounds(start, end, segments):
+    """Inclusive [low, high] pairs covering [start, end) without overlap"""
+    edges = np.linspace(start, end, segments + 1).astype(np.int64)
+    return [(int(low), int(high) - 1) for low, high in zip(edges[:-1], edges[1:]) if high > low]
+
+
+def fetch_events(client, table_name, device_id, start, end, segments=DEFAULT_SEGMENTS, executor=None):
+    """
+    Events of one device in [start, end) as sorted arrays. The event preceding
+    the range, if any, is included with its timestamp moved to `start`.
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=segments + 1)
+    try:
+        before = executor.submit(_state_before, client, table_name, device_id, start)
+        parts = [executor.submit(_query_pages, client, table_name, device_id, low, high)
+                 for low, high in segment_bounds(start, end, segments)]
+        items = [item for part in parts for item in part.result()]
+        previous = before.result()
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    events = _to_arrays(device_id, previous + items)
+    if previous:
+        events.timestamps[0] = start
+    return events
+
+
+def fetch_fleet(client, table_name, device_ids, start, end, segments=DEFAULT_SEGMENTS, workers=16):
+    """{device_id: EventArrays} for many devices, all segment queries sharing one pool"""
+    # Device-level tasks wait on segment tasks, so they get their own pool
+    with ThreadPoolExecutor(max_workers=workers) as queries, ThreadPoolExecutor(max_workers=workers) as devices:
+        futures = {device_id: devices.submit(fetch_events, client, table_name, device_id, start, end, segments, queries)
+                   for device_id in device_ids}
+        return {device_id: future.result() for device_id, future in futures.items()}
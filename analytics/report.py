@@ -0,0 +1,72 @@
+import argparse
+import calendar
+import csv
+import sys
+import time
+from datetime import datetime, timezone
+
+from .duty_cycle import DEFAULT_MAX_GAP, DAY, daily_report, summarize
+from .events import fetch_fleet
+
+# Pump runtime per device and day, straight from HeatingEventsTable:
+#
+#   python -m analytics.report --table <HeatingEventsTable name> --devices heating-pump-pi-01 --month 2026-01
+
+
+def month_range(month):
+    year, number = (int(part) for part in month.split("-"))
+    start = calendar.timegm((year, number, 1, 0, 0, 0))
+    return start, start + calendar.monthrange(year, number)[1] * DAY
+
+
+def last_days_range(days, now=None):
+    today = int(now if now is not None else time.time()) // DAY * DAY
+    return today - (days - 1) * DAY, today + DAY
+
+
+def read_devices(value):
+    """Comma-separated device ids, or @file with one id per line"""
+    if value.startswith("@"):
+        with open(value[1:]) as f:
+            return [line.strip() for line in f if line.strip()]
+    return [device.strip() for device in value.split(",") if device.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pump runtime per device and day (UTC)")
+    parser.add_argument("--table", required=True, help="HeatingEventsTable name (see the stack outputs)")
+    parser.add_argument("--devices", required=True, help="comma-separated device ids, or @file")
+    period = parser.add_mutually_exclusive_group()
+    period.add_argument("--month", help="YYYY-MM")
+    period.add_argument("--days", type=int, default=30, help="the last N days, including today")
+    parser.add_argument("--max-gap", type=int, default=DEFAULT_MAX_GAP,
+                        help="seconds without events after which the state is unknown")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    import boto3
+    start, end = month_range(args.month) if args.month else last_days_range(args.days)
+    devices = read_devices(args.devices)
+
+    started = time.monotonic()
+    fleet = fetch_fleet(boto3.client("dynamodb"), args.table, devices, start, end, workers=args.workers)
+    fetched = time.monotonic() - started
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["device_id", "date", "on_hours", "cycles"])
+    summaries = []
+    for device_id, events in fleet.items():
+        for day, on_hours, cycle_count in daily_report(events, start, end, args.max_gap):
+            date = datetime.fromtimestamp(day, tz=timezone.utc).strftime("%Y-%m-%d")
+            writer.writerow([device_id, date, on_hours, cycle_count])
+        summaries.append(summarize(events, start, end, args.max_gap))
+
+    events_total = sum(len(events.timestamps) for events in fleet.values())
+    print(f"\n{events_total} events from {len(devices)} devices fetched in {fetched:.1f}s", file=sys.stderr)
+    for summary in summaries:
+        print(f"{summary.device_id}: {summary.on_seconds / 3600:.1f} h on ({summary.duty_cycle:.0%} of known time), "
+              f"{summary.cycles} cycles, {summary.gaps} gaps", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from analytics import events as events_module
+from analytics.duty_cycle import DAY, HOUR, cycle_histogram, cycles, daily_report, intervals, summarize
+from analytics.events import EventArrays, STATE_OFF, STATE_ON, fetch_events, fetch_fleet
+
+MIDNIGHT = 1767225600  # 2026-01-01 00:00 UTC
+
+
+class InMemoryEventsClient:
+    """The low-level DynamoDB query calls analytics/events.py makes, over a local list of items"""
+
+    def __init__(self):
+        self.items = {}
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def put(self, device_id, timestamp, status, sensor_voltage):
+        self.items.setdefault(device_id, {})[timestamp] = {
+            "device_id": {"S": device_id}, "timestamp": {"N": str(timestamp)},
+            "status": {"S": status}, "sensor_voltage": {"N": str(sensor_voltage)},
+        }
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues, Limit,
+              ExpressionAttributeNames=None, ProjectionExpression=None, ScanIndexForward=True,
+              ExclusiveStartKey=None):
+        with self._lock:
+            self.queries += 1
+        values = {key: value.get("N", value.get("S")) for key, value in ExpressionAttributeValues.items()}
+        rows = self.items.get(values[":d"], {})
+        if "BETWEEN" in KeyConditionExpression:
+            keys = [t for t in rows if float(values[":lo"]) <= t <= float(values[":hi"])]
+        else:
+            keys = [t for t in rows if t < int(values[":start"])]
+        keys.sort(reverse=not ScanIndexForward)
+        if ExclusiveStartKey is not None:
+            last = int(ExclusiveStartKey["timestamp"]["N"])
+            keys = [t for t in keys if (t > last if ScanIndexForward else t < last)]
+        page = keys[:Limit]
+        response = {"Items": [rows[t] for t in page]}
+        if len(keys) > Limit:
+            response["LastEvaluatedKey"] = {"device_id": {"S": values[":d"]}, "timestamp": {"N": str(page[-1])}}
+        return response
+
+
+def events_of(*pairs):
+    timestamps, states = zip(*pairs)
+    return EventArrays("boiler-a", np.array(timestamps, dtype=np.int64), np.array(states, dtype=np.int8))
+
+
+class TestDutyCycle(unittest.TestCase):
+
+    def test_runtime_cycles_and_gaps_from_intervals(self):
+        """
+        Scenario:
+            The pump runs 01:00-01:30 (with an ACTIVE heartbeat in between),
+            runs again 23:30-00:30 across midnight, and the device is silent
+            for two hours on the second day.
+
+        Expectation:
+            Heartbeats do not split a cycle, the midnight cycle is split
+            between the days, and the silence counts as neither on nor off.
+        """
+        events = events_of(
+            (MIDNIGHT, STATE_OFF),
+            (MIDNIGHT + HOUR, STATE_ON),
+            (MIDNIGHT + HOUR + 600, STATE_ON),          # heartbeat
+            (MIDNIGHT + HOUR + 1800, STATE_OFF),
+            (MIDNIGHT + 23 * HOUR + 1800, STATE_ON),
+            (MIDNIGHT + DAY + 1800, STATE_OFF),
+            (MIDNIGHT + DAY + 2 * HOUR, STATE_OFF),     # silent before this one
+        )
+        start, end = MIDNIGHT, MIDNIGHT + 2 * DAY
+
+        rows = daily_report(events, start, end, max_gap=4 * HOUR)
+        self.assertEqual(rows, [(MIDNIGHT, 1.0, 2), (MIDNIGHT + DAY, 0.5, 0)])
+
+        summary = summarize(events, start, end, max_gap=HOUR)
+        self.assertEqual(summary.on_seconds, 1800 + 3600)
+        self.assertEqual(summary.cycles, 2)
+        self.assertEqual(summary.mean_cycle_seconds, 2700.0)
+        # Longer than max_gap: 01:30-23:30, 00:30-02:00 and 02:00-24:00 on the second day
+        self.assertEqual(summary.gaps, 3)
+        self.assertEqual(summary.known_seconds, HOUR + 1800 + HOUR)
+
+    def test_change_only_events_with_default_gap(self):
+        """
+        Scenario:
+            As the edge publishes: state changes only, the pump running
+            08:00-10:00, then a daily heartbeat and nothing for two days.
+
+        Expectation:
+            The two-hour run counts in full; only the time before the first
+            event and the silence after the missed heartbeat are gaps.
+        """
+        events = events_of(
+            (MIDNIGHT + 8 * HOUR, STATE_ON),
+            (MIDNIGHT + 10 * HOUR, STATE_OFF),
+            (MIDNIGHT + DAY + 10 * HOUR, STATE_OFF),    # heartbeat
+        )
+        start, end = MIDNIGHT, MIDNIGHT + 4 * DAY
+
+        summary = summarize(events, start, end)
+        self.assertEqual(summary.on_seconds, 2 * HOUR)
+        self.assertEqual(summary.cycles, 1)
+        self.assertEqual(summary.gaps, 2)
+        self.assertEqual(summary.known_seconds, DAY + 2 * HOUR)
+        self.assertEqual(daily_report(events, start, end)[0], (MIDNIGHT, 2.0, 1))
+
+    def test_cycle_histogram_in_minutes(self):
+        events = events_of((0, STATE_ON), (90, STATE_OFF), (600, STATE_ON), (600 + 20 * 60, STATE_OFF))
+        _, lengths = cycles(intervals(events, 0, 3000, max_gap=HOUR))
+
+        self.assertEqual(lengths.tolist(), [90, 1200])
+        self.assertEqual(cycle_histogram(lengths, bins=(0, 1, 2, 30, np.inf)).tolist(), [0, 1, 1, 0])
+
+    def test_fetch_pages_segments_and_carries_the_previous_state(self):
+        client = InMemoryEventsClient()
+        client.put("boiler-a", MIDNIGHT - 600, "ACTIVE", 1)  # pump already running at midnight
+        for n in range(1, 50):
+            client.put("boiler-a", MIDNIGHT + n * 300, "HEARTBEAT_OK", 0 if n >= 12 else 1)
+
+        with patch.object(events_module, "PAGE_SIZE", 7):
+            events = fetch_events(client, "events", "boiler-a", MIDNIGHT, MIDNIGHT + DAY, segments=3)
+
+        self.assertEqual(len(events.timestamps), 50)
+        self.assertEqual(events.timestamps[0], MIDNIGHT)
+        self.assertTrue(np.all(np.diff(events.timestamps) > 0))
+        self.assertEqual(summarize(events, MIDNIGHT, MIDNIGHT + DAY).on_seconds, 12 * 300)
+        self.assertGreater(client.queries, 1 + 3)
+
+    def test_ninety_days_of_heartbeats_and_a_fleet_fetch(self):
+        """
+        Heartbeats every 5 minutes for 90 days; the timing for a whole fleet is
+        in analytics/benchmarks/bench_duty_cycle.py
+        """
+        client = InMemoryEventsClient()
+        rng = np.random.default_rng(0)
+        timestamps = MIDNIGHT + np.arange(0, 90 * DAY, 300, dtype=np.int64)
+        events = EventArrays("boiler-0", timestamps, (rng.random(len(timestamps)) < 0.3).astype(np.int8))
+
+        rows = daily_report(events, MIDNIGHT, MIDNIGHT + 90 * DAY)
+        summary = summarize(events, MIDNIGHT, MIDNIGHT + 90 * DAY)
+        self.assertEqual([row[0] for row in rows], list(range(MIDNIGHT, MIDNIGHT + 90 * DAY, DAY)))
+        self.assertEqual(summary.on_seconds, int(events.states.sum()) * 300)
+        self.assertAlmostEqual(sum(row[1] for row in rows), summary.on_seconds / HOUR, delta=90 * 0.005)
+
+        # The fleet fetch returns every device, even unknown ones (empty arrays)
+        client.put("boiler-0", MIDNIGHT, "ACTIVE", 1)
+        fetched = fetch_fleet(client, "events", ["boiler-0", "boiler-x"], MIDNIGHT, MIDNIGHT + DAY)
+        self.assertEqual(len(fetched["boiler-0"].timestamps), 1)
+        self.assertEqual(len(fetched["boiler-x"].timestamps), 0)
+        self.assertEqual(summarize(fetched["boiler-x"], MIDNIGHT, MIDNIGHT + DAY).gaps, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
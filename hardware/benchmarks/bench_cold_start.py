@@ -0,0 +1,55 @@
+"""
+Measures the edge agent's cold-start cost in fresh interpreters.
+
+Reports how long importing monitor.py takes now that the AWS IoT SDK is
+loaded lazily, and how long the deferred SDK import itself takes on this
+machine (run it on the Pi Zero for representative numbers).
+
+Usage: python hardware/benchmarks/bench_cold_start.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+SNIPPETS = {
+    "import monitor (lazy SDK)": "import monitor",
+    "import awscrt + awsiot": "import awscrt.mqtt, awsiot.mqtt_connection_builder",
+}
+
+TIMED = (
+    "import time, sys, io, contextlib\n"
+    "t = time.perf_counter()\n"
+    "with contextlib.redirect_stdout(io.StringIO()):\n"
+    "    {snippet}\n"
+    "sys.stderr.write(str(time.perf_counter() - t))\n"
+)
+
+
+def measure(snippet, runs):
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", TIMED.format(snippet=snippet)],
+            cwd=SRC_DIR, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return None
+        samples.append(float(result.stderr.strip().splitlines()[-1]) * 1000)
+    return samples
+
+
+def run(runs):
+    print(f"{'step':<28} {'median ms':>10} {'max ms':>10}")
+    for name, snippet in SNIPPETS.items():
+        samples = measure(snippet, runs)
+        if samples is None:
+            print(f"{name:<28} {'n/a (not installed)':>21}")
+            continue
+        print(f"{name:<28} {statistics.median(samples):>10.1f} {max(samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
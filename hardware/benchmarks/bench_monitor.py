@@ -0,0 +1,64 @@
+"""
+Drives HeatingMonitor with a synthetic pump trace, off-device. By default the
+trace is replayed in real time through the simulated input and the debounced
+poller; --hot-path pushes it straight into handle_change as fast as possible.
+
+Usage: python hardware/benchmarks/bench_monitor.py [--rate 20] [--duration 10] [--debounce 0.01]
+                                                    [--hot-path --transitions N] [--format json|binary]
+                                                    [--outbox memory|disk] [--burst 0.1] [--seed 0]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HEATING_MONITOR_OUTBOX", ":memory:")
+
+from src import monitor
+from src.simulation import FakeMqttConnection, PumpTrace, fake_mqtt, run_benchmark, run_hot_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20, help="toggles per second of the replayed trace")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of trace to replay")
+    parser.add_argument("--debounce", type=float, default=0.01)
+    parser.add_argument("--hot-path", action="store_true", help="skip input and debounce, replay as fast as possible")
+    parser.add_argument("--transitions", type=int, default=20000,
+                        help="toggles to generate with --hot-path (bursts add more)")
+    parser.add_argument("--format", choices=["json", "binary"], default="json")
+    parser.add_argument("--outbox", choices=["memory", "disk"], default="disk",
+                        help="SQLite outbox in memory or in a temporary file (realistic)")
+    parser.add_argument("--burst", type=float, default=0.1, help="probability of a bounce burst per toggle")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The SDK is not needed against the fake connection
+    monitor.mqtt = fake_mqtt
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor.OUTBOX_PATH = ":memory:" if args.outbox == "memory" else os.path.join(tmp, "outbox.db")
+        connection = FakeMqttConnection()
+        device = monitor.HeatingMonitor(
+            config={"endpoint": "simulated", "payload_format": args.format},
+            connection=connection
+        )
+        if args.hot_path:
+            # One simulated second per 1000 transitions; replayed as fast as possible
+            trace = PumpTrace.synthetic(toggle_rate=1000, duration=args.transitions / 1000,
+                                        burst_probability=args.burst, seed=args.seed)
+            results = run_hot_path(device, connection, trace)
+        else:
+            trace = PumpTrace.synthetic(toggle_rate=args.rate, duration=args.duration,
+                                        burst_probability=args.burst, seed=args.seed)
+            results = run_benchmark(device, connection, trace, debounce=args.debounce)
+        device.cleanup()
+
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        shown = f"{value:.3f}" if isinstance(value, float) else value
+        print(f"{name:<{width}}  {shown}")
+
+
+if __name__ == "__main__":
+    main()
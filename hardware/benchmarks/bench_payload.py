@@ -0,0 +1,47 @@
+"""
+Compares the JSON and binary wire formats for status telemetry.
+
+Usage: python hardware/benchmarks/bench_payload.py [iterations]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import codec
+
+PAYLOAD = {
+    "device_id": "heating-pump-pi-01",
+    "timestamp": 1700000000,
+    "timestamp_ms": 1700000000123,
+    "seq": 42,
+    "status": "INACTIVE",
+    "real_state": "INACTIVE",
+    "sensor_voltage": 0,
+    "metadata": {"location": "Boiler Room", "reason": "event_change", "version": "2.0"}
+}
+
+# MQTT fixed header + topic length prefix + QoS1 packet id, on top of topic and payload
+MQTT_OVERHEAD = 2 + 2 + 2
+
+
+def run(iterations):
+    formats = {
+        codec.FORMAT_JSON: ("home/heating/status", codec.encode_json, json.loads),
+        codec.FORMAT_BINARY: (codec.BINARY_TOPIC, codec.encode_binary, codec.decode_binary),
+    }
+
+    print(f"{'format':<8} {'payload B':>10} {'on wire B':>10} {'encode µs':>10} {'decode µs':>10}")
+    for name, (topic, encode, decode) in formats.items():
+        frame = encode(PAYLOAD)
+        size = len(frame.encode("utf-8") if isinstance(frame, str) else frame)
+        encode_us = timeit.timeit(lambda: encode(PAYLOAD), number=iterations) / iterations * 1e6
+        decode_us = timeit.timeit(lambda: decode(frame), number=iterations) / iterations * 1e6
+        wire = size + len(topic) + MQTT_OVERHEAD
+        print(f"{name:<8} {size:>10} {wire:>10} {encode_us:>10.2f} {decode_us:>10.2f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
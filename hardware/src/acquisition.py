@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# A debounced pump state change, timestamped when the edge was first seen
+StateChange = namedtuple("StateChange", ["status", "timestamp"])
+
+DEBOUNCE_SECONDS = 0.05
+POLL_INTERVAL = 0.05
+
+
+class EdgeAcquisition:
+    """
+    Turns raw pump input edges into debounced state changes.
+
+    On a Raspberry Pi the GPIO driver calls us back on every edge, so nothing
+    runs while the pump is idle. In simulation mode a background poller reads
+    the (simulated) input instead. Either way, a change is only accepted once
+    the input has been stable for the debounce window, and accepted changes
+    are pushed to a thread-safe queue for the publisher.
+
+    Given the asyncio runtime's `loop`, the debounce timer is a
+    `loop.call_later` handle: the driver's callback thread only hands the
+    edge over, instead of starting a timer thread per edge.
+    """
+
+    def __init__(self, read_status, pin, gpio=None, debounce=DEBOUNCE_SECONDS,
+                 poll_interval=POLL_INTERVAL, events=None, loop=None):
+        self.read_status = read_status
+        self.pin = pin
+        self.gpio = gpio
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.events = events if events is not None else queue.Queue()
+        self.loop = loop
+
+        self.last_status = None
+        self._lock = threading.Lock()
+        self._timer = None
+        self._edge_time = None
+        self._stop = threading.Event()
+        self._poller = None
+
+    def start(self):
+        """Emits the initial state and starts listening for edges"""
+        self._stop.clear()
+        with self._lock:
+            self._accept(self.read_status(), time.time())
+
+        if self.gpio is not None:
+            self.gpio.add_event_detect(self.pin, self.gpio.BOTH, callback=self._on_edge)
+        else:
+            self._poller = threading.Thread(target=self._poll_loop, name="pump-poller", daemon=True)
+            self._poller.start()
+
+    def stop(self):
+        """Stops edge detection and any pending debounce timer"""
+        self._stop.set()
+        if self.gpio is not None:
+            self.gpio.remove_event_detect(self.pin)
+        if self._poller is not None:
+            self._poller.join(timeout=1)
+            self._poller = None
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _on_edge(self, channel=None):
+        """GPIO callback: (re)arms the debounce timer on every edge"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._rearm, time.time())
+            return
+        with self._lock:
+            self._rearm(time.time())
+
+    def _rearm(self, edge_time):
+        if self._stop.is_set():
+            return
+        if self._timer is None:
+            self._edge_time = edge_time
+        else:
+            self._timer.cancel()
+        if self.loop is not None:
+            self._timer = self.loop.call_later(self.debounce, self._settle)
+        else:
+            self._timer = threading.Timer(self.debounce, self._settle)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _settle(self):
+        """Runs once the input has been quiet for the debounce window"""
+        # Read, compare and record under one lock, so overlapping settles
+        # (threaded mode) record levels in the order they were read
+        with self._lock:
+            self._timer = None
+            self._accept(self.read_status(), self._edge_time)
+
+    def _poll_loop(self):
+        """Fallback for simulation mode, where there is no edge interrupt"""
+        previous = self.last_status
+        while not self._stop.wait(self.poll_interval):
+            current = self.read_status()
+            if current != previous:
+                previous = current
+                self._on_edge()
+
+    def _accept(self, status, timestamp):
+        """Records a settled level; the caller holds the lock"""
+        if status == self.last_status:
+            return
+        self.last_status = status
+        self.events.put(StateChange(status, timestamp))
@@ -0,0 +1,138 @@
+import math
+
+try:
+    from .sampling import Frame
+except ImportError:  # started directly as a script (systemd)
+    from sampling import Frame
+
+WINDOW_SECONDS = 300
+MIN_POINT_INTERVAL = 10
+
+
+class WindowStats:
+    """Running count/sum/min/max of one channel's samples in the current window"""
+
+    __slots__ = ("count", "total", "minimum", "maximum")
+
+    def __init__(self):
+        self.clear()
+
+    def append(self, value):
+        if self.count == 0:
+            self.minimum = self.maximum = value
+        else:
+            self.minimum = min(self.minimum, value)
+            self.maximum = max(self.maximum, value)
+        self.count += 1
+        self.total += value
+
+    def clear(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = self.maximum = None
+
+
+class ChannelState:
+    __slots__ = ("stats", "last", "published_value", "published_at")
+
+    def __init__(self):
+        self.stats = WindowStats()
+        self.last = None
+        self.published_value = None
+        self.published_at = None
+
+
+class Aggregator:
+    """
+    Sits between the sample scheduler and publish_frame().
+
+    Every numeric reading updates its channel's running statistics. At the end of
+    each window (aligned to multiples of `window` seconds) one "window" frame
+    with min/max/mean/last per channel is emitted. In between, a reading is
+    only published as a "point" frame when it leaves the channel's deadband
+    around the last published value, and at most once per
+    `min_point_interval` seconds. Message volume is therefore bounded by the
+    window length, not by the sample rate, and memory by the number of
+    channels, whatever the window length. close() emits the open window.
+    """
+
+    def __init__(self, sink, window=WINDOW_SECONDS, deadband=None, default_deadband=0.5,
+                 min_point_interval=MIN_POINT_INTERVAL):
+        self.sink = sink
+        self.window = window
+        self.deadband = deadband or {}
+        self.default_deadband = default_deadband
+        self.min_point_interval = min_point_interval
+
+        self.channels = {}
+        self.window_start = None
+
+    @classmethod
+    def from_config(cls, sink, config):
+        """Builds an aggregator from the "aggregation" section of iot_config.json"""
+        return cls(
+            sink,
+            window=config.get("window", WINDOW_SECONDS),
+            deadband=config.get("deadband"),
+            default_deadband=config.get("default_deadband", 0.5),
+            min_point_interval=config.get("min_point_interval", MIN_POINT_INTERVAL),
+        )
+
+    def add(self, frame):
+        """Consumes one sampled frame (the SampleScheduler sink)"""
+        bucket_start = math.floor(frame.timestamp / self.window) * self.window
+        if self.window_start is None:
+            self.window_start = bucket_start
+        elif bucket_start > self.window_start:
+            self.flush()
+            self.window_start = bucket_start
+
+        points = {}
+        for name, value in frame.readings.items():
+            if not isinstance(value, (int, float)):
+                continue
+            channel = self.channels.get(name)
+            if channel is None:
+                channel = self.channels[name] = ChannelState()
+            channel.stats.append(value)
+            channel.last = value
+
+            if self._outside_deadband(name, channel, value, frame.timestamp):
+                channel.published_value = value
+                channel.published_at = frame.timestamp
+                points[name] = value
+
+        if points:
+            self.sink(Frame(frame.timestamp, points, "point"))
+
+    def flush(self):
+        """Emits the window summary for every channel that received samples"""
+        summary = {}
+        for name, channel in self.channels.items():
+            stats = channel.stats
+            if not stats.count:
+                continue
+            summary[name] = {
+                "min": stats.minimum,
+                "max": stats.maximum,
+                "mean": round(stats.total / stats.count, 3),
+                "last": channel.last,
+                "count": stats.count,
+            }
+            stats.clear()
+
+        if summary:
+            self.sink(Frame(self.window_start + self.window, summary, "window"))
+
+    def close(self):
+        """Emits the summary of the window still open, e.g. on shutdown"""
+        if self.window_start is not None:
+            self.flush()
+            self.window_start = None
+
+    def _outside_deadband(self, name, channel, value, timestamp):
+        if channel.published_value is None:
+            return True
+        if timestamp - channel.published_at < self.min_point_interval:
+            return False
+        return abs(value - channel.published_value) > self.deadband.get(name, self.default_deadband)
@@ -0,0 +1,89 @@
+import json
+import struct
+
+# Wire formats selectable via "payload_format" in iot_config.json
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+
+BINARY_TOPIC = "home/heating/binary/status"
+
+# --- Binary layout (big-endian) ---
+# B  schema version
+# B  display status code
+# B  real state code
+# B  reason code
+# version 1:  I  timestamp (epoch seconds)
+# version 2:  Q  timestamp_ms (epoch milliseconds), I  seq (per-boot sequence number)
+# B  device_id length, followed by the UTF-8 device_id
+#
+# Version 2 carries what payload 2.0 adds, so events within one second get
+# distinct keys in the events table; payloads without it are sent as version 1.
+# The first three bytes of an INACTIVE state change are always 0v 00 00,
+# which is "AQAA" (v1) or "AgAA" (v2) once IoT Core base64-encodes the frame.
+# The alert rule for binary frames filters on those prefixes, so keep this
+# order stable.
+SCHEMA_V1 = 1
+SCHEMA_V2 = 2
+HEADERS = {SCHEMA_V1: struct.Struct(">BBBBI"), SCHEMA_V2: struct.Struct(">BBBBQI")}
+
+STATUS_CODES = {"INACTIVE": 0, "ACTIVE": 1, "HEARTBEAT_OK": 2, "UNKNOWN": 3}
+REASON_CODES = {"heartbeat": 0, "event_change": 1}
+OTHER_REASON = 255
+
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+REASON_NAMES = {code: name for name, code in REASON_CODES.items()}
+
+
+def encode_json(payload):
+    return json.dumps(payload)
+
+
+def encode_binary(payload):
+    """Packs a status payload into the fixed binary layout (~35 bytes instead of ~200)"""
+    device_id = payload["device_id"].encode("utf-8")
+    if len(device_id) > 255:
+        raise ValueError(f"device_id too long for binary encoding: {payload['device_id']}")
+
+    codes = (
+        STATUS_CODES[payload["status"]],
+        STATUS_CODES[payload.get("real_state", payload["status"])],
+        REASON_CODES.get(payload.get("metadata", {}).get("reason"), OTHER_REASON),
+    )
+    if "timestamp_ms" in payload and "seq" in payload:
+        header = HEADERS[SCHEMA_V2].pack(SCHEMA_V2, *codes, payload["timestamp_ms"], payload["seq"] & 0xFFFFFFFF)
+    else:
+        header = HEADERS[SCHEMA_V1].pack(SCHEMA_V1, *codes, payload["timestamp"])
+    return header + bytes([len(device_id)]) + device_id
+
+
+def decode_binary(frame):
+    """Inverse of encode_binary(), for both schema versions; returns the same shape as the JSON payload"""
+    header = HEADERS.get(frame[0]) if frame else None
+    if header is None:
+        raise ValueError(f"Unsupported binary schema version: {frame[:1].hex() or 'empty'}")
+
+    version, status, real_state, reason, *stamp = header.unpack_from(frame)
+    id_length = frame[header.size]
+    device_id = frame[header.size + 1:header.size + 1 + id_length].decode("utf-8")
+    real_state = STATUS_NAMES[real_state]
+
+    payload = {
+        "device_id": device_id,
+        "timestamp": stamp[0] if version == SCHEMA_V1 else stamp[0] // 1000,
+        "status": STATUS_NAMES[status],
+        "real_state": real_state,
+        "sensor_voltage": 1 if real_state == "ACTIVE" else 0,
+        "metadata": {
+            "reason": REASON_NAMES.get(reason, "other"),
+            "version": f"{version}.0"
+        }
+    }
+    if version == SCHEMA_V2:
+        payload["timestamp_ms"], payload["seq"] = stamp
+    return payload
+
+
+ENCODERS = {
+    FORMAT_JSON: encode_json,
+    FORMAT_BINARY: encode_binary,
+}
@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import os
+import threading
+
+try:
+    from . import monitor as edge
+    from .runtime import EdgeRuntime, SHUTDOWN_DRAIN_TIMEOUT, install_signal_handlers, retry_with_backoff, wait_crt
+except ImportError:  # started directly as a script (systemd)
+    import monitor as edge
+    from runtime import EdgeRuntime, SHUTDOWN_DRAIN_TIMEOUT, install_signal_handlers, retry_with_backoff, wait_crt
+
+# Every hosted device gets its own topics; the IoT rules match both these and
+# the single-device topics (see heating_monitor_stack.py)
+DEVICE_STATUS_TOPIC = "home/heating/status/{device_id}"
+DEVICE_BINARY_TOPIC = "home/heating/binary/status/{device_id}"
+DEVICE_COMMAND_TOPIC = "home/heating/commands/{device_id}"
+
+MAX_CONNECTIONS = 4
+# Gateway-level settings every device inherits unless it overrides them
+SHARED_KEYS = ("endpoint", "payload_format", "aggregation")
+
+
+def device_config(config, definition):
+    """Builds the HeatingMonitor config of one hosted device"""
+    device_id = definition["device_id"]
+    merged = {key: config[key] for key in SHARED_KEYS if key in config}
+    merged.update(definition)
+
+    binary = merged.get("payload_format") == edge.codec.FORMAT_BINARY
+    merged.setdefault("topic", (DEVICE_BINARY_TOPIC if binary else DEVICE_STATUS_TOPIC).format(device_id=device_id))
+    merged.setdefault("command_topic", DEVICE_COMMAND_TOPIC.format(device_id=device_id))
+    if edge.OUTBOX_PATH != ":memory:":
+        # One outbox per device, so each drainer only replays its own backlog
+        merged.setdefault("outbox", os.path.join(os.path.dirname(edge.OUTBOX_PATH), f"outbox-{device_id}.db"))
+    return merged
+
+
+class PooledConnection:
+    """One MQTT connection (client id `<gateway>-<n>`) shared by several devices"""
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.monitors = []
+        self.connection = None
+        self.connected = False
+
+    def build(self, endpoint, client_bootstrap):
+        if self.connection is None:
+            self.connection = edge.build_mqtt_connection(
+                endpoint, self.client_id, client_bootstrap,
+                self._on_connection_interrupted, self._on_connection_resumed
+            )
+            for monitor in self.monitors:
+                monitor.mqtt_connection = self.connection
+        return self.connection
+
+    def _on_connection_interrupted(self, connection, error, **kwargs):
+        print(f"⚠️  {self.client_id} interrupted: {error}. Buffering {len(self.monitors)} devices to outbox...")
+        for monitor in self.monitors:
+            monitor.online = False
+
+    def _on_connection_resumed(self, connection, return_code, session_present, **kwargs):
+        print(f"🔁 {self.client_id} resumed, replaying outboxes...")
+        for monitor in self.monitors:
+            monitor.online = True
+            monitor.drainer.request_drain()
+
+
+class Gateway:
+    """
+    Hosts many monitored pumps in one process.
+
+    Devices are listed under "devices" in iot_config.json, e.g.
+    {"device_id": "boiler-house-a", "pin": 17, "location": "House A"}.
+    They are spread round-robin over at most `max_connections` MQTT
+    connections, which share a single event loop group and client bootstrap.
+    Each device keeps its own outbox, in-flight window and EdgeRuntime tasks,
+    all on one asyncio loop.
+    """
+
+    def __init__(self, config):
+        definitions = config.get("devices") or []
+        if not definitions:
+            raise ValueError("Gateway config has no devices")
+        self._check_unique(definitions, "device_id")
+        self._check_unique([d for d in definitions if "pin" in d], "pin")
+
+        self.gateway_id = config.get("gateway_id", config.get("thing_name", edge.DEVICE_ID))
+        self.endpoint = config["endpoint"]
+        self.event_loop_threads = config.get("event_loop_threads", 1)
+
+        size = max(1, min(len(definitions), config.get("max_connections", MAX_CONNECTIONS)))
+        self.pool = [PooledConnection(f"{self.gateway_id}-{n}") for n in range(size)]
+        self.monitors = []
+        for index, definition in enumerate(definitions):
+            # fast_start: the gateway, not the monitor, builds the connections
+            monitor = edge.HeatingMonitor(fast_start=True, config=device_config(config, definition))
+            self.pool[index % size].monitors.append(monitor)
+            self.monitors.append(monitor)
+
+        self.client_bootstrap = None
+        self._bootstrap_lock = threading.Lock()
+        self.runtimes = {}
+        self.stopping = None
+
+    @staticmethod
+    def _check_unique(definitions, key):
+        values = [d[key] for d in definitions]
+        duplicates = sorted({str(v) for v in values if values.count(v) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate {key} in gateway config: {', '.join(duplicates)}")
+
+    def _build(self, pooled):
+        # Runs in the executor: the first call loads the SDK and creates the shared bootstrap
+        with self._bootstrap_lock:
+            if self.client_bootstrap is None:
+                self.client_bootstrap = edge.build_client_bootstrap(self.event_loop_threads)
+        return pooled.build(self.endpoint, self.client_bootstrap)
+
+    async def connect(self, pooled):
+        connection = await asyncio.get_running_loop().run_in_executor(None, self._build, pooled)
+        await wait_crt(connection.connect())
+        pooled.connected = True
+        print(f"✅ {pooled.client_id} connected ({len(pooled.monitors)} devices)")
+        await asyncio.gather(*(self.runtimes[m.device_id].on_connected() for m in pooled.monitors))
+
+    async def serve(self, heartbeat_interval=edge.HEARTBEAT_INTERVAL, drain_timeout=SHUTDOWN_DRAIN_TIMEOUT):
+        self.stopping = asyncio.Event()
+        install_signal_handlers(self.stop)
+
+        self.runtimes = {
+            m.device_id: EdgeRuntime(m, heartbeat_interval=heartbeat_interval, drain_timeout=drain_timeout, shared=True)
+            for m in self.monitors
+        }
+        for runtime in self.runtimes.values():
+            await runtime.start()
+
+        connecting = [
+            asyncio.create_task(
+                retry_with_backoff(lambda p=pooled: self.connect(p), what=f"Connect {pooled.client_id}")
+            )
+            for pooled in self.pool
+        ]
+
+        try:
+            await self.stopping.wait()
+        finally:
+            print("\n🛑 Stopping gateway...")
+            await self.shutdown(connecting)
+
+    def stop(self):
+        if self.stopping is not None:
+            self.stopping.set()
+
+    async def shutdown(self, connecting=()):
+        """Devices drain in parallel (each bounded), then the shared connections close"""
+        for task in connecting:
+            task.cancel()
+        await asyncio.gather(*connecting, return_exceptions=True)
+
+        await asyncio.gather(*(runtime.shutdown() for runtime in self.runtimes.values()))
+        await asyncio.gather(*(wait_crt(p.connection.disconnect()) for p in self.pool if p.connected))
+        if edge.IS_RASPBERRY_PI:
+            edge.GPIO.cleanup()
+        print("👋 Disconnected.")
+
+    def run(self):
+        print(f"🚀 Heating gateway {self.gateway_id} started: {len(self.monitors)} devices, "
+              f"{len(self.pool)} connections")
+        asyncio.run(self.serve())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Heating pump gateway (several monitored pumps in one process)")
+    parser.parse_args()
+
+    Gateway(edge.load_config()).run()
@@ -1,12 +1,38 @@
 import time
-import json
-import os
-import sys
-import threading
-from datetime import datetime, timezone
 
-from awscrt import io, mqtt, auth, http
-from awsiot import mqtt_connection_builder
+PROCESS_START = time.perf_counter()
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import itertools  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+from datetime import datetime, timezone  # noqa: E402
+
+# The AWS IoT SDK (awscrt/awsiot) is the slowest import by far on a Pi Zero,
+# so it is loaded on first use by _load_aws_sdk() instead of at start-up.
+io = None
+mqtt = None
+mqtt_connection_builder = None
+
+try:
+    from .acquisition import EdgeAcquisition
+    from .outbox import Outbox, OutboxDrainer, OutboxEntry
+    from .publisher import Publisher, WindowFull, BACKPRESSURE_TIMEOUT
+    from . import codec
+    from .sampling import SampleScheduler, build_samplers, TELEMETRY_TOPIC
+    from .aggregation import Aggregator
+    from .runtime import EdgeRuntime, StartupTimer, COMMAND_TOPIC
+except ImportError:  # started directly as a script (systemd)
+    from acquisition import EdgeAcquisition
+    from outbox import Outbox, OutboxDrainer, OutboxEntry
+    from publisher import Publisher, WindowFull, BACKPRESSURE_TIMEOUT
+    import codec
+    from sampling import SampleScheduler, build_samplers, TELEMETRY_TOPIC
+    from aggregation import Aggregator
+    from runtime import EdgeRuntime, StartupTimer, COMMAND_TOPIC
 
 try:
     import RPi.GPIO as GPIO
@@ -19,64 +45,193 @@ except ImportError:
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # hardware/
 CERTS_DIR = os.path.join(BASE_DIR, 'certs')
 CONFIG_PATH = os.path.join(CERTS_DIR, 'iot_config.json')
+OUTBOX_PATH = os.environ.get("HEATING_MONITOR_OUTBOX", os.path.join(BASE_DIR, 'data', 'outbox.db'))
 
+DEVICE_ID = "heating-pump-pi-01"
+STATUS_TOPIC = "home/heating/status"
+LOCATION = "Boiler Room"
 PUMP_PIN = 17
 HEARTBEAT_INTERVAL = 86400
 
+# Status payload schema (docs/data_contract.json). 2.0 adds timestamp_ms and a
+# sequence number that restarts at 0 on every boot, so events within the same
+# second get distinct keys in the events table.
+PAYLOAD_VERSION = "2.0"
+
+
+def _load_aws_sdk():
+    """Imports the AWS IoT SDK on first use"""
+    global io, mqtt, mqtt_connection_builder
+    if mqtt_connection_builder is None:
+        from awscrt import io, mqtt
+        from awsiot import mqtt_connection_builder
+
+
+def build_client_bootstrap(threads=1):
+    """Event loop group, resolver and bootstrap; one set can serve many connections"""
+    _load_aws_sdk()
+    event_loop_group = io.EventLoopGroup(threads)
+    host_resolver = io.DefaultHostResolver(event_loop_group)
+    return io.ClientBootstrap(event_loop_group, host_resolver)
+
+
+def build_mqtt_connection(endpoint, client_id, client_bootstrap, on_interrupted, on_resumed):
+    """Establishes a secure MQTT connection using Mutual TLS"""
+    _load_aws_sdk()
+    return mqtt_connection_builder.mtls_from_path(
+        endpoint=endpoint,
+        cert_filepath=os.path.join(CERTS_DIR, 'certificate.pem.crt'),
+        pri_key_filepath=os.path.join(CERTS_DIR, 'private.pem.key'),
+        client_bootstrap=client_bootstrap,
+        ca_filepath=os.path.join(CERTS_DIR, 'AmazonRootCA1.pem'),
+        client_id=client_id,
+        clean_session=False,
+        keep_alive_secs=30,
+        on_connection_interrupted=on_interrupted,
+        on_connection_resumed=on_resumed
+    )
+
+
+def load_config():
+    if not os.path.exists(CONFIG_PATH):
+        raise FileNotFoundError(f"Missing config file: {CONFIG_PATH}. Run provision_device.py first!")
+
+    with open(CONFIG_PATH, 'r') as f:
+        return json.load(f)
+
 
 class HeatingMonitor:
-    def __init__(self):
-        self.device_id = "heating-pump-pi-01"
-        self.topic = "home/heating/status"
+    def __init__(self, fast_start=False, config=None, connection=None):
+        self.startup = StartupTimer(PROCESS_START)
         self.last_status = "UNKNOWN"
         self.last_heartbeat = 0
+        self.sequence = itertools.count()  # next() is atomic: safe from the acquisition and heartbeat threads
+        self.online = None  # unknown until the first connect attempt
+        self.backpressure_timeout = BACKPRESSURE_TIMEOUT
 
-        if not os.path.exists(CONFIG_PATH):
-            raise FileNotFoundError(f"Missing config file: {CONFIG_PATH}. Run provision_device.py first!")
+        self.input_source = None  # simulated pump input, see simulation.py
 
-        with open(CONFIG_PATH, 'r') as f:
-            config = json.load(f)
-            self.endpoint = config['endpoint']
+        if config is None:
+            config = load_config()
 
-        self.mqtt_connection = self._build_connection()
+        # A gateway passes one config per hosted device, see gateway.py
+        self.device_id = config.get('device_id', DEVICE_ID)
+        self.pin = config.get('pin', PUMP_PIN)
+        self.location = config.get('location', LOCATION)
+        self.topic = config.get('topic', STATUS_TOPIC)
+        self.command_topic = config.get('command_topic', COMMAND_TOPIC)
+        self.endpoint = config['endpoint']
+        self.payload_format = config.get('payload_format', codec.FORMAT_JSON)
+        self.sampler_definitions = config.get('samplers', [])
+        self.aggregation_config = config.get('aggregation')
+        self.aggregator = None
+        self.startup.mark("config_loaded")
+
+        if self.payload_format not in codec.ENCODERS:
+            raise ValueError(f"Unknown payload_format: {self.payload_format}")
+        if self.payload_format == codec.FORMAT_BINARY and 'topic' not in config:
+            self.topic = codec.BINARY_TOPIC
+
+        # Fast start: sample and buffer right away, build the connection in the background
+        if connection is not None:
+            self.mqtt_connection = connection
+        else:
+            self.mqtt_connection = None if fast_start else self._build_connection()
+        self.outbox = Outbox(config.get('outbox', OUTBOX_PATH))
+        self.publisher = Publisher(self._publish_message)
+        self.drainer = OutboxDrainer(self.outbox, self._submit_entry)
+
+    def ensure_connection(self):
+        """Builds the MQTT connection once; reconnect attempts reuse it and its TLS context"""
+        if self.mqtt_connection is None:
+            self.mqtt_connection = self._build_connection()
+        return self.mqtt_connection
 
     def _build_connection(self):
-        """Establishes a secure MQTT connection using Mutual TLS"""
-        event_loop_group = io.EventLoopGroup(1)
-        host_resolver = io.DefaultHostResolver(event_loop_group)
-        client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
-
-        mqtt_connection = mqtt_connection_builder.mtls_from_path(
-            endpoint=self.endpoint,
-            cert_filepath=os.path.join(CERTS_DIR, 'certificate.pem.crt'),
-            pri_key_filepath=os.path.join(CERTS_DIR, 'private.pem.key'),
-            client_bootstrap=client_bootstrap,
-            ca_filepath=os.path.join(CERTS_DIR, 'AmazonRootCA1.pem'),
-            client_id=self.device_id,
-            clean_session=False,
-            keep_alive_secs=30
+        """Dedicated connection with its own event loop group (single-device mode)"""
+        client_bootstrap = build_client_bootstrap()
+        self.startup.mark("sdk_loaded")
+        return build_mqtt_connection(
+            self.endpoint, self.device_id, client_bootstrap,
+            self._on_connection_interrupted, self._on_connection_resumed
         )
-        return mqtt_connection
+
+    def _on_connection_interrupted(self, connection, error, **kwargs):
+        print(f"⚠️  Connection interrupted: {error}. Buffering to outbox...")
+        self.online = False
+
+    def _on_connection_resumed(self, connection, return_code, session_present, **kwargs):
+        print("🔁 Connection resumed, replaying outbox...")
+        self.online = True
+        self.drainer.request_drain()
+
+    def _publish_message(self, topic, payload):
+        """Raw QoS1 publish, returns the (future, packet_id) tuple from the SDK"""
+        return self.mqtt_connection.publish(
+            topic=topic,
+            payload=payload,
+            qos=mqtt.QoS.AT_LEAST_ONCE
+        )
+
+    def _submit_entry(self, entry):
+        """Routes an outbox entry through the in-flight window (blocks while it is full)"""
+        return self.publisher.submit(entry.id, entry.topic, entry.payload, timeout=self.backpressure_timeout)
+
+    def subscribe(self, topic, callback):
+        """Subscribes with QoS1 and returns the SUBACK future"""
+        subscribe_future, _packet_id = self.mqtt_connection.subscribe(
+            topic=topic,
+            qos=mqtt.QoS.AT_LEAST_ONCE,
+            callback=callback
+        )
+        return subscribe_future
 
     def setup_gpio(self):
         """Configures the GPIO pin for input"""
         if IS_RASPBERRY_PI:
             GPIO.setmode(GPIO.BCM)
-            GPIO.setup(PUMP_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+            GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+            for definition in self.sampler_definitions:
+                if "pin" in definition:
+                    GPIO.setup(definition["pin"], GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
         else:
-            print(f"ℹ️  Simulated GPIO setup on pin {PUMP_PIN}")
+            print(f"ℹ️  Simulated GPIO setup on pin {self.pin}")
 
     def get_pump_status(self):
         """Reads the physical (or simulated) state"""
         if IS_RASPBERRY_PI:
-            input_state = GPIO.input(PUMP_PIN)
+            input_state = GPIO.input(self.pin)
             return "ACTIVE" if input_state == GPIO.LOW else "INACTIVE"
+        elif self.input_source is not None:
+            return self.input_source.read()
         else:
             return "INACTIVE"
 
-    def publish_status(self, status, reason="heartbeat"):
+    def build_acquisition(self, events=None, loop=None):
+        """Edge-triggered on real hardware, polled in simulation mode"""
+        return EdgeAcquisition(
+            read_status=self.get_pump_status,
+            pin=self.pin,
+            gpio=GPIO if IS_RASPBERRY_PI else None,
+            events=events,
+            loop=loop,
+        )
+
+    def handle_change(self, change):
+        """Publishes a debounced state change if it differs from the last reported state"""
+        if change.status != self.last_status:
+            print(f"⚡ State Change Detected: {self.last_status} -> {change.status}")
+            self.publish_status(change.status, reason="event_change", timestamp=change.timestamp)
+            self.last_status = change.status
+
+    def send_heartbeat(self):
+        self.publish_status(self.last_status, reason="heartbeat")
+        self.last_heartbeat = time.time()
+        print(f"📊 Publisher stats: {self.publisher.stats()}")
+
+    def publish_status(self, status, reason="heartbeat", timestamp=None):
         """Sends the payload to AWS IoT Core"""
-        timestamp = int(time.time())
+        timestamp_ms = int(round((timestamp if timestamp is not None else time.time()) * 1000))
         
         display_status = status
         if reason == "heartbeat":
@@ -84,63 +239,78 @@ class HeatingMonitor:
 
         payload = {
             "device_id": self.device_id,
-            "timestamp": timestamp,
+            "timestamp": timestamp_ms // 1000,
+            "timestamp_ms": timestamp_ms,
+            "seq": next(self.sequence),
             "status": display_status,       
             "real_state": status,          
             "sensor_voltage": 1 if status == "ACTIVE" else 0,
             "metadata": {
-                "location": "Boiler Room",
+                "location": self.location,
                 "reason": reason,
-                "version": "1.0" 
+                "version": PAYLOAD_VERSION
             }
         }
 
         print(f"📡 Sending [{reason}]: {display_status} (Real: {status})...")
 
-        self.mqtt_connection.publish(
-            topic=self.topic,
-            payload=json.dumps(payload),
-            qos=mqtt.QoS.AT_LEAST_ONCE
-        )
+        self._enqueue(self.topic, codec.ENCODERS[self.payload_format](payload))
 
-    def run(self):
-        """Main monitoring loop"""
-        print(f"🚀 Heating Monitor started on {self.device_id}")
-        self.setup_gpio()
-
-        # Connect
-        connect_future = self.mqtt_connection.connect()
-        connect_future.result()
-        print("✅ Connected to AWS IoT Core!")
+    def publish_frame(self, frame):
+        """Sends one coalesced frame of sensor readings"""
+        payload = {
+            "device_id": self.device_id,
+            "timestamp": int(frame.timestamp),
+            "readings": frame.readings,
+            "metadata": {
+                "location": self.location,
+                "reason": f"telemetry_{frame.kind}",
+                "version": "1.0"
+            }
+        }
+        self._enqueue(TELEMETRY_TOPIC, json.dumps(payload))
 
-        try:
-            while True:
-                current_status = self.get_pump_status()
-                current_time = time.time()
+    def _enqueue(self, topic, message):
+        # Persist first, so the event survives an outage or a reboot
+        entry_id = self.outbox.append(topic, message)
+        if self.online is not False:
+            try:
+                self.drainer.send(OutboxEntry(entry_id, topic, message))
+            except WindowFull:
+                # Already persisted: let the drainer pick it up once PUBACKs catch up
+                print("⏳ Publish window full, deferring to outbox replay")
+                self.drainer.request_drain()
 
-                # 1. EVENT: Status Changed
-                if current_status != self.last_status:
-                    print(f"⚡ State Change Detected: {self.last_status} -> {current_status}")
-                    self.publish_status(current_status, reason="event_change")
-                    self.last_status = current_status
+    def build_scheduler(self):
+        """One timer wheel for all configured sensors, or None if there are none"""
+        samplers = build_samplers(self.sampler_definitions, gpio=GPIO if IS_RASPBERRY_PI else None)
+        if not samplers:
+            return None
 
-                # 2. HEARTBEAT: Periodic update
-                elif (current_time - self.last_heartbeat) > HEARTBEAT_INTERVAL:
-                    self.publish_status(current_status, reason="heartbeat")
-                    self.last_heartbeat = current_time
+        sink = self.publish_frame
+        if self.aggregation_config is not None:
+            # Publish window summaries and deadband-filtered points instead of raw samples
+            self.aggregator = Aggregator.from_config(self.publish_frame, self.aggregation_config)
+            sink = self.aggregator.add
+        return SampleScheduler(samplers, sink=sink)
 
-                time.sleep(1)
+    def cleanup(self, release_gpio=True):
+        """Releases the GPIO pins and closes the outbox"""
+        if IS_RASPBERRY_PI and release_gpio:
+            GPIO.cleanup()
+        self.outbox.close()
 
-        except KeyboardInterrupt:
-            print("\n🛑 Stopping monitor...")
-        finally:
-            if IS_RASPBERRY_PI:
-                GPIO.cleanup()
-            disconnect_future = self.mqtt_connection.disconnect()
-            disconnect_future.result()
-            print("👋 Disconnected.")
+    def run(self):
+        """Runs acquisition, heartbeat, outbox replay and commands on one event loop"""
+        print(f"🚀 Heating Monitor started on {self.device_id}")
+        asyncio.run(EdgeRuntime(self, heartbeat_interval=HEARTBEAT_INTERVAL).run())
 
 
 if __name__ == "__main__":
-    monitor = HeatingMonitor()
+    parser = argparse.ArgumentParser(description="Heating pump monitor (edge agent)")
+    parser.add_argument("--fast-start", action="store_true",
+                        help="start sampling immediately and connect to AWS IoT Core in the background")
+    args = parser.parse_args()
+
+    monitor = HeatingMonitor(fast_start=args.fast_start)
     monitor.run()
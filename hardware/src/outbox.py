@@ -0,0 +1,202 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from .publisher import WindowFull
+except ImportError:  # started directly as a script (systemd)
+    from publisher import WindowFull
+
+OutboxEntry = namedtuple("OutboxEntry", ["id", "topic", "payload"])
+
+MAX_ENTRIES = 50000
+MAX_BYTES = 20 * 1024 * 1024
+DRAIN_BATCH_SIZE = 25
+DRAIN_RATE = 100  # messages per second
+ACK_TIMEOUT = 10
+
+
+class Outbox:
+    """
+    Disk-backed, append-only queue of messages waiting for a PUBACK.
+
+    Backed by SQLite in WAL mode with synchronous=NORMAL, so an append is a
+    sequential WAL write rather than a full fsync per event, which keeps the
+    SD card wear low. When the size cap is hit the oldest entries are evicted.
+    """
+
+    def __init__(self, path, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, payload BLOB NOT NULL)"
+        )
+        self._count, self._bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM outbox"
+        ).fetchone()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def append(self, topic, payload):
+        """Persists a message and returns its id, evicting the oldest ones if over the cap"""
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO outbox (topic, payload) VALUES (?, ?)", (topic, payload))
+            self._count += 1
+            self._bytes += len(payload)
+            if self._count > self.max_entries or self._bytes > self.max_bytes:
+                self._evict()
+            return cursor.lastrowid
+
+    def pending(self, limit, after_id=0):
+        """Returns up to `limit` unacknowledged entries, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, topic, payload FROM outbox WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+            ).fetchall()
+        return [OutboxEntry(*row) for row in rows]
+
+    def ack(self, ids):
+        """Removes acknowledged entries in a single transaction"""
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            removed = 0
+            for chunk_start in range(0, len(ids), 500):
+                chunk = ids[chunk_start:chunk_start + 500]
+                marks = ",".join("?" * len(chunk))
+                row = self._db.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM outbox WHERE id IN ({marks})", chunk
+                ).fetchone()
+                self._db.execute(f"DELETE FROM outbox WHERE id IN ({marks})", chunk)
+                removed += row[0]
+                self._bytes -= row[1]
+            self._db.execute("COMMIT")
+            self._count -= removed
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self):
+        """Drops the oldest entries until both caps are satisfied again"""
+        last_id = 0
+        while self._count > self.max_entries or self._bytes > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT id, LENGTH(payload) FROM outbox WHERE id > ? ORDER BY id LIMIT 100", (last_id,)
+            ).fetchall()
+            if not rows:
+                break
+            for entry_id, size in rows:
+                if self._count <= self.max_entries and self._bytes <= self.max_bytes:
+                    break
+                last_id = entry_id
+                self._count -= 1
+                self._bytes -= size
+        if last_id:
+            self._db.execute("DELETE FROM outbox WHERE id <= ?", (last_id,))
+            print(f"⚠️  Outbox full, evicted entries up to #{last_id}")
+
+
+class OutboxDrainer:
+    """
+    Sends outbox entries and trims them once IoT Core has acknowledged them.
+
+    Live events go out immediately through `send()`. After (re)connecting,
+    `request_drain()` asks the event loop (see runtime.py) to run `drain()`,
+    which replays the backlog in rate-limited batches, awaiting each batch's
+    PUBACKs before moving on, so a long outage is replayed without flooding
+    the link.
+    """
+
+    def __init__(self, outbox, publish, batch_size=DRAIN_BATCH_SIZE, rate=DRAIN_RATE, ack_timeout=ACK_TIMEOUT):
+        self.outbox = outbox
+        self.publish = publish
+        self.batch_size = batch_size
+        self.rate = rate
+        self.ack_timeout = ack_timeout
+
+        self._inflight = set()
+        self._lock = threading.Lock()
+        # Set by the runtime; callable from any thread (the SDK's resume callback)
+        self.on_drain_requested = None
+
+    def request_drain(self):
+        if self.on_drain_requested is not None:
+            self.on_drain_requested()
+
+    def send(self, entry, ack=True):
+        """Publishes one entry; by default it is removed from the outbox when its PUBACK arrives"""
+        with self._lock:
+            if entry.id in self._inflight:
+                return None
+            self._inflight.add(entry.id)
+
+        try:
+            future = self.publish(entry)
+        except Exception:
+            self._done(entry.id, acked=False)
+            raise
+
+        future.add_done_callback(lambda f: self._done(entry.id, acked=ack and f.exception() is None))
+        return future
+
+    async def drain(self, window_retry=0.01):
+        """Replays the whole backlog; returns False if the link dropped mid-way"""
+        after_id = 0
+        while True:
+            batch = self.outbox.pending(self.batch_size, after_id=after_id)
+            if not batch:
+                return True
+            after_id = batch[-1].id
+
+            started = time.monotonic()
+            sent = {}
+            for entry in batch:
+                while True:
+                    try:
+                        future = self.send(entry, ack=False)
+                        break
+                    except WindowFull:
+                        await asyncio.sleep(window_retry)
+                    except Exception as e:
+                        print(f"❌ Replay failed: {e}")
+                        return False
+                if future is not None:
+                    sent[asyncio.wrap_future(future)] = entry.id
+
+            # Trim the whole batch in one transaction instead of one write per PUBACK
+            if sent:
+                done, not_done = await asyncio.wait(list(sent), timeout=self.ack_timeout)
+                self.outbox.ack(sent[f] for f in done if f.exception() is None)
+                if not_done or any(f.exception() is not None for f in done):
+                    return False
+
+            # Rate limit: one batch per batch_size / rate seconds
+            budget = len(batch) / self.rate
+            elapsed = time.monotonic() - started
+            if elapsed < budget:
+                await asyncio.sleep(budget - elapsed)
+
+    def _done(self, entry_id, acked):
+        with self._lock:
+            self._inflight.discard(entry_id)
+        if acked:
+            self.outbox.ack([entry_id])
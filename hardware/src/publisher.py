@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+MAX_INFLIGHT = 32
+MAX_RETRIES = 3
+BACKPRESSURE_TIMEOUT = 5
+LATENCY_SAMPLES = 1000
+
+
+class WindowFull(Exception):
+    """Raised when the in-flight window stays full for longer than the caller wants to wait"""
+
+
+class InFlight:
+    """Bookkeeping for one QoS1 publish waiting for its PUBACK"""
+
+    __slots__ = ("key", "packet_id", "attempts", "first_sent", "last_sent")
+
+    def __init__(self, key):
+        self.key = key
+        self.packet_id = None
+        self.attempts = 0
+        self.first_sent = None
+        self.last_sent = None
+
+
+class Publisher:
+    """
+    Pipelines QoS1 publishes through a bounded in-flight window.
+
+    Up to `max_inflight` messages may wait for a PUBACK at once; `submit()`
+    blocks the caller while the window is full, which is what throttles the
+    acquisition loop under load. Each publish future is tracked to completion,
+    failed publishes are retried up to `max_retries` times, and PUBACK latency
+    and retry counters are kept for `stats()`.
+    """
+
+    def __init__(self, publish, max_inflight=MAX_INFLIGHT, max_retries=MAX_RETRIES):
+        self.publish = publish  # (topic, payload) -> (future, packet_id)
+        self.max_inflight = max_inflight
+        self.max_retries = max_retries
+
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.acked = 0
+        self.failed = 0
+        self.retries = 0
+
+    def submit(self, key, topic, payload, timeout=None):
+        """
+        Publishes a message and returns a future resolved on its final PUBACK
+        (or failure after all retries). Blocks while the window is full and
+        raises WindowFull if no slot frees up within `timeout` seconds.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise WindowFull(f"{self.max_inflight} messages already awaiting PUBACK")
+
+        record = InFlight(key)
+        result = Future()
+        with self._lock:
+            self._inflight[key] = record
+
+        try:
+            self._attempt(record, topic, payload, result)
+        except Exception:
+            self._finish(record)
+            raise
+        return result
+
+    def inflight(self):
+        """Snapshot of the messages currently awaiting a PUBACK"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {"key": r.key, "packet_id": r.packet_id, "attempts": r.attempts, "age": now - r.first_sent}
+                for r in self._inflight.values()
+            ]
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "inflight": len(self._inflight),
+                "acked": self.acked,
+                "failed": self.failed,
+                "retries": self.retries,
+            }
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else None
+
+        stats.update({
+            "ack_latency_p50": percentile(0.50),
+            "ack_latency_p95": percentile(0.95),
+            "ack_latency_max": latencies[-1] if latencies else None,
+        })
+        return stats
+
+    def _attempt(self, record, topic, payload, result):
+        now = time.monotonic()
+        record.attempts += 1
+        record.last_sent = now
+        if record.first_sent is None:
+            record.first_sent = now
+
+        sent = self.publish(topic, payload)
+        future, record.packet_id = sent[0], sent[1]
+        future.add_done_callback(lambda f: self._on_done(f, record, topic, payload, result))
+
+    def _on_done(self, future, record, topic, payload, result):
+        error = future.exception()
+        if error is None:
+            with self._lock:
+                self.acked += 1
+                self._latencies.append(time.monotonic() - record.last_sent)
+            self._finish(record)
+            result.set_result(record)
+            return
+
+        if record.attempts <= self.max_retries:
+            with self._lock:
+                self.retries += 1
+            try:
+                self._attempt(record, topic, payload, result)
+                return
+            except Exception as e:
+                error = e
+
+        with self._lock:
+            self.failed += 1
+        self._finish(record)
+        result.set_exception(error)
+
+    def _finish(self, record):
+        with self._lock:
+            self._inflight.pop(record.key, None)
+        self._slots.release()
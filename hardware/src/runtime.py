@@ -0,0 +1,289 @@
+import asyncio
+import json
+import random
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .acquisition import StateChange, DEBOUNCE_SECONDS, POLL_INTERVAL
+except ImportError:  # started directly as a script (systemd)
+    from acquisition import StateChange, DEBOUNCE_SECONDS, POLL_INTERVAL
+
+COMMAND_TOPIC = "home/heating/commands"
+SHUTDOWN_DRAIN_TIMEOUT = 10
+CONNECT_BACKOFF_BASE = 1
+CONNECT_BACKOFF_CAP = 300
+
+
+def wait_crt(future):
+    """awscrt returns concurrent.futures.Future objects; make them awaitable"""
+    return asyncio.wrap_future(future)
+
+
+def backoff_delay(attempt, base=CONNECT_BACKOFF_BASE, cap=CONNECT_BACKOFF_CAP):
+    """Exponential backoff with full jitter, so a fleet rebooting together doesn't reconnect in lockstep"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def retry_with_backoff(operation, what="Connect"):
+    """Retries `operation` until it succeeds instead of crashing when the broker is unreachable"""
+    attempt = 0
+    while True:
+        try:
+            return await operation()
+        except Exception as e:
+            delay = backoff_delay(attempt)
+            attempt += 1
+            print(f"⚠️  {what} attempt {attempt} failed ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+class StartupTimer:
+    """Records how long each start-up milestone took after the process started"""
+
+    def __init__(self, started):
+        self.started = started
+        self.marks = {}
+
+    def mark(self, name):
+        self.marks.setdefault(name, time.perf_counter() - self.started)
+
+    def report(self):
+        steps = ", ".join(f"{name} {elapsed * 1000:.0f}ms" for name, elapsed in self.marks.items())
+        return f"⏱️  Cold start: {steps}"
+
+
+def install_signal_handlers(callback):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, callback)
+        except (NotImplementedError, RuntimeError):
+            pass  # not available on Windows or outside the main thread
+
+
+class ThreadSafeQueue:
+    """Lets driver threads (GPIO callbacks, CRT callbacks) feed an asyncio.Queue"""
+
+    def __init__(self, loop, target):
+        self.loop = loop
+        self.target = target
+
+    def put(self, item):
+        self.loop.call_soon_threadsafe(self.target.put_nowait, item)
+
+
+class EdgeRuntime:
+    """
+    Runs all edge duties as cooperating tasks on a single asyncio event loop:
+
+    - acquisition: state changes from GPIO edges (or an async poller in simulation mode)
+    - heartbeat: periodic HEARTBEAT_OK publish
+    - outbox: replay of buffered events after (re)connecting
+    - commands: messages received on home/heating/commands
+    - sampling: the sensor timer wheel, if samplers are configured; the
+      blocking sensor reads run on one worker thread, frames are published on the loop
+
+    On SIGINT/SIGTERM the producers are cancelled first, then in-flight
+    publishes get up to `drain_timeout` seconds to be acknowledged before
+    disconnecting. Anything still unacknowledged stays in the outbox.
+
+    With `shared=True` the MQTT connection and the GPIO chip belong to a
+    gateway hosting several devices: the gateway connects, then calls
+    `on_connected()`, and releases both after every device has shut down.
+    """
+
+    def __init__(self, monitor, heartbeat_interval, drain_timeout=SHUTDOWN_DRAIN_TIMEOUT, shared=False):
+        self.monitor = monitor
+        self.heartbeat_interval = heartbeat_interval
+        self.drain_timeout = drain_timeout
+        self.shared = shared
+        self.stopping = None
+        self.connected = False
+        self.acquisition = None
+        self.tasks = []
+
+    async def run(self):
+        self.stopping = asyncio.Event()
+        install_signal_handlers(self.stop)
+
+        await self.start()
+        self.tasks.append(asyncio.create_task(self.connect_with_backoff(), name="connect"))
+
+        try:
+            await self.stopping.wait()
+        finally:
+            print("\n🛑 Stopping monitor...")
+            await self.shutdown()
+
+    async def start(self):
+        """Starts acquisition and the device tasks; events are buffered until connected"""
+        loop = asyncio.get_running_loop()
+        self.events = asyncio.Queue()
+        self.commands = asyncio.Queue()
+        self.drain_requested = asyncio.Event()
+        self.state_known = asyncio.Event()
+        self._command_sink = ThreadSafeQueue(loop, self.commands)
+
+        monitor = self.monitor
+        monitor.online = False  # buffer to the outbox until the first connect succeeds
+        monitor.backpressure_timeout = 0  # never block the loop; defer to the outbox instead
+        monitor.drainer.on_drain_requested = lambda: loop.call_soon_threadsafe(self.drain_requested.set)
+        monitor.setup_gpio()
+        monitor.startup.mark("gpio_ready")
+
+        # Start sampling before connecting: events are buffered until the link is up
+        acquisition = monitor.build_acquisition(events=ThreadSafeQueue(loop, self.events), loop=loop)
+        if acquisition.gpio is not None:
+            acquisition.start()
+            self.acquisition = acquisition
+
+        self.tasks = [
+            asyncio.create_task(self._consume_changes(), name="acquisition"),
+            asyncio.create_task(self._heartbeat(), name="heartbeat"),
+            asyncio.create_task(self._drain_outbox(), name="outbox"),
+            asyncio.create_task(self._handle_commands(), name="commands"),
+        ]
+        if self.acquisition is None:
+            self.tasks.append(asyncio.create_task(self._poll_input(), name="poller"))
+        scheduler = monitor.build_scheduler()
+        if scheduler is not None:
+            self.tasks.append(asyncio.create_task(self._sample(scheduler), name="sampling"))
+
+    def stop(self):
+        if self.stopping is not None:
+            self.stopping.set()
+
+    async def connect(self):
+        monitor = self.monitor
+        # Building the connection imports the SDK and reads the certificates: keep it off the loop
+        connection = await asyncio.get_running_loop().run_in_executor(None, monitor.ensure_connection)
+        await wait_crt(connection.connect())
+        print("✅ Connected to AWS IoT Core!")
+        await self.on_connected()
+
+    async def on_connected(self):
+        monitor = self.monitor
+        monitor.online = True
+        self.connected = True
+        monitor.startup.mark("connected")
+        print(monitor.startup.report())
+
+        # Replay anything buffered while starting up or left over from a previous boot
+        monitor.drainer.request_drain()
+
+        # Retried on its own: retrying the whole connect would open a second
+        # session over the one that is up, and the SUBACK isn't needed to publish
+        await retry_with_backoff(
+            lambda: wait_crt(monitor.subscribe(monitor.command_topic, self._on_command)), what="Subscribe"
+        )
+
+    async def connect_with_backoff(self):
+        await retry_with_backoff(self.connect)
+
+    async def shutdown(self):
+        """Cancels producers, then gives in-flight publishes a bounded time to complete"""
+        if self.acquisition is not None:
+            self.acquisition.stop()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        try:
+            await asyncio.wait_for(self._wait_inflight(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️  {self.monitor.publisher.stats()['inflight']} publishes unacknowledged, kept in outbox")
+
+        if self.shared:
+            self.monitor.cleanup(release_gpio=False)
+            return
+
+        if self.connected:
+            await wait_crt(self.monitor.mqtt_connection.disconnect())
+        self.monitor.cleanup()
+        print("👋 Disconnected.")
+
+    async def _wait_inflight(self):
+        while self.monitor.publisher.stats()["inflight"]:
+            await asyncio.sleep(0.05)
+
+    def _on_command(self, topic, payload, **kwargs):
+        # Called on a CRT thread
+        self._command_sink.put(payload)
+
+    async def _consume_changes(self):
+        while True:
+            change = await self.events.get()
+            self.monitor.handle_change(change)
+            self.monitor.startup.mark("first_state")
+            self.state_known.set()
+
+    async def _poll_input(self):
+        """Simulation mode: poll and debounce without a helper thread"""
+        read = self.monitor.get_pump_status
+        last = None
+        while True:
+            status = read()
+            if status != last:
+                first_seen = time.time()
+                await asyncio.sleep(DEBOUNCE_SECONDS)
+                if read() == status:
+                    last = status
+                    self.events.put_nowait(StateChange(status, first_seen))
+                    continue
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def _heartbeat(self):
+        # The first heartbeat reports the initial state, so wait until it is known
+        await self.state_known.wait()
+        while True:
+            due = self.monitor.last_heartbeat + self.heartbeat_interval
+            await asyncio.sleep(max(0, due - time.time()))
+            self.monitor.send_heartbeat()
+
+    async def _drain_outbox(self):
+        drainer = self.monitor.drainer
+        while True:
+            await self.drain_requested.wait()
+            self.drain_requested.clear()
+            backlog = len(drainer.outbox)
+            if self.monitor.online and backlog and await drainer.drain():
+                print(f"📤 Outbox drained ({backlog} entries replayed)")
+
+    async def _handle_commands(self):
+        while True:
+            payload = await self.commands.get()
+            try:
+                command = json.loads(payload).get("command")
+            except (ValueError, AttributeError):
+                print(f"⚠️  Ignoring malformed command: {payload!r}")
+                continue
+
+            if command == "ping":
+                self.monitor.send_heartbeat()
+            elif command == "status":
+                self.monitor.publish_status(self.monitor.last_status, reason="command")
+            elif command == "drain":
+                self.drain_requested.set()
+            else:
+                print(f"⚠️  Unknown command: {command}")
+
+    async def _sample(self, scheduler):
+        # Sensor reads block (~750 ms per DS18B20), so they run on a worker of
+        # their own and only the frame is published back on the loop
+        loop = asyncio.get_running_loop()
+        reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sampler")
+        started = time.monotonic()
+        try:
+            while True:
+                frame = await loop.run_in_executor(reader, scheduler.read_due)
+                if frame is not None:
+                    scheduler.sink(frame)
+                next_at = started + scheduler.current_tick * scheduler.tick
+                await asyncio.sleep(max(0, next_at - time.monotonic()))
+        finally:
+            reader.shutdown(wait=False)
+            # Cancelled on shutdown: the partial window goes to the outbox with the rest
+            if self.monitor.aggregator is not None:
+                self.monitor.aggregator.close()
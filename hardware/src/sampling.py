@@ -0,0 +1,159 @@
+import math
+import time
+from collections import namedtuple
+from functools import reduce
+
+# All readings taken in the same scheduler tick, published as one message.
+# kind is "sample" for raw frames, "point"/"window" for aggregated ones.
+Frame = namedtuple("Frame", ["timestamp", "readings", "kind"], defaults=["sample"])
+
+TELEMETRY_TOPIC = "home/heating/telemetry"
+WHEEL_SIZE = 64
+
+SAMPLER_TYPES = {}
+
+
+def register_sampler(kind):
+    """Class decorator making a sampler available to `build_samplers()` under `kind`"""
+    def decorator(cls):
+        cls.kind = kind
+        SAMPLER_TYPES[kind] = cls
+        return cls
+    return decorator
+
+
+class Sampler:
+    """One input channel, read every `period` seconds"""
+
+    kind = None
+
+    def __init__(self, name, period):
+        if period <= 0:
+            raise ValueError(f"Sampler {name}: period must be positive")
+        self.name = name
+        self.period = period
+
+    def read(self):
+        raise NotImplementedError
+
+
+@register_sampler("gpio")
+class GpioSampler(Sampler):
+    """Digital input, reported as 1 when the line is active (LOW by default)"""
+
+    def __init__(self, name, period, pin, gpio=None, active_low=True):
+        super().__init__(name, period)
+        self.pin = pin
+        self.gpio = gpio
+        self.active_low = active_low
+
+    def read(self):
+        if self.gpio is None:
+            return 0  # Simulation Mode
+        level = self.gpio.input(self.pin)
+        return int((level == self.gpio.LOW) == self.active_low)
+
+
+@register_sampler("relay")
+class RelaySampler(GpioSampler):
+    """Auxiliary relay contact (e.g. zone valve, burner), active HIGH"""
+
+    def __init__(self, name, period, pin, gpio=None, active_low=False):
+        super().__init__(name, period, pin, gpio=gpio, active_low=active_low)
+
+
+@register_sampler("w1_temperature")
+class W1TemperatureSampler(Sampler):
+    """DS18B20 1-Wire probe (flow/return pipe temperature), in °C"""
+
+    def __init__(self, name, period, sensor_id=None, gpio=None):
+        super().__init__(name, period)
+        self.sensor_id = sensor_id
+        self._sensor = None
+
+    def read(self):
+        if self._sensor is None:
+            # Imported lazily: only needed when a 1-Wire probe is configured
+            from w1thermsensor import W1ThermSensor
+            self._sensor = W1ThermSensor(sensor_id=self.sensor_id) if self.sensor_id else W1ThermSensor()
+        return round(self._sensor.get_temperature(), 2)
+
+
+def build_samplers(definitions, gpio=None):
+    """
+    Instantiates samplers from the "samplers" list in iot_config.json, e.g.
+    {"type": "w1_temperature", "name": "flow_temp", "period": 10, "sensor_id": "0316a2794fff"}
+    """
+    samplers = []
+    for definition in definitions:
+        options = dict(definition)
+        kind = options.pop("type")
+        if kind not in SAMPLER_TYPES:
+            raise ValueError(f"Unknown sampler type: {kind}")
+        samplers.append(SAMPLER_TYPES[kind](gpio=gpio, **options))
+    return samplers
+
+
+class SampleScheduler:
+    """
+    Runs every sampler on one hashed timer wheel, advanced once per tick by
+    the edge runtime (see EdgeRuntime._sample in runtime.py).
+
+    The tick defaults to the greatest common divisor of all periods, so the
+    runtime only wakes up when at least one sampler may be due. Samplers that
+    fall due in the same tick are read together and handed to `sink` as a
+    single Frame, so N sensors cost one message per tick, not N.
+    """
+
+    def __init__(self, samplers, sink, tick=None, wheel_size=WHEEL_SIZE):
+        self.samplers = list(samplers)
+        self.sink = sink
+        self.tick = tick or self._default_tick(self.samplers)
+        self.wheel = [[] for _ in range(wheel_size)]
+        self.current_tick = 0
+
+        for sampler in self.samplers:
+            self._schedule(sampler, 0)
+
+    @staticmethod
+    def _default_tick(samplers):
+        if not samplers:
+            return 1.0
+        millis = [max(1, int(round(s.period * 1000))) for s in samplers]
+        return reduce(math.gcd, millis) / 1000
+
+    def _schedule(self, sampler, due_tick):
+        self.wheel[due_tick % len(self.wheel)].append((due_tick, sampler))
+
+    def advance(self, timestamp=None):
+        """Processes one tick; returns the Frame emitted (or None if nothing was due)"""
+        frame = self.read_due(timestamp)
+        if frame is not None:
+            self.sink(frame)
+        return frame
+
+    def read_due(self, timestamp=None):
+        """
+        Reads the samplers due in the current tick and moves on to the next;
+        returns their Frame (or None) without handing it to `sink`. Sensor
+        reads may block (a DS18B20 conversion takes ~750 ms), so this is the
+        part that can run on a worker thread.
+        """
+        slot_index = self.current_tick % len(self.wheel)
+        slot = self.wheel[slot_index]
+        due = [sampler for due_tick, sampler in slot if due_tick == self.current_tick]
+        self.wheel[slot_index] = [entry for entry in slot if entry[0] != self.current_tick]
+
+        readings = {}
+        for sampler in due:
+            try:
+                readings[sampler.name] = sampler.read()
+            except Exception as e:
+                print(f"⚠️  Sampler {sampler.name} failed: {e}")
+            period_ticks = max(1, int(round(sampler.period / self.tick)))
+            self._schedule(sampler, self.current_tick + period_ticks)
+
+        self.current_tick += 1
+        if not readings:
+            return None
+        return Frame(timestamp if timestamp is not None else time.time(), readings)
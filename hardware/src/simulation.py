@@ -0,0 +1,231 @@
+import bisect
+import contextlib
+import csv
+import enum
+import json
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    from .acquisition import EdgeAcquisition, StateChange
+except ImportError:  # started directly as a script (systemd)
+    from acquisition import EdgeAcquisition, StateChange
+
+# The part of awscrt.mqtt the monitor uses, for running it with a
+# FakeMqttConnection where the SDK is not installed: set monitor.mqtt to it
+fake_mqtt = SimpleNamespace(QoS=enum.IntEnum("QoS", {"AT_MOST_ONCE": 0, "AT_LEAST_ONCE": 1}))
+
+
+class PumpTrace:
+    """
+    A sequence of (offset_seconds, status) transitions, either recorded on a
+    real device or generated. Identical seeds always yield identical traces.
+    """
+
+    def __init__(self, transitions):
+        self.transitions = sorted(transitions)
+
+    def __len__(self):
+        return len(self.transitions)
+
+    @classmethod
+    def synthetic(cls, toggle_rate, duration, burst_probability=0.0, burst_length=5,
+                  burst_spacing=0.002, jitter=0.0, seed=0, initial="INACTIVE"):
+        """
+        Toggles `toggle_rate` times per second on average for `duration` seconds.
+        With probability `burst_probability` a toggle becomes a burst of
+        `burst_length` rapid toggles (contact bounce, flapping relay);
+        `jitter` adds uniform noise (seconds) to every transition time.
+        """
+        rng = random.Random(seed)
+        transitions = []
+        status = initial
+        t = 0.0
+        while True:
+            t += rng.expovariate(toggle_rate)
+            if t >= duration:
+                break
+            count = burst_length if rng.random() < burst_probability else 1
+            for i in range(count):
+                status = "ACTIVE" if status == "INACTIVE" else "INACTIVE"
+                offset = t + i * burst_spacing + rng.uniform(-jitter, jitter)
+                transitions.append((max(0.0, offset), status))
+        return cls(transitions)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a recorded trace: CSV rows of `offset,status` or a JSON list of pairs"""
+        with open(path, newline="") as f:
+            if path.endswith(".json"):
+                rows = json.load(f)
+            else:
+                rows = [row for row in csv.reader(f) if row and not row[0].startswith("#")]
+        return cls((float(offset), status) for offset, status in rows)
+
+    def save(self, path):
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerows(self.transitions)
+
+
+class SimulatedInput:
+    """Replays a trace in real time; plug into HeatingMonitor.input_source"""
+
+    def __init__(self, trace, initial="INACTIVE", clock=time.monotonic):
+        self.trace = trace
+        self.initial = initial
+        self.clock = clock
+        self.started = clock()
+        self._offsets = [offset for offset, _ in trace.transitions]
+
+    def read(self):
+        index = bisect.bisect_right(self._offsets, self.clock() - self.started)
+        return self.trace.transitions[index - 1][1] if index else self.initial
+
+
+class FakeMqttConnection:
+    """
+    Stands in for the awscrt MqttConnection and records every publish.
+    PUBACKs arrive immediately unless `auto_ack` is False, in which case
+    the test or benchmark calls `ack_all()`.
+    """
+
+    def __init__(self, auto_ack=True, clock=time.perf_counter):
+        self.auto_ack = auto_ack
+        self.clock = clock
+        self.published = []
+        self.pending = []
+        self._packet_id = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        return self._done()
+
+    def disconnect(self):
+        return self._done()
+
+    def subscribe(self, topic, qos, callback):
+        return self._done(), self._next_packet_id()
+
+    def publish(self, topic, payload, qos):
+        future = Future()
+        with self._lock:
+            self.published.append((self.clock(), topic, payload))
+            packet_id = self._next_packet_id()
+            if not self.auto_ack:
+                self.pending.append(future)
+        if self.auto_ack:
+            future.set_result({"packet_id": packet_id})
+        return future, packet_id
+
+    def ack_all(self):
+        with self._lock:
+            pending, self.pending = self.pending, []
+        for future in pending:
+            future.set_result(None)
+
+    def _next_packet_id(self):
+        self._packet_id = self._packet_id % 65535 + 1
+        return self._packet_id
+
+    @staticmethod
+    def _done():
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def run_benchmark(monitor, connection, trace, debounce=0.01, poll_interval=0.001, settle=0.2):
+    """
+    Replays `trace` in real time through the whole edge path: SimulatedInput
+    -> polled EdgeAcquisition with debounce -> handle_change -> encode ->
+    outbox -> in-flight window -> publish. Bursts shorter than `debounce`
+    collapse into one change, as they do on a device. Takes the trace's
+    duration plus `settle` seconds.
+    """
+    source = SimulatedInput(trace)
+    acquisition = EdgeAcquisition(source.read, pin=monitor.pin, gpio=None,
+                                  debounce=debounce, poll_interval=poll_interval)
+
+    def replay():
+        acquisition.start()
+        deadline = source.started + (trace.transitions[-1][0] if trace.transitions else 0) + settle
+        while time.monotonic() < deadline or not acquisition.events.empty():
+            try:
+                change = acquisition.events.get(timeout=poll_interval)
+            except queue.Empty:
+                continue
+            yield change
+        acquisition.stop()
+
+    results = _measure(monitor, connection, replay())
+    results["transitions"] = len(trace)
+    results["debounced_away"] = len(trace) + 1 - results["changes"]  # +1: the initial state
+    return results
+
+
+def run_hot_path(monitor, connection, trace):
+    """
+    Pushes every transition of `trace` straight into handle_change as fast
+    as possible, skipping input and debounce, to measure the publish path
+    (encode -> outbox -> in-flight window -> publish) on its own.
+    """
+    base_time = time.time()
+    results = _measure(monitor, connection, (StateChange(status, base_time + offset)
+                                             for offset, status in trace.transitions))
+    results["transitions"] = len(trace)
+    return results
+
+
+def _measure(monitor, connection, changes):
+    """Feeds `changes` to the monitor and reports throughput, latency, CPU and memory"""
+    monitor.online = True
+    monitor.backpressure_timeout = 0
+    latencies = []
+    count = 0
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for change in changes:
+            count += 1
+            before = len(connection.published)
+            injected = time.perf_counter()
+            monitor.handle_change(change)
+            if len(connection.published) > before:
+                latencies.append((connection.published[-1][0] - injected) * 1000)
+
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+    latencies.sort()
+    # ru_maxrss is in kilobytes on Linux (the Pi); not available on Windows
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+
+    return {
+        "changes": count,
+        "published": len(connection.published),
+        "deferred_to_outbox": len(monitor.outbox),
+        "events_per_second": count / wall if wall else float("inf"),
+        "publish_latency_ms_p50": percentile(latencies, 0.50),
+        "publish_latency_ms_p99": percentile(latencies, 0.99),
+        "publish_latency_ms_max": latencies[-1] if latencies else None,
+        "cpu_seconds": cpu,
+        "cpu_utilisation": cpu / wall if wall else 0.0,
+        "peak_rss_kb": peak_rss_kb,
+    }
@@ -1,3 +1,4 @@
+import os
 import sys
 from unittest.mock import MagicMock
 
@@ -21,3 +22,6 @@ sys.modules["w1thermsensor"] = mock_w1
 # 3. Mock the AWS IoT SDK to prevent real network connections
 sys.modules["awscrt"] = MagicMock()
 sys.modules["awsiot"] = MagicMock()
+
+# 4. Keep the offline outbox in memory so tests never touch the SD-card path
+os.environ.setdefault("HEATING_MONITOR_OUTBOX", ":memory:")
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import unittest
+import sys
+import os
+import time
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.acquisition import EdgeAcquisition
+
+
+class FakeInput:
+    """A pump input whose level the test flips by hand"""
+
+    def __init__(self, status="INACTIVE"):
+        self.status = status
+
+    def read(self):
+        return self.status
+
+
+class TestEdgeAcquisition(unittest.TestCase):
+
+    def test_start_emits_initial_state(self):
+        """
+        Test: The current pump state is queued immediately on start,
+        so the publisher reports it without waiting for the first edge.
+        """
+        pump = FakeInput("ACTIVE")
+        acquisition = EdgeAcquisition(pump.read, pin=17, gpio=MagicMock())
+
+        acquisition.start()
+
+        self.assertEqual(acquisition.events.get_nowait().status, "ACTIVE")
+
+    def test_gpio_edges_register_callback(self):
+        """
+        Test: On real hardware we subscribe to both edges instead of polling.
+        """
+        gpio = MagicMock()
+        acquisition = EdgeAcquisition(FakeInput().read, pin=17, gpio=gpio)
+
+        acquisition.start()
+        acquisition.stop()
+
+        args, kwargs = gpio.add_event_detect.call_args
+        self.assertEqual(args, (17, gpio.BOTH))
+        self.assertEqual(kwargs["callback"], acquisition._on_edge)
+        gpio.remove_event_detect.assert_called_once_with(17)
+
+    def test_bouncing_edges_produce_single_change(self):
+        """
+        Test: A burst of edges within the debounce window is reported once,
+        with the final settled level and the time of the first edge.
+        """
+        pump = FakeInput("INACTIVE")
+        acquisition = EdgeAcquisition(pump.read, pin=17, gpio=MagicMock(), debounce=0.02)
+        acquisition.start()
+        acquisition.events.get_nowait()
+
+        before = time.time()
+        for level in ("ACTIVE", "INACTIVE", "ACTIVE"):
+            pump.status = level
+            acquisition._on_edge(17)
+
+        change = acquisition.events.get(timeout=1)
+        self.assertEqual(change.status, "ACTIVE")
+        self.assertGreaterEqual(change.timestamp, before)
+        self.assertTrue(acquisition.events.empty())
+
+    def test_edges_are_debounced_on_the_event_loop(self):
+        """
+        Test: Under the asyncio runtime, edges from the driver's thread are
+        debounced by a loop timer, without a timer thread per edge.
+        """
+        async def scenario():
+            pump = FakeInput("INACTIVE")
+            acquisition = EdgeAcquisition(pump.read, pin=17, gpio=MagicMock(), debounce=0.02,
+                                          loop=asyncio.get_running_loop())
+            acquisition.start()
+            acquisition.events.get_nowait()
+
+            def bounce():
+                for level in ("ACTIVE", "INACTIVE", "ACTIVE"):
+                    pump.status = level
+                    acquisition._on_edge(17)
+
+            threads = threading.active_count()
+            driver = threading.Thread(target=bounce)
+            driver.start()
+            driver.join()
+            self.assertEqual(threading.active_count(), threads)
+            await asyncio.sleep(0.1)
+            acquisition.stop()
+            return [acquisition.events.get_nowait() for _ in range(acquisition.events.qsize())]
+
+        changes = asyncio.run(scenario())
+        self.assertEqual([change.status for change in changes], ["ACTIVE"])
+
+    def test_short_flicker_back_to_same_state_is_ignored(self):
+        """
+        Test: If the input settles back on the last reported level,
+        no change is emitted.
+        """
+        pump = FakeInput("INACTIVE")
+        acquisition = EdgeAcquisition(pump.read, pin=17, gpio=MagicMock(), debounce=0.01)
+        acquisition.start()
+        acquisition.events.get_nowait()
+
+        pump.status = "ACTIVE"
+        acquisition._on_edge(17)
+        pump.status = "INACTIVE"
+        acquisition._on_edge(17)
+        time.sleep(0.05)
+
+        self.assertTrue(acquisition.events.empty())
+
+    def test_overlapping_settles_end_on_the_latest_level(self):
+        """
+        Test: When a slow read from one debounce timer overlaps a newer
+        settle, the levels are checked and recorded in read order, so the
+        last reported state is the input's current one.
+        """
+        pump = FakeInput("INACTIVE")
+        first_read = threading.Event()
+
+        def read():
+            status = pump.read()
+            if not first_read.is_set():
+                first_read.set()
+                time.sleep(0.05)
+            return status
+
+        acquisition = EdgeAcquisition(pump.read, pin=17, gpio=MagicMock())
+        acquisition.start()
+        acquisition.events.get_nowait()
+        acquisition.read_status = read
+
+        pump.status = "ACTIVE"
+        slow = threading.Thread(target=acquisition._settle)
+        slow.start()
+        first_read.wait(timeout=1)
+        pump.status = "INACTIVE"
+        acquisition._settle()
+        slow.join(timeout=1)
+
+        self.assertEqual(acquisition.last_status, "INACTIVE")
+        self.assertEqual([acquisition.events.get_nowait().status for _ in range(2)], ["ACTIVE", "INACTIVE"])
+
+    def test_simulation_poller_detects_change(self):
+        """
+        Test: Without GPIO the fallback poller feeds the same debounced queue.
+        """
+        pump = FakeInput("INACTIVE")
+        acquisition = EdgeAcquisition(pump.read, pin=17, gpio=None, debounce=0.01, poll_interval=0.005)
+        acquisition.start()
+        acquisition.events.get_nowait()
+
+        pump.status = "ACTIVE"
+        change = acquisition.events.get(timeout=1)
+        acquisition.stop()
+
+        self.assertEqual(change.status, "ACTIVE")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.aggregation import Aggregator, WindowStats
+from src.sampling import Frame
+
+
+class TestWindowStats(unittest.TestCase):
+
+    def test_running_statistics_until_cleared(self):
+        stats = WindowStats()
+        for value in (3.0, 1.0, 2.0):
+            stats.append(value)
+
+        self.assertEqual((stats.count, stats.total, stats.minimum, stats.maximum), (3, 6.0, 1.0, 3.0))
+        stats.clear()
+        self.assertEqual(stats.count, 0)
+
+
+class TestAggregator(unittest.TestCase):
+
+    def setUp(self):
+        self.out = []
+
+    def test_window_summary_emitted_at_window_boundary(self):
+        """
+        Test: Crossing a window boundary emits one summary frame
+        with min/max/mean/last per channel.
+        """
+        aggregator = Aggregator(self.out.append, window=60, default_deadband=100)
+        for t, value in ((0, 50.0), (20, 52.0), (40, 51.0)):
+            aggregator.add(Frame(t, {"flow_temp": value}))
+        aggregator.add(Frame(60, {"flow_temp": 49.0}))
+
+        window = [f for f in self.out if f.kind == "window"]
+        self.assertEqual(len(window), 1)
+        self.assertEqual(window[0].timestamp, 60)
+        self.assertEqual(window[0].readings["flow_temp"],
+                         {"min": 50.0, "max": 52.0, "mean": 51.0, "last": 51.0, "count": 3})
+
+    def test_points_only_outside_deadband(self):
+        """
+        Test: Small fluctuations are suppressed; a move larger than the
+        deadband is published as a point value.
+        """
+        aggregator = Aggregator(self.out.append, window=3600, deadband={"flow_temp": 1.0}, min_point_interval=0)
+        for t, value in enumerate([50.0, 50.4, 50.9, 49.2, 52.5]):
+            aggregator.add(Frame(t, {"flow_temp": value}))
+
+        points = [f.readings["flow_temp"] for f in self.out if f.kind == "point"]
+        self.assertEqual(points, [50.0, 52.5])
+
+    def test_point_rate_is_bounded_regardless_of_sample_rate(self):
+        """
+        Test: Even a signal that jumps on every sample yields at most
+        one point per min_point_interval.
+        """
+        aggregator = Aggregator(self.out.append, window=3600, default_deadband=0.1, min_point_interval=10)
+        for i in range(1000):
+            aggregator.add(Frame(i * 0.1, {"flow_temp": 40.0 + (i % 2) * 5}))
+
+        self.assertLessEqual(len([f for f in self.out if f.kind == "point"]), 11)
+
+    def test_window_covers_every_sample_at_1hz(self):
+        """
+        Test: A 300 s window sampled every second summarizes all 300
+        samples, including the extremes at its start.
+        """
+        aggregator = Aggregator(self.out.append, window=300, default_deadband=1000)
+        aggregator.add(Frame(0, {"flow_temp": 10.0}))
+        for t in range(1, 300):
+            aggregator.add(Frame(t, {"flow_temp": 50.0}))
+        aggregator.add(Frame(300, {"flow_temp": 50.0}))
+
+        window = [f for f in self.out if f.kind == "window"][0].readings["flow_temp"]
+        self.assertEqual((window["count"], window["min"], window["max"]), (300, 10.0, 50.0))
+        self.assertEqual(window["mean"], round((10.0 + 299 * 50.0) / 300, 3))
+
+    def test_close_emits_the_open_window(self):
+        aggregator = Aggregator(self.out.append, window=60, default_deadband=100)
+        aggregator.add(Frame(0, {"flow_temp": 50.0}))
+        aggregator.add(Frame(30, {"flow_temp": 52.0}))
+        aggregator.close()
+        aggregator.close()
+
+        window = [f for f in self.out if f.kind == "window"]
+        self.assertEqual(len(window), 1)
+        self.assertEqual(window[0].readings["flow_temp"]["count"], 2)
+
+    def test_non_numeric_readings_are_ignored(self):
+        aggregator = Aggregator(self.out.append, window=60)
+        aggregator.add(Frame(0, {"mode": "eco"}))
+        aggregator.flush()
+
+        self.assertEqual(self.out, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import base64
+import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import codec
+
+
+def status_payload(status="INACTIVE", real_state="INACTIVE", reason="event_change"):
+    return {
+        "device_id": "heating-pump-pi-01",
+        "timestamp": 1700000000,
+        "status": status,
+        "real_state": real_state,
+        "sensor_voltage": 1 if real_state == "ACTIVE" else 0,
+        "metadata": {"location": "Boiler Room", "reason": reason, "version": "1.0"}
+    }
+
+
+class TestBinaryCodec(unittest.TestCase):
+
+    def test_round_trip_preserves_contract_fields(self):
+        """
+        DATA CONTRACT TEST:
+        Decoding a binary frame yields the same fields the JSON payload carries
+        (location is dropped: it is static per device).
+        """
+        payload = status_payload("HEARTBEAT_OK", "ACTIVE", "heartbeat")
+
+        decoded = codec.decode_binary(codec.encode_binary(payload))
+
+        for field in ("device_id", "timestamp", "status", "real_state", "sensor_voltage"):
+            self.assertEqual(decoded[field], payload[field])
+        self.assertEqual(decoded["metadata"]["reason"], "heartbeat")
+
+    def test_schema_v2_keeps_milliseconds_and_sequence(self):
+        """
+        DATA CONTRACT TEST:
+        Payload 2.0 fields travel in schema version 2, so two events within
+        one second still get distinct keys in the events table.
+        """
+        payload = dict(status_payload(), timestamp_ms=1700000000123, seq=7)
+
+        frame = codec.encode_binary(payload)
+        decoded = codec.decode_binary(frame)
+
+        self.assertEqual(frame[0], codec.SCHEMA_V2)
+        self.assertEqual((decoded["timestamp"], decoded["timestamp_ms"], decoded["seq"]),
+                         (1700000000, 1700000000123, 7))
+        self.assertEqual(decoded["metadata"]["version"], "2.0")
+        self.assertNotIn("seq", codec.decode_binary(codec.encode_binary(status_payload())))
+
+    def test_binary_frame_is_much_smaller_than_json(self):
+        payload = status_payload()
+
+        self.assertLess(len(codec.encode_binary(payload)) * 4, len(codec.encode_json(payload)))
+
+    def test_inactive_change_matches_iot_rule_prefix(self):
+        """
+        Test: The binary alert rule filters on base64 prefixes "AQAA" (v1)
+        and "AgAA" (v2); INACTIVE changes must match them, other frames must not.
+        """
+        def prefix(payload):
+            return base64.b64encode(codec.encode_binary(payload)).decode()[:4]
+
+        for extra, expected in (({}, "AQAA"), ({"timestamp_ms": 1700000000123, "seq": 7}, "AgAA")):
+            heartbeat = status_payload("HEARTBEAT_OK", "INACTIVE", "heartbeat")
+            self.assertEqual(prefix(dict(status_payload(), **extra)), expected)
+            self.assertNotEqual(prefix(dict(status_payload("ACTIVE", "ACTIVE"), **extra)), expected)
+            self.assertNotEqual(prefix(dict(heartbeat, **extra)), expected)
+
+    def test_unknown_schema_version_rejected(self):
+        frame = bytearray(codec.encode_binary(status_payload()))
+        frame[0] = 99
+
+        with self.assertRaises(ValueError):
+            codec.decode_binary(bytes(frame))
+
+    def test_json_encoder_matches_legacy_format(self):
+        payload = status_payload()
+
+        self.assertEqual(json.loads(codec.encode_json(payload)), payload)
+
+
+if __name__ == '__main__':
+    unittest.main()
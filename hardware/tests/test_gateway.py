@@ -0,0 +1,106 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+from concurrent.futures import Future
+from unittest.mock import patch, MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.gateway import Gateway, device_config
+
+
+def done_future(result=None):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def fake_connection(*args, **kwargs):
+    connection = MagicMock()
+    connection.client_id = kwargs["client_id"]
+    connection.connect.return_value = done_future()
+    connection.disconnect.return_value = done_future()
+    connection.subscribe.return_value = (done_future(), 1)
+    connection.publish.side_effect = lambda **kw: (done_future(), 1)
+    return connection
+
+
+class TestGateway(unittest.TestCase):
+
+    def setUp(self):
+        patchers = [
+            patch('src.monitor.mqtt_connection_builder'),
+            patch('src.monitor.IS_RASPBERRY_PI', False),
+            patch('src.monitor._load_aws_sdk'),
+            patch('src.monitor.io'),
+            patch('src.monitor.mqtt'),
+        ]
+        self.builder = [p.start() for p in patchers][0]
+        for p in patchers:
+            self.addCleanup(p.stop)
+        self.builder.mtls_from_path.side_effect = fake_connection
+
+        self.config = {
+            "endpoint": "test-endpoint.iot.us-east-1.amazonaws.com",
+            "thing_name": "heating-gateway-01",
+            "max_connections": 2,
+            "devices": [
+                {"device_id": f"boiler-{n}", "pin": 17 + n, "location": f"House {n}"} for n in range(5)
+            ],
+        }
+
+    def test_devices_get_their_own_topics(self):
+        config = device_config(self.config, self.config["devices"][1])
+
+        self.assertEqual(config["topic"], "home/heating/status/boiler-1")
+        self.assertEqual(config["command_topic"], "home/heating/commands/boiler-1")
+        self.assertEqual(config["endpoint"], self.config["endpoint"])
+        self.assertNotIn("devices", config)
+
+    def test_duplicate_devices_are_rejected(self):
+        self.config["devices"].append({"device_id": "boiler-0", "pin": 40})
+
+        with self.assertRaises(ValueError):
+            Gateway(self.config)
+
+    def test_devices_share_a_bounded_connection_pool(self):
+        """
+        Test: Five devices are multiplexed over two MQTT connections built on one
+        shared bootstrap. Every device publishes its initial state on its own
+        topic, and each connection is opened and closed exactly once.
+        """
+        gateway = Gateway(self.config)
+        self.assertEqual([len(p.monitors) for p in gateway.pool], [3, 2])
+        self.builder.mtls_from_path.assert_not_called()
+
+        async def main():
+            task = asyncio.create_task(gateway.serve(heartbeat_interval=3600, drain_timeout=0.5))
+            await asyncio.sleep(0.3)
+            gateway.stop()
+            await asyncio.wait_for(task, timeout=2)
+
+        asyncio.run(main())
+
+        client_ids = [c.kwargs["client_id"] for c in self.builder.mtls_from_path.call_args_list]
+        self.assertEqual(client_ids, ["heating-gateway-01-0", "heating-gateway-01-1"])
+        bootstraps = {id(c.kwargs["client_bootstrap"]) for c in self.builder.mtls_from_path.call_args_list}
+        self.assertEqual(len(bootstraps), 1)
+
+        topics = set()
+        for pooled in gateway.pool:
+            pooled.connection.connect.assert_called_once()
+            pooled.connection.disconnect.assert_called_once()
+            self.assertEqual(pooled.connection.subscribe.call_count, len(pooled.monitors))
+            for call in pooled.connection.publish.call_args_list:
+                payload = json.loads(call.kwargs["payload"])
+                self.assertEqual(call.kwargs["topic"], f"home/heating/status/{payload['device_id']}")
+                topics.add(call.kwargs["topic"])
+
+        self.assertEqual(len(topics), 5)
+        self.assertTrue(all(len(m.outbox) == 0 for m in gateway.monitors))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,6 +24,12 @@ class TestHeatingMonitor(unittest.TestCase):
             "endpoint": "test-endpoint.iot.us-east-1.amazonaws.com"
         })
 
+        # 2. Keep the lazy AWS SDK loader from importing; the builder is patched per test
+        for name in ('_load_aws_sdk', 'io', 'mqtt'):
+            patcher = patch(f'src.monitor.{name}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
     @patch('src.monitor.mqtt_connection_builder') # Mock AWS IoT Builder
     @patch('builtins.open', new_callable=mock_open) # Mock file opening
     @patch('os.path.exists') # Mock file existence check
@@ -125,6 +131,29 @@ class TestHeatingMonitor(unittest.TestCase):
         self.assertEqual(sent_payload["metadata"]["reason"], "event_change")
         self.assertEqual(sent_payload["metadata"]["location"], "Boiler Room")
 
+    @patch('src.monitor.mqtt_connection_builder')
+    @patch('builtins.open', new_callable=mock_open)
+    @patch('os.path.exists', return_value=True)
+    def test_payload_v2_orders_events_within_one_second(self, mock_exists, mock_file, mock_builder):
+        """
+        DATA CONTRACT TEST (version 2.0):
+        Two transitions within the same second keep the whole-second timestamp
+        but carry millisecond time and an increasing sequence number, from
+        which the storage rule builds distinct sort keys.
+        """
+        mock_file.return_value.read.return_value = self.mock_config_content
+        device = monitor.HeatingMonitor()
+        mock_connection = mock_builder.mtls_from_path.return_value
+
+        device.publish_status("ACTIVE", reason="event_change", timestamp=1700000000.2504)
+        device.publish_status("INACTIVE", reason="event_change", timestamp=1700000000.9)
+        first, second = [json.loads(c[1]['payload']) for c in mock_connection.publish.call_args_list[-2:]]
+
+        self.assertEqual(first["timestamp"], second["timestamp"])
+        self.assertEqual((first["timestamp_ms"], second["timestamp_ms"]), (1700000000250, 1700000000900))
+        self.assertEqual(second["seq"], first["seq"] + 1)
+        self.assertEqual(first["metadata"]["version"], "2.0")
+
     @patch('src.monitor.mqtt_connection_builder')
     @patch('builtins.open', new_callable=mock_open)
     @patch('os.path.exists', return_value=True)
@@ -149,5 +178,24 @@ class TestHeatingMonitor(unittest.TestCase):
         self.assertEqual(sent_payload["real_state"], "INACTIVE") # Real status preserved
         self.assertEqual(sent_payload["metadata"]["reason"], "heartbeat")
 
+    @patch('src.monitor.mqtt_connection_builder')
+    @patch('builtins.open', new_callable=mock_open)
+    @patch('os.path.exists', return_value=True)
+    def test_offline_events_are_buffered_in_outbox(self, mock_exists, mock_file, mock_builder):
+        """
+        Test: While the link is down, events are persisted to the outbox
+        instead of being handed to the MQTT client.
+        """
+        mock_file.return_value.read.return_value = self.mock_config_content
+        device = monitor.HeatingMonitor()
+        mock_connection = mock_builder.mtls_from_path.return_value
+
+        device._on_connection_interrupted(mock_connection, error="timeout")
+        device.publish_status("INACTIVE", reason="event_change")
+
+        mock_connection.publish.assert_not_called()
+        self.assertEqual(len(device.outbox), 1)
+        self.assertEqual(json.loads(device.outbox.pending(1)[0].payload)["status"], "INACTIVE")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
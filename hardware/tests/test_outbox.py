@@ -0,0 +1,130 @@
+import asyncio
+import unittest
+import sys
+import os
+import tempfile
+from concurrent.futures import Future
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.outbox import Outbox, OutboxDrainer
+
+
+def acked_future():
+    future = Future()
+    future.set_result(None)
+    return future
+
+
+class TestOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "data", "outbox.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_entries_survive_reopen(self):
+        """
+        Test: Unacknowledged events are still there after a restart (e.g. power cut).
+        """
+        outbox = Outbox(self.path)
+        outbox.append("home/heating/status", '{"status": "ACTIVE"}')
+        outbox.close()
+
+        reopened = Outbox(self.path)
+        entries = reopened.pending(10)
+
+        self.assertEqual(len(reopened), 1)
+        self.assertEqual(entries[0].payload, '{"status": "ACTIVE"}')
+        reopened.close()
+
+    def test_ack_trims_entries(self):
+        """
+        Test: Acknowledged entries are removed and the counters follow.
+        """
+        outbox = Outbox(self.path)
+        first = outbox.append("t", "a" * 10)
+        outbox.append("t", "b" * 5)
+
+        outbox.ack([first])
+
+        self.assertEqual(len(outbox), 1)
+        self.assertEqual(outbox.size_bytes, 5)
+        self.assertEqual(outbox.pending(10)[0].payload, "b" * 5)
+        outbox.close()
+
+    def test_size_cap_evicts_oldest_first(self):
+        """
+        Test: When the cap is exceeded the oldest entries are dropped, the newest kept.
+        """
+        outbox = Outbox(self.path, max_entries=3)
+        for i in range(5):
+            outbox.append("t", str(i))
+
+        self.assertEqual(len(outbox), 3)
+        self.assertEqual([e.payload for e in outbox.pending(10)], ["2", "3", "4"])
+        outbox.close()
+
+
+class TestOutboxDrainer(unittest.TestCase):
+
+    def test_drain_replays_backlog_in_order_and_trims(self):
+        """
+        Test: After reconnecting, the whole backlog is replayed oldest first
+        and removed from the outbox once acknowledged.
+        """
+        outbox = Outbox(":memory:")
+        for i in range(7):
+            outbox.append("t", str(i))
+        sent = []
+
+        def publish(entry):
+            sent.append(entry.payload)
+            return acked_future()
+
+        drainer = OutboxDrainer(outbox, publish, batch_size=3, rate=10000)
+
+        self.assertTrue(asyncio.run(drainer.drain()))
+        self.assertEqual(sent, [str(i) for i in range(7)])
+        self.assertEqual(len(outbox), 0)
+
+    def test_failed_publish_keeps_entry(self):
+        """
+        Test: If the PUBACK never succeeds, the entry stays for the next replay.
+        """
+        outbox = Outbox(":memory:")
+        outbox.append("t", "lost?")
+
+        def publish(entry):
+            future = Future()
+            future.set_exception(RuntimeError("connection lost"))
+            return future
+
+        drainer = OutboxDrainer(outbox, publish, rate=10000)
+
+        self.assertFalse(asyncio.run(drainer.drain()))
+        self.assertEqual(len(outbox), 1)
+
+    def test_live_send_acks_individually(self):
+        """
+        Test: A live event sent directly is trimmed when its PUBACK arrives.
+        """
+        outbox = Outbox(":memory:")
+        entry_id = outbox.append("t", "live")
+        pending = Future()
+        drainer = OutboxDrainer(outbox, lambda entry: pending)
+
+        drainer.send(outbox.pending(1)[0])
+        self.assertEqual(len(outbox), 1)
+        # Not re-sent by a concurrent drain while still in flight
+        self.assertIsNone(drainer.send(outbox.pending(1)[0]))
+
+        pending.set_result(None)
+        self.assertEqual(len(outbox), 0)
+        self.assertEqual(outbox.pending(1, after_id=entry_id - 1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
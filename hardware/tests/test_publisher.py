@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import threading
+from concurrent.futures import Future
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.publisher import Publisher, WindowFull
+
+
+class FakeBroker:
+    """Records publishes and lets the test decide when each PUBACK arrives"""
+
+    def __init__(self):
+        self.futures = []
+        self.fail_next = 0
+
+    def publish(self, topic, payload):
+        future = Future()
+        if self.fail_next:
+            self.fail_next -= 1
+            future.set_exception(RuntimeError("connection lost"))
+        self.futures.append(future)
+        return future, len(self.futures)
+
+
+class TestPublisher(unittest.TestCase):
+
+    def test_window_full_blocks_then_raises(self):
+        """
+        Test: Once max_inflight publishes await a PUBACK, further submits
+        block and finally raise WindowFull (backpressure).
+        """
+        broker = FakeBroker()
+        publisher = Publisher(broker.publish, max_inflight=2)
+        publisher.submit(1, "t", "a")
+        publisher.submit(2, "t", "b")
+
+        with self.assertRaises(WindowFull):
+            publisher.submit(3, "t", "c", timeout=0.01)
+        self.assertEqual(publisher.stats()["inflight"], 2)
+
+    def test_puback_frees_slot_for_blocked_submit(self):
+        """
+        Test: A blocked submit proceeds as soon as a PUBACK frees a slot.
+        """
+        broker = FakeBroker()
+        publisher = Publisher(broker.publish, max_inflight=1)
+        publisher.submit(1, "t", "a")
+
+        threading.Timer(0.02, broker.futures[0].set_result, args=(None,)).start()
+        publisher.submit(2, "t", "b", timeout=1)
+
+        self.assertEqual(len(broker.futures), 2)
+        self.assertEqual(publisher.stats()["acked"], 1)
+
+    def test_tracks_packet_id_and_latency(self):
+        """
+        Test: In-flight messages expose their packet id; acked ones feed the latency stats.
+        """
+        broker = FakeBroker()
+        publisher = Publisher(broker.publish)
+        result = publisher.submit("evt-1", "t", "a")
+
+        self.assertEqual(publisher.inflight()[0]["packet_id"], 1)
+        broker.futures[0].set_result(None)
+
+        self.assertEqual(result.result(timeout=1).attempts, 1)
+        stats = publisher.stats()
+        self.assertEqual(stats["inflight"], 0)
+        self.assertIsNotNone(stats["ack_latency_p50"])
+
+    def test_failed_publish_is_retried_then_reported(self):
+        """
+        Test: Failed publishes are retried up to max_retries, then the result future fails.
+        """
+        broker = FakeBroker()
+        broker.fail_next = 1
+        publisher = Publisher(broker.publish, max_retries=2)
+        ok = publisher.submit(1, "t", "a")
+        broker.futures[-1].set_result(None)
+        self.assertEqual(ok.result(timeout=1).attempts, 2)
+
+        broker.fail_next = 3
+        failed = publisher.submit(2, "t", "b")
+        with self.assertRaises(RuntimeError):
+            failed.result(timeout=1)
+
+        stats = publisher.stats()
+        self.assertEqual((stats["acked"], stats["failed"], stats["retries"]), (1, 1, 3))
+        self.assertEqual(stats["inflight"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
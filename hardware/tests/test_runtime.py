@@ -0,0 +1,201 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+import threading
+import time
+from concurrent.futures import Future
+from unittest.mock import patch, mock_open
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import monitor
+from src.runtime import EdgeRuntime, backoff_delay
+from src.sampling import Sampler, SampleScheduler
+
+
+def done_future(result=None):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class TestEdgeRuntime(unittest.TestCase):
+
+    def setUp(self):
+        patchers = [
+            patch('src.monitor.mqtt_connection_builder'),
+            patch('builtins.open', new_callable=mock_open,
+                  read_data=json.dumps({"endpoint": "test-endpoint.iot.us-east-1.amazonaws.com"})),
+            patch('os.path.exists', return_value=True),
+            patch('src.monitor.IS_RASPBERRY_PI', False),
+            patch('src.monitor._load_aws_sdk'),
+            patch('src.monitor.io'),
+            patch('src.monitor.mqtt'),
+        ]
+        mocks = [p.start() for p in patchers]
+        for p in patchers:
+            self.addCleanup(p.stop)
+
+        self.connection = mocks[0].mtls_from_path.return_value
+        self.connection.connect.return_value = done_future()
+        self.connection.disconnect.return_value = done_future()
+        self.connection.subscribe.return_value = (done_future(), 1)
+        self.connection.publish.side_effect = lambda **kwargs: (done_future(), 1)
+
+        self.device = monitor.HeatingMonitor()
+
+    def published(self):
+        return [json.loads(c.kwargs["payload"]) for c in self.connection.publish.call_args_list]
+
+    def run_runtime(self, scenario, heartbeat_interval=3600):
+        runtime = EdgeRuntime(self.device, heartbeat_interval=heartbeat_interval, drain_timeout=0.5)
+
+        async def main():
+            task = asyncio.create_task(runtime.run())
+            await asyncio.sleep(0.2)
+            await scenario(runtime)
+            runtime.stop()
+            await asyncio.wait_for(task, timeout=2)
+
+        asyncio.run(main())
+        return runtime
+
+    def test_initial_state_then_heartbeat_on_one_loop(self):
+        """
+        Test: The simulated input's initial state is published first,
+        followed by the first heartbeat, without any helper thread.
+        """
+        async def scenario(runtime):
+            pass
+
+        self.run_runtime(scenario)
+
+        reasons = [p["metadata"]["reason"] for p in self.published()]
+        self.assertEqual(reasons[:2], ["event_change", "heartbeat"])
+        self.connection.subscribe.assert_called_once()
+        self.connection.disconnect.assert_called_once()
+
+    def test_commands_are_dispatched(self):
+        """
+        Test: A "status" command received on home/heating/commands triggers a status publish.
+        """
+        async def scenario(runtime):
+            callback = self.connection.subscribe.call_args.kwargs["callback"]
+            callback(topic="home/heating/commands", payload=b'{"command": "status"}')
+            callback(topic="home/heating/commands", payload=b'not json')
+            await asyncio.sleep(0.05)
+
+        self.run_runtime(scenario)
+
+        self.assertIn("command", [p["metadata"]["reason"] for p in self.published()])
+
+    def test_sensor_reads_run_off_the_event_loop(self):
+        """
+        Test: A blocking sensor read (a DS18B20 conversion) runs on the sampler
+        worker; the frame is still handed to the sink on the loop's thread.
+        """
+        threads = {"read": [], "sink": []}
+
+        class SlowProbe(Sampler):
+            def read(self):
+                threads["read"].append(threading.current_thread().name)
+                time.sleep(0.05)
+                return 21.5
+
+        scheduler = SampleScheduler([SlowProbe("flow_temp", 0.05)],
+                                    sink=lambda frame: threads["sink"].append(threading.current_thread().name))
+        self.device.build_scheduler = lambda: scheduler
+
+        async def scenario(runtime):
+            await asyncio.sleep(0.2)
+
+        self.run_runtime(scenario)
+
+        self.assertTrue(threads["read"])
+        self.assertTrue(all(name.startswith("sampler") for name in threads["read"]))
+        self.assertEqual(set(threads["sink"]), {threading.main_thread().name})
+
+    def test_outbox_backlog_replayed_after_connect(self):
+        """
+        Test: Events buffered before the runtime started are replayed and trimmed.
+        """
+        self.device.online = False
+        self.device.publish_status("INACTIVE", reason="event_change", timestamp=1700000000)
+        self.device.online = None
+
+        async def scenario(runtime):
+            pass
+
+        self.run_runtime(scenario)
+
+        self.assertIn(1700000000, [p["timestamp"] for p in self.published()])
+        self.assertEqual(len(self.device.outbox), 0)
+
+    def test_shutdown_drain_is_bounded(self):
+        """
+        Test: Unacknowledged publishes do not block shutdown beyond drain_timeout.
+        """
+        self.connection.publish.side_effect = lambda **kwargs: (Future(), 1)
+
+        async def scenario(runtime):
+            pass
+
+        self.run_runtime(scenario)
+
+        self.connection.disconnect.assert_called_once()
+        self.assertGreater(len(self.device.outbox), 0)
+
+    def test_fast_start_buffers_until_background_connect_succeeds(self):
+        """
+        Test: In fast-start mode no connection is built at start-up; the state is
+        sampled and buffered immediately, and connect failures are retried with
+        backoff instead of crashing the process.
+        """
+        builder = monitor.mqtt_connection_builder
+        builder.mtls_from_path.reset_mock()
+        device = monitor.HeatingMonitor(fast_start=True)
+        self.assertIsNone(device.mqtt_connection)
+        builder.mtls_from_path.assert_not_called()
+
+        failed = Future()
+        failed.set_exception(RuntimeError("broker unreachable"))
+        self.connection.connect.side_effect = [failed, done_future()]
+        self.device = device
+
+        async def scenario(runtime):
+            await asyncio.sleep(0.5)
+
+        with patch('src.runtime.backoff_delay', return_value=0.01):
+            self.run_runtime(scenario)
+
+        self.assertEqual(self.connection.connect.call_count, 2)
+        builder.mtls_from_path.assert_called_once()
+        self.assertIn("connected", device.startup.marks)
+        self.assertEqual(self.published()[0]["metadata"]["reason"], "event_change")
+
+    def test_failed_subscribe_is_retried_without_reconnecting(self):
+        failed = Future()
+        failed.set_exception(RuntimeError("SUBACK timeout"))
+        self.connection.subscribe.side_effect = [(failed, 1), (done_future(), 2)]
+
+        async def scenario(runtime):
+            await asyncio.sleep(0.2)
+
+        with patch('src.runtime.backoff_delay', return_value=0.01):
+            self.run_runtime(scenario)
+
+        self.connection.connect.assert_called_once()
+        self.assertEqual(self.connection.subscribe.call_count, 2)
+        self.assertEqual(self.published()[0]["metadata"]["reason"], "event_change")
+
+    def test_backoff_delay_is_jittered_and_capped(self):
+        delays = [backoff_delay(attempt, base=1, cap=30) for attempt in range(20) for _ in range(5)]
+
+        self.assertTrue(all(0 <= d <= 30 for d in delays))
+        self.assertLessEqual(backoff_delay(0, base=1, cap=30), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
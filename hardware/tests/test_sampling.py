@@ -0,0 +1,120 @@
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import sampling
+from src.sampling import SampleScheduler, Sampler, build_samplers
+
+
+class CountingSampler(Sampler):
+    def __init__(self, name, period, value=1.0):
+        super().__init__(name, period)
+        self.value = value
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        return self.value
+
+
+class TestSampleScheduler(unittest.TestCase):
+
+    def test_default_tick_is_gcd_of_periods(self):
+        """
+        Test: With 2 s and 5 s samplers the wheel ticks every second, not faster.
+        """
+        scheduler = SampleScheduler([CountingSampler("a", 2), CountingSampler("b", 5)], sink=MagicMock())
+
+        self.assertEqual(scheduler.tick, 1.0)
+
+    def test_readings_in_same_tick_are_coalesced_into_one_frame(self):
+        """
+        Test: Samplers due in the same tick produce a single frame,
+        each sampler runs at its own period.
+        """
+        fast, slow = CountingSampler("flow_temp", 1, 55.5), CountingSampler("return_temp", 3, 40.0)
+        frames = []
+        scheduler = SampleScheduler([fast, slow], sink=frames.append)
+
+        for second in range(6):
+            scheduler.advance(timestamp=second)
+
+        self.assertEqual(len(frames), 6)
+        self.assertEqual(frames[0].readings, {"flow_temp": 55.5, "return_temp": 40.0})
+        self.assertEqual(frames[1].readings, {"flow_temp": 55.5})
+        self.assertEqual((fast.reads, slow.reads), (6, 2))
+
+    def test_periods_longer_than_the_wheel_still_fire_on_time(self):
+        """
+        Test: A period spanning several wheel rotations is not triggered early.
+        """
+        sampler = CountingSampler("slow", 10)
+        scheduler = SampleScheduler([sampler], sink=MagicMock(), tick=1, wheel_size=4)
+
+        emitted = [scheduler.advance(timestamp=t) is not None for t in range(21)]
+
+        self.assertEqual([t for t, e in enumerate(emitted) if e], [0, 10, 20])
+
+    def test_failing_sampler_does_not_drop_the_frame(self):
+        broken = CountingSampler("broken", 1)
+        broken.read = MagicMock(side_effect=OSError("sensor unplugged"))
+        frames = []
+        scheduler = SampleScheduler([broken, CountingSampler("ok", 1)], sink=frames.append)
+
+        scheduler.advance()
+
+        self.assertEqual(frames[0].readings, {"ok": 1.0})
+
+
+class TestSamplerRegistry(unittest.TestCase):
+
+    def test_build_samplers_from_config(self):
+        """
+        Test: iot_config.json sampler definitions map to registered sampler types.
+        """
+        gpio = MagicMock()
+        gpio.LOW = 0
+        gpio.input.return_value = 0
+        samplers = build_samplers([
+            {"type": "gpio", "name": "pump", "period": 1, "pin": 17},
+            {"type": "relay", "name": "burner", "period": 5, "pin": 27},
+            {"type": "w1_temperature", "name": "flow_temp", "period": 10, "sensor_id": "0316a2794fff"},
+        ], gpio=gpio)
+
+        self.assertEqual([s.kind for s in samplers], ["gpio", "relay", "w1_temperature"])
+        self.assertEqual(samplers[0].read(), 1)  # pump input is active LOW
+        self.assertEqual(samplers[1].read(), 0)  # relay contact is active HIGH
+
+    def test_w1_temperature_uses_mocked_sensor_library(self):
+        with patch.object(sys.modules["w1thermsensor"], "W1ThermSensor") as mock_sensor:
+            mock_sensor.return_value.get_temperature.return_value = 61.237
+            sampler = build_samplers([{"type": "w1_temperature", "name": "flow_temp", "period": 10}])[0]
+
+            self.assertEqual(sampler.read(), 61.24)
+
+    def test_unknown_sampler_type_rejected(self):
+        with self.assertRaises(ValueError):
+            build_samplers([{"type": "thermocouple", "name": "x", "period": 1}])
+
+    def test_custom_sampler_can_be_registered(self):
+        @sampling.register_sampler("constant")
+        class ConstantSampler(Sampler):
+            def __init__(self, name, period, value, gpio=None):
+                super().__init__(name, period)
+                self.value = value
+
+            def read(self):
+                return self.value
+
+        try:
+            sampler = build_samplers([{"type": "constant", "name": "c", "period": 1, "value": 7}])[0]
+            self.assertEqual(sampler.read(), 7)
+        finally:
+            sampling.SAMPLER_TYPES.pop("constant")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import json
+import sys
+import os
+import tempfile
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import monitor
+from src.simulation import FakeMqttConnection, PumpTrace, SimulatedInput, fake_mqtt, run_benchmark, run_hot_path
+
+
+class TestPumpTrace(unittest.TestCase):
+
+    def test_synthetic_trace_is_deterministic(self):
+        first = PumpTrace.synthetic(toggle_rate=50, duration=2, burst_probability=0.3, jitter=0.001, seed=7)
+        second = PumpTrace.synthetic(toggle_rate=50, duration=2, burst_probability=0.3, jitter=0.001, seed=7)
+
+        self.assertEqual(first.transitions, second.transitions)
+        self.assertGreater(len(first), 50)
+
+    def test_recorded_trace_round_trip(self):
+        trace = PumpTrace([(0.5, "ACTIVE"), (1.25, "INACTIVE")])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.csv")
+            trace.save(path)
+
+            self.assertEqual(PumpTrace.load(path).transitions, trace.transitions)
+
+    def test_simulated_input_replays_trace(self):
+        now = [0.0]
+        source = SimulatedInput(PumpTrace([(1.0, "ACTIVE"), (2.0, "INACTIVE")]), clock=lambda: now[0])
+
+        readings = []
+        for now[0] in (0.5, 1.5, 2.5):
+            readings.append(source.read())
+
+        self.assertEqual(readings, ["INACTIVE", "ACTIVE", "INACTIVE"])
+
+
+class TestHotPathBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(monitor, "mqtt", fake_mqtt)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connection = FakeMqttConnection()
+        self.device = monitor.HeatingMonitor(config={"endpoint": "simulated"}, connection=self.connection)
+
+    def tearDown(self):
+        self.device.cleanup()
+
+    def statuses(self):
+        return [json.loads(payload)["status"] for _, _, payload in self.connection.published]
+
+    def test_replayed_trace_is_debounced_published_and_acknowledged(self):
+        """
+        REGRESSION GUARD:
+        A bouncing trace replayed through SimulatedInput and the debounced
+        poller: bursts collapse, every settled change is published once, in
+        alternating order, and trimmed from the outbox.
+        """
+        trace = PumpTrace.synthetic(toggle_rate=20, duration=1, burst_probability=0.3, seed=1)
+
+        results = run_benchmark(self.device, self.connection, trace)
+
+        statuses = self.statuses()
+        self.assertEqual(results["published"], results["changes"])
+        self.assertTrue(all(a != b for a, b in zip(statuses, statuses[1:])))
+        self.assertEqual(statuses[-1], trace.transitions[-1][1])
+        self.assertGreater(results["debounced_away"], 0)
+        self.assertEqual(results["deferred_to_outbox"], 0)
+
+    def test_every_transition_is_published_on_the_hot_path(self):
+        """
+        Test: Thousands of transitions pushed straight into handle_change are
+        each published once and trimmed from the outbox.
+        """
+        trace = PumpTrace.synthetic(toggle_rate=1000, duration=2, seed=1)
+
+        results = run_hot_path(self.device, self.connection, trace)
+
+        statuses = self.statuses()
+        self.assertEqual(results["published"], len(trace))
+        self.assertTrue(all(a != b for a, b in zip(statuses, statuses[1:])))
+        self.assertEqual(results["deferred_to_outbox"], 0)
+        self.assertIsNotNone(results["publish_latency_ms_p99"])
+
+    def test_slow_pubacks_are_deferred_not_lost(self):
+        """
+        Test: When PUBACKs stop arriving the window fills up and further events
+        stay in the outbox instead of growing memory.
+        """
+        self.connection.auto_ack = False
+        trace = PumpTrace.synthetic(toggle_rate=1000, duration=0.2, seed=2)
+
+        results = run_hot_path(self.device, self.connection, trace)
+
+        self.assertEqual(results["published"], self.device.publisher.max_inflight)
+        self.assertEqual(results["deferred_to_outbox"], len(trace))
+        self.connection.ack_all()
+        self.assertEqual(len(self.device.outbox), len(trace) - self.device.publisher.max_inflight)
+
+
+if __name__ == '__main__':
+    unittest.main()
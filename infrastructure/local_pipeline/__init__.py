@@ -0,0 +1,3 @@
+from .pipeline import LocalPipeline, MessageBus, INGESTION_DIRECT, INGESTION_SQS
+
+__all__ = ["LocalPipeline", "MessageBus", "INGESTION_DIRECT", "INGESTION_SQS"]
@@ -0,0 +1,103 @@
+import json
+import re
+import threading
+import time
+from collections import namedtuple
+
+# In-memory stand-ins for the AWS services and chat APIs the pipeline talks
+# to. Each one implements just the calls the deployed code makes.
+
+Delivery = namedtuple("Delivery", ["url", "payload", "received_at"])
+
+DEVICE_MENTION = re.compile(r"<code>([^<]+)</code>")
+
+
+class InMemoryTable:
+    """DynamoDB table with the boto3 Table resource's put_item/get_item/query shape"""
+
+    def __init__(self, partition_key, sort_key=None):
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def _key(self, item):
+        if self.partition_key not in item or (self.sort_key and self.sort_key not in item):
+            raise ValueError(f"Missing key attributes in {sorted(item)}")
+        return item[self.partition_key], item.get(self.sort_key) if self.sort_key else None
+
+    def put_item(self, Item):
+        key = self._key(Item)
+        with self._lock:
+            self._items[key] = dict(Item)
+        return {}
+
+    def get_item(self, Key):
+        with self._lock:
+            item = self._items.get(self._key(Key))
+        return {"Item": dict(item)} if item is not None else {}
+
+    def delete_item(self, Key):
+        with self._lock:
+            self._items.pop(self._key(Key), None)
+        return {}
+
+    def query(self, partition_value):
+        """Items of one partition, ordered by sort key"""
+        with self._lock:
+            items = [item for (pk, _), item in self._items.items() if pk == partition_value]
+        return sorted(items, key=lambda item: item.get(self.sort_key) if self.sort_key else 0)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class FakeSSM:
+    """get_parameters as called by the notifier's SecretCache"""
+
+    def __init__(self, parameters):
+        self.parameters = dict(parameters)
+        self.calls = 0
+
+    def get_parameters(self, Names, WithDecryption=False):
+        self.calls += 1
+        return {
+            'Parameters': [{'Name': name, 'Value': self.parameters[name]} for name in Names if name in self.parameters],
+            'InvalidParameters': [name for name in Names if name not in self.parameters],
+        }
+
+
+class HttpSink:
+    """
+    Replaces the notifier's shared HttpClient: every request succeeds after
+    `latency` seconds and is recorded with its arrival time, so alert latency
+    can be measured end to end. `status` can be changed to simulate outages.
+    """
+
+    def __init__(self, latency=0.0, status=200, clock=time.monotonic):
+        self.latency = latency
+        self.status = status
+        self.clock = clock
+        self.deliveries = []
+        self._lock = threading.Lock()
+
+    def post_json(self, url, payload, timeout, headers=None):
+        # Imported lazily: the notifier directory is only on sys.path once the pipeline is built
+        from channels.http import HttpResponse
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.deliveries.append(Delivery(url, payload, self.clock()))
+        timing = {"handshake_ms": 0.0, "request_ms": self.latency * 1000, "reused": True}
+        return HttpResponse(self.status, json.dumps({"ok": self.status == 200}).encode(), timing, {})
+
+    def mentioned_devices(self):
+        """(device_id, received_at) for every device named in a delivered message"""
+        mentions = []
+        with self._lock:
+            deliveries = list(self.deliveries)
+        for delivery in deliveries:
+            text = delivery.payload.get("text") or delivery.payload.get("content") or ""
+            mentions.extend((device_id, delivery.received_at) for device_id in DEVICE_MENTION.findall(text))
+        return mentions
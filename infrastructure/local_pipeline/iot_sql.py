@@ -0,0 +1,453 @@
+import base64
+import json
+import re
+import time
+from collections import Counter, namedtuple
+
+# The subset of AWS IoT SQL used by the rules in stacks/iot_rules.py, compiled
+# to Python closures so the load generator can push thousands of messages per
+# second through it. Anything outside the subset is rejected when the rule is
+# compiled, so a new rule fails loudly here instead of being evaluated wrongly.
+
+Message = namedtuple("Message", ["topic", "payload", "timestamp_ms"])
+
+# A field the payload does not have: omitted from the SELECT result, and any
+# expression involving it is undefined (a WHERE clause is then not satisfied).
+UNDEFINED = type("Undefined", (), {"__repr__": lambda self: "UNDEFINED"})()
+
+TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^']|'')*')
+      | (?P<number>\d+(?:\.\d+)?)
+      | (?P<op><>|!=|<=|>=|[=<>+\-*/%(),])
+      | (?P<ident>[A-Za-z_][A-Za-z0-9_.]*)
+    )""", re.VERBOSE)
+
+KEYWORDS = {"SELECT", "FROM", "WHERE", "AS", "AND", "OR", "NOT", "TRUE", "FALSE",
+            "CASE", "WHEN", "THEN", "ELSE", "END"}
+
+
+def tokenize(sql):
+    tokens, position = [], 0
+    sql = sql.rstrip()
+    while position < len(sql):
+        match = TOKEN.match(sql, position)
+        if match is None:
+            raise ValueError(f"Unexpected input at {position}: {sql[position:position + 20]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "ident" and value.upper() in KEYWORDS:
+            kind, value = "keyword", value.upper()
+        tokens.append((kind, value))
+    return tokens
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT filter matching: '+' is one level, '#' the rest (including the parent level)"""
+    filter_levels = topic_filter.split("/")
+    levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(levels) or (level != "+" and level != levels[index]):
+            return False
+    return len(levels) == len(filter_levels)
+
+
+def compile_topic_filter(topic_filter):
+    """topic_matches() for one filter, with the filter split once"""
+    if "+" not in topic_filter and "#" not in topic_filter:
+        return lambda topic: topic == topic_filter
+    if topic_filter == "#":
+        return lambda topic: True
+    levels = topic_filter.split("/")
+    if "+" not in topic_filter and levels[-1] == "#" and "#" not in levels[:-1]:
+        parent = "/".join(levels[:-1])
+        prefix = parent + "/"
+        return lambda topic: topic == parent or topic.startswith(prefix)
+    return lambda topic: topic_matches(topic_filter, topic)
+
+
+def _payload_object(message):
+    if isinstance(message.payload, (bytes, bytearray)):
+        try:
+            message_object = json.loads(message.payload)
+        except ValueError:
+            return UNDEFINED
+        return message_object if isinstance(message_object, dict) else UNDEFINED
+    return message.payload
+
+
+def _raw_payload(message):
+    if isinstance(message.payload, (bytes, bytearray)):
+        return bytes(message.payload)
+    return json.dumps(message.payload).encode("utf-8")
+
+
+def _field(path):
+    parts = path.split(".")
+
+    def get(message, document):
+        value = document
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                return UNDEFINED
+            value = value[part]
+        return value
+    return get
+
+
+def _arithmetic(op, left, right):
+    def evaluate(message, document):
+        a, b = left(message, document), right(message, document)
+        if a is UNDEFINED or b is UNDEFINED or isinstance(a, bool) or isinstance(b, bool):
+            return UNDEFINED
+        if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+            return UNDEFINED
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if b == 0:
+            return UNDEFINED
+        if op == "%":
+            return a % b
+        # Int / Int is an Int in IoT SQL
+        return int(a / b) if isinstance(a, int) and isinstance(b, int) else a / b
+    return evaluate
+
+
+COMPARISONS = {
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+def _comparison(op, left, right):
+    compare = COMPARISONS[op]
+
+    def evaluate(message, document):
+        a, b = left(message, document), right(message, document)
+        if a is UNDEFINED or b is UNDEFINED:
+            return UNDEFINED
+        try:
+            return compare(a, b)
+        except TypeError:
+            return UNDEFINED
+    return evaluate
+
+
+def _star(message, document):
+    return document
+
+
+def _function(name, args):
+    name = name.lower()
+    if name == "isundefined" and len(args) == 1:
+        value = args[0]
+        return lambda message, document: value(message, document) is UNDEFINED
+    if name == "timestamp" and not args:
+        return lambda message, document: message.timestamp_ms
+    if name == "topic" and len(args) <= 1:
+        level = args[0] if args else None
+
+        def topic(message, document):
+            if level is None:
+                return message.topic
+            index = level(message, document)
+            levels = message.topic.split("/")
+            return levels[index - 1] if isinstance(index, int) and 0 < index <= len(levels) else UNDEFINED
+        return topic
+    if name == "encode" and len(args) == 2:
+        value, encoding = args
+
+        def encode(message, document):
+            if encoding(message, document) != "base64":
+                return UNDEFINED
+            # encode(*, ...) works on the raw payload bytes, JSON or not
+            if value is _star:
+                data = _raw_payload(message)
+            else:
+                data = value(message, document)
+                if data is UNDEFINED:
+                    return UNDEFINED
+                data = data if isinstance(data, bytes) else str(data).encode("utf-8")
+            return base64.b64encode(data).decode("ascii")
+        return encode
+    if name == "startswith" and len(args) == 2:
+        text, prefix = args
+
+        def startswith(message, document):
+            a, b = text(message, document), prefix(message, document)
+            if not isinstance(a, str) or not isinstance(b, str):
+                return UNDEFINED
+            return a.startswith(b)
+        return startswith
+    raise ValueError(f"Unsupported IoT SQL function: {name}({len(args)} args)")
+
+
+class _Parser:
+    def __init__(self, sql):
+        self.tokens = tokenize(sql)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if (kind and token[0] != kind) or (value and token[1] != value):
+            raise ValueError(f"Expected {value or kind}, got {token[1]!r}")
+        self.position += 1
+        return token[1]
+
+    def accept(self, kind, value):
+        if self.peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def query(self):
+        self.take("keyword", "SELECT")
+        columns = [self.column(index) for index in self.comma_separated()]
+        self.take("keyword", "FROM")
+        topic_filter = self.string()
+        where = None
+        if self.accept("keyword", "WHERE"):
+            where = self.expression()
+        if self.peek()[0] is not None:
+            raise ValueError(f"Unexpected {self.peek()[1]!r} after the query")
+        return columns, topic_filter, where
+
+    def comma_separated(self):
+        index = 0
+        yield index
+        while self.accept("op", ","):
+            index += 1
+            yield index
+
+    def column(self, index):
+        if self.peek() == ("op", "*") and self.peek(1)[1] in (",", "FROM"):
+            self.position += 1
+            return None, _star
+        start, start_position = self.peek(), self.position
+        expression = self.expression()
+        if self.accept("keyword", "AS") or self.peek()[0] == "ident":
+            return self.take("ident"), expression
+        if start[0] == "ident" and self.position == start_position + 1:
+            return start[1].split(".")[-1], expression
+        return f"_{index + 1}", expression
+
+    def string(self):
+        return self.take("string")[1:-1].replace("''", "'")
+
+    def expression(self):
+        left = self.conjunction()
+        while self.accept("keyword", "OR"):
+            right = self.conjunction()
+            left = (lambda a, b: lambda m, d: a(m, d) is True or b(m, d) is True)(left, right)
+        return left
+
+    def conjunction(self):
+        left = self.negation()
+        while self.accept("keyword", "AND"):
+            right = self.negation()
+            left = (lambda a, b: lambda m, d: a(m, d) is True and b(m, d) is True)(left, right)
+        return left
+
+    def negation(self):
+        if self.accept("keyword", "NOT"):
+            inner = self.negation()
+            return lambda m, d: (lambda value: UNDEFINED if value is UNDEFINED else not value)(inner(m, d))
+        return self.comparison()
+
+    def comparison(self):
+        left = self.additive()
+        kind, value = self.peek()
+        if kind == "op" and value in COMPARISONS:
+            self.position += 1
+            return _comparison(value, left, self.additive())
+        return left
+
+    def additive(self):
+        left = self.term()
+        while self.peek() in (("op", "+"), ("op", "-")):
+            op = self.take("op")
+            left = _arithmetic(op, left, self.term())
+        return left
+
+    def term(self):
+        left = self.unary()
+        while self.peek() in (("op", "*"), ("op", "/"), ("op", "%")):
+            op = self.take("op")
+            left = _arithmetic(op, left, self.unary())
+        return left
+
+    def unary(self):
+        if self.accept("op", "-"):
+            return _arithmetic("-", lambda m, d: 0, self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.peek()
+        if kind == "number":
+            self.position += 1
+            number = float(value) if "." in value else int(value)
+            return lambda m, d: number
+        if kind == "string":
+            text = self.string()
+            return lambda m, d: text
+        if kind == "keyword" and value in ("TRUE", "FALSE"):
+            self.position += 1
+            flag = value == "TRUE"
+            return lambda m, d: flag
+        if (kind, value) == ("keyword", "CASE"):
+            self.position += 1
+            return self.case()
+        if (kind, value) == ("op", "("):
+            self.position += 1
+            inner = self.expression()
+            self.take("op", ")")
+            return inner
+        if (kind, value) == ("op", "*"):
+            self.position += 1
+            return _star
+        if kind == "ident":
+            self.position += 1
+            if self.accept("op", "("):
+                args = []
+                if not self.accept("op", ")"):
+                    args = [self.expression() for _ in self.comma_separated()]
+                    self.take("op", ")")
+                return _function(value, args)
+            return _field(value)
+        raise ValueError(f"Unexpected {value!r}")
+
+    def case(self):
+        """CASE v WHEN t1 THEN r1 ... [ELSE e] END: the first t equal to v; undefined without a match or ELSE"""
+        subject = self.expression()
+        branches = []
+        while self.accept("keyword", "WHEN"):
+            when = self.expression()
+            self.take("keyword", "THEN")
+            branches.append((when, self.expression()))
+        otherwise = self.expression() if self.accept("keyword", "ELSE") else (lambda m, d: UNDEFINED)
+        self.take("keyword", "END")
+        if not branches:
+            raise ValueError("CASE without WHEN")
+
+        def evaluate(message, document):
+            value = subject(message, document)
+            for when, result in branches:
+                if value is not UNDEFINED and value == when(message, document):
+                    return result(message, document)
+            return otherwise(message, document)
+        return evaluate
+
+
+class CompiledRule:
+    """
+    One IoT rule, parsed and compiled once: `evaluate(message)` returns the
+    SELECT result as a dict, or None if the topic does not match or the
+    WHERE clause is not satisfied.
+    """
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.columns, self.topic_filter, self.where = _Parser(sql).query()
+        self.matches_topic = compile_topic_filter(self.topic_filter)
+        self._select_all = [name for name, _ in self.columns] == [None]
+
+    def evaluate(self, message, document=None):
+        """`document` is the already decoded payload when several rules share a message"""
+        if not self.matches_topic(message.topic):
+            return None
+        if document is None:
+            document = _payload_object(message)
+        if self.where is not None and self.where(message, document) is not True:
+            return None
+
+        if self._select_all:
+            return dict(document) if isinstance(document, dict) else {}
+        result = {}
+        for name, expression in self.columns:
+            value = expression(message, document)
+            if name is None:
+                if isinstance(value, dict):
+                    result.update(value)
+            elif value is not UNDEFINED:
+                result[name] = value
+        return result
+
+
+class RuleSet:
+    """
+    Rules evaluated together over a stream of messages, decoding each payload
+    at most once. `stats` counts per rule how many messages matched its topic
+    filter and how many it forwarded to its action.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.stats = {rule.name: Counter() for rule in self.rules}
+
+    def evaluate(self, message):
+        """[(rule, result)] for every rule that forwards `message`"""
+        document = None
+        forwarded = []
+        for rule in self.rules:
+            stats = self.stats[rule.name]
+            stats["seen"] += 1
+            if not rule.matches_topic(message.topic):
+                continue
+            stats["topic_matched"] += 1
+            if document is None:
+                document = _payload_object(message)
+            result = rule.evaluate(message, document)
+            if result is not None:
+                stats["forwarded"] += 1
+                forwarded.append((rule, result))
+        return forwarded
+
+    def replay(self, messages):
+        """Evaluates a whole stream; returns {rule name: {"seen", "topic_matched", "forwarded"}}"""
+        for message in messages:
+            self.evaluate(message)
+        return self.report()
+
+    def report(self):
+        return {name: {key: stats[key] for key in ("seen", "topic_matched", "forwarded")}
+                for name, stats in self.stats.items()}
+
+
+def make_message(topic, payload, timestamp_ms=None):
+    """`payload` is the raw MQTT payload (bytes) or an already decoded JSON object"""
+    return Message(topic, payload, int(time.time() * 1000) if timestamp_ms is None else timestamp_ms)
+
+
+def load_traffic(path):
+    """
+    Yields Messages from a recorded traffic file: one JSON object per line with
+    "topic", the payload as "payload" (JSON) or "payload_base64" (binary), and
+    optionally "timestamp_ms".
+    """
+    with open(path, encoding="utf-8") as traffic:
+        for line in traffic:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "payload_base64" in record:
+                payload = base64.b64decode(record["payload_base64"])
+            else:
+                payload = json.dumps(record["payload"]).encode("utf-8")
+            yield make_message(record["topic"], payload, record.get("timestamp_ms"))
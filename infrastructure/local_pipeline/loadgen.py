@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from .pipeline import LocalPipeline, INGESTION_DIRECT, INGESTION_SQS
+
+# Pushes device status messages through a LocalPipeline at a fixed rate and
+# reports ingest throughput, alert latency percentiles and drops.
+#
+#   python -m infrastructure.local_pipeline.loadgen --devices 500 --rate 5000 --duration 3
+
+HARDWARE_SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "hardware", "src"))
+
+# The notifier's per-channel token buckets would cap alerts at a few per
+# second; a load test measures the pipeline, not the chat providers' limits.
+UNLIMITED_RATE = {name: (1e9, 1e9) for name in ("telegram", "discord")}
+
+PUBLISH_TICK = 0.005
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _encoder(payload_format):
+    if payload_format == "json":
+        return lambda payload: ("home/heating/status/" + payload["device_id"], json.dumps(payload))
+    # The edge device's own encoder, so frames are byte-identical to production
+    if HARDWARE_SRC not in sys.path:
+        sys.path.insert(0, HARDWARE_SRC)
+    from codec import encode_binary
+    return lambda payload: ("home/heating/binary/status/" + payload["device_id"], encode_binary(payload))
+
+
+def run_load(pipeline, devices=100, rate=1000, duration=2.0, inactive_ratio=0.05,
+             payload_format="json", seed=0, drain_timeout=30.0):
+    """
+    Publishes `rate` messages per second for `duration` seconds, round-robin
+    over `devices` devices; each message is INACTIVE with probability
+    `inactive_ratio`. Every device that got an INACTIVE message through is
+    expected to be alerted (repeats without a recovery in between are
+    suppressed by the notifier).
+    """
+    rng = random.Random(seed)
+    encode = _encoder(payload_format)
+    device_ids = [f"load-{n:05d}" for n in range(devices)]
+    first_inactive = {}
+
+    total = int(rate * duration)
+    published = 0
+    started = time.monotonic()
+    while published < total:
+        due = min(total, int((time.monotonic() - started) * rate) + 1)
+        while published < due:
+            device_id = device_ids[published % devices]
+            status = "INACTIVE" if rng.random() < inactive_ratio else "ACTIVE"
+            timestamp_ms = int(time.time() * 1000)
+            # Payload 2.0: every message of a device gets its own item, however fast they come
+            payload = {
+                "device_id": device_id,
+                "timestamp": timestamp_ms // 1000,
+                "timestamp_ms": timestamp_ms,
+                "seq": published // devices,
+                "status": status,
+                "real_state": status,
+                "sensor_voltage": 0 if status == "INACTIVE" else 1,
+                "metadata": {"reason": "event_change", "source": "loadgen", "version": "2.0"},
+            }
+            topic, body = encode(payload)
+            sent_at = time.monotonic()
+            if pipeline.bus.publish(topic, body) and status == "INACTIVE" and device_id not in first_inactive:
+                first_inactive[device_id] = sent_at
+            published += 1
+        time.sleep(PUBLISH_TICK)
+    publish_seconds = time.monotonic() - started
+
+    drained = pipeline.drain(drain_timeout)
+    processed_seconds = time.monotonic() - started
+
+    latencies = []
+    alerted = set()
+    for device_id, received_at in pipeline.http.mentioned_devices():
+        if device_id in first_inactive:
+            alerted.add(device_id)
+            latencies.append((received_at - first_inactive[device_id]) * 1000)
+
+    stats = pipeline.stats
+    return {
+        "ingestion": pipeline.alert_ingestion,
+        "payload_format": payload_format,
+        "published": published,
+        "ingested": stats["ingested"],
+        "dropped": stats["dropped"],
+        "stored": stats["stored"],
+        "alerts_expected": len(first_inactive),
+        "alerts_delivered": len(alerted),
+        "alerts_lost": len(first_inactive) - len(alerted),
+        "invocations": stats["invocations"],
+        "invocation_errors": stats["invocation_errors"],
+        "publish_rate": round(published / publish_seconds, 1),
+        "ingest_throughput": round(stats["ingested"] / processed_seconds, 1),
+        "latency_ms": {
+            name: None if value is None else round(value, 1)
+            for name, value in (("p50", percentile(latencies, 0.50)), ("p95", percentile(latencies, 0.95)),
+                                ("p99", percentile(latencies, 0.99)), ("max", max(latencies, default=None)))
+        },
+        "drained": drained,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the heating monitor pipeline offline")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=2000, help="messages per second")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds")
+    parser.add_argument("--inactive-ratio", type=float, default=0.05)
+    parser.add_argument("--format", choices=["json", "binary"], default="json")
+    parser.add_argument("--ingestion", choices=[INGESTION_DIRECT, INGESTION_SQS], default=INGESTION_DIRECT)
+    parser.add_argument("--channel-latency", type=float, default=0.02, help="seconds per chat API call")
+    parser.add_argument("--max-inflight", type=int, default=10000)
+    parser.add_argument("--production-rate-limits", action="store_true",
+                        help="keep the notifier's per-channel rate limits")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    pipeline = LocalPipeline(
+        alert_ingestion=args.ingestion,
+        max_inflight=args.max_inflight,
+        channel_latency=args.channel_latency,
+        rate_limits=None if args.production_rate_limits else UNLIMITED_RATE,
+    )
+    with pipeline:
+        report = run_load(pipeline, args.devices, args.rate, args.duration, args.inactive_ratio, args.format)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    latency = report["latency_ms"]
+    print(f"📡 Published {report['published']} messages at {report['publish_rate']}/s "
+          f"({report['ingestion']}, {report['payload_format']})")
+    print(f"📥 Ingested {report['ingested']} ({report['ingest_throughput']}/s), dropped {report['dropped']}, "
+          f"stored {report['stored']}")
+    print(f"🔔 Alerts delivered {report['alerts_delivered']}/{report['alerts_expected']} "
+          f"in {report['invocations']} invocations, lost {report['alerts_lost']}")
+    print(f"⏱️  Alert latency ms: p50={latency['p50']} p95={latency['p95']} "
+          f"p99={latency['p99']} max={latency['max']}")
+    if not report["drained"]:
+        print("⚠️  Pipeline did not drain before the timeout")
+
+
+if __name__ == "__main__":
+    main()
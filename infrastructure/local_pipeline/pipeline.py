@@ -0,0 +1,334 @@
+import importlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from ..stacks.iot_rules import STORAGE_RULE_SQL, ALERT_RULE_SQL, BINARY_STORAGE_RULE_SQL, BINARY_ALERT_RULE_SQL
+from .fakes import InMemoryTable, FakeSSM, HttpSink
+from .iot_sql import CompiledRule, RuleSet, make_message, topic_matches
+
+# HeatingMonitorStack without AWS: an in-process MQTT bus feeds the deployed
+# IoT rule SQL, whose actions write to an in-memory events table (binary
+# frames through the real binary_store handler) and invoke the real notifier
+# handler (lambda_functions/notifier) against fake SSM and a recording HTTP
+# sink instead of Telegram and Discord.
+
+NOTIFIER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "lambda_functions", "notifier"))
+
+INGESTION_DIRECT = "direct"
+INGESTION_SQS = "sqs"
+
+# Deployed values are 100 alerts / 5 s; a short window keeps local latency readable
+BATCH_SIZE = 100
+BATCH_WINDOW_SECONDS = 0.05
+MAX_RECEIVE_COUNT = 5
+
+SECRET_ENV = {
+    "SSM_KEY_TOKEN": "/local/telegram-token",
+    "SSM_KEY_CHAT_ID": "/local/telegram-chat-id",
+    "SSM_KEY_DISCORD_WEBHOOK": "/local/discord-webhook-url",
+}
+SECRET_VALUES = {
+    "/local/telegram-token": "local-token",
+    "/local/telegram-chat-id": "42",
+    "/local/discord-webhook-url": "https://discord.invalid/api/webhooks/local",
+}
+
+# Environment the notifier must not see locally: it would reach for real AWS
+NOTIFIER_ENV_UNSET = ("ALERT_STATE_TABLE", "RETRY_QUEUE_URL", "ALERT_DLQ_URL")
+
+
+STORAGE_RULE = "DynamoDBStorageRule"
+BINARY_STORAGE_RULE = "BinaryStorageRule"
+
+
+def deployed_rules():
+    """The stack's topic rules, compiled, under their construct ids"""
+    return [
+        CompiledRule(STORAGE_RULE, STORAGE_RULE_SQL),
+        CompiledRule(BINARY_STORAGE_RULE, BINARY_STORAGE_RULE_SQL),
+        CompiledRule("LambdaAlertRule", ALERT_RULE_SQL),
+        CompiledRule("BinaryAlertRule", BINARY_ALERT_RULE_SQL),
+    ]
+
+
+class MessageBus:
+    """
+    In-process MQTT broker: every publish is handed to the matching subscribers,
+    QoS 0. `publish` returns False if a subscriber refused the message.
+    """
+
+    def __init__(self):
+        self._subscriptions = []
+
+    def subscribe(self, topic_filter, callback):
+        self._subscriptions.append((topic_filter, callback))
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        accepted = True
+        for topic_filter, callback in self._subscriptions:
+            if topic_matches(topic_filter, topic) and callback(topic, payload) is False:
+                accepted = False
+        return accepted
+
+
+class LocalPipeline:
+    """
+    Usage:
+        with LocalPipeline() as pipeline:
+            pipeline.bus.publish("home/heating/status", json.dumps({...}))
+            pipeline.drain()
+            pipeline.events_table.get_item(Key={...})
+
+    Messages beyond `max_inflight` waiting for the rule engine are dropped, as
+    IoT Core throttles; `stats` counts every stage.
+    """
+
+    def __init__(self, alert_ingestion=INGESTION_DIRECT, rule_workers=2, lambda_concurrency=10,
+                 max_inflight=10000, batch_size=BATCH_SIZE, batch_window=BATCH_WINDOW_SECONDS,
+                 channel_latency=0.0, rate_limits=None):
+        if alert_ingestion not in (INGESTION_DIRECT, INGESTION_SQS):
+            raise ValueError(f"Unknown alert_ingestion: {alert_ingestion}")
+        self.alert_ingestion = alert_ingestion
+        self.rule_workers = rule_workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.rate_limits = rate_limits
+
+        self.bus = MessageBus()
+        self.events_table = InMemoryTable("device_id", "timestamp")
+        self.ssm = FakeSSM(SECRET_VALUES)
+        self.http = HttpSink(latency=channel_latency)
+        self.rules = deployed_rules()
+
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._inflight = 0
+        self._idle = threading.Condition()
+        self._ingress = queue.Queue(maxsize=max_inflight)
+        self._lambda_pool = ThreadPoolExecutor(max_workers=lambda_concurrency, thread_name_prefix="lambda")
+        self._alert_queue = []
+        self._alert_queue_ready = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._saved_env = {}
+        self.notifier = None
+        self.binary_store = None
+
+    # --- lifecycle ---
+
+    def start(self):
+        self._load_notifier()
+        self._running = True
+        self.bus.subscribe("#", self._ingest)
+        for n in range(self.rule_workers):
+            self._threads.append(threading.Thread(target=self._rule_worker, name=f"rules-{n}", daemon=True))
+        if self.alert_ingestion == INGESTION_SQS:
+            self._threads.append(threading.Thread(target=self._poll_alert_queue, name="sqs-poller", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for _ in range(self.rule_workers):
+            self._ingress.put(None)
+        with self._alert_queue_ready:
+            self._alert_queue_ready.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._lambda_pool.shutdown(wait=True)
+        self._unload_notifier()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def drain(self, timeout=30.0):
+        """Waits until every accepted message has been stored and alerted; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    # --- notifier ---
+
+    def _load_notifier(self):
+        for key, value in SECRET_ENV.items():
+            self._saved_env[key] = os.environ.get(key)
+            os.environ[key] = value
+        for key in NOTIFIER_ENV_UNSET:
+            self._saved_env[key] = os.environ.pop(key, None)
+        if NOTIFIER_DIR not in sys.path:
+            sys.path.insert(0, NOTIFIER_DIR)
+
+        notifier = importlib.import_module("index")
+        from alert_state import InMemoryAlertStore, RateLimiter
+        from channels.http import default_client
+
+        notifier.ssm = self.ssm
+        notifier.clear_secret_cache()
+        notifier.alert_store = InMemoryAlertStore()
+        notifier.rate_limiter = RateLimiter(self.rate_limits)
+        notifier.retry_queue = None
+        self.binary_store = importlib.import_module("binary_store")
+        self.binary_store.table = self.events_table
+        # The channels share this client; an instance attribute shadows the real method
+        default_client.post_json = self.http.post_json
+        self.notifier = notifier
+
+    def _unload_notifier(self):
+        from channels.http import default_client
+
+        default_client.__dict__.pop("post_json", None)
+        self.notifier.clear_secret_cache()
+        self.notifier.reset_alert_state()
+        self.binary_store.table = None
+        for key, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    # --- stages ---
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _begin(self, count=1):
+        with self._idle:
+            self._inflight += count
+
+    def _done(self, count=1):
+        with self._idle:
+            self._inflight -= count
+            if not self._inflight:
+                self._idle.notify_all()
+
+    def _ingest(self, topic, payload):
+        self._begin()
+        try:
+            self._ingress.put_nowait(make_message(topic, payload))
+            self._count("ingested")
+            return True
+        except queue.Full:
+            self._count("dropped")
+            self._done()
+            return False
+
+    def _rule_worker(self):
+        rules = RuleSet(self.rules)  # per worker: its counters are not shared between threads
+        while True:
+            message = self._ingress.get()
+            if message is None:
+                return
+            try:
+                self._apply_rules(rules, message)
+            except Exception:
+                self._count("rule_errors")
+            finally:
+                self._done()
+
+    def _apply_rules(self, rules, message):
+        for rule, result in rules.evaluate(message):
+            if rule.name == STORAGE_RULE:
+                try:
+                    self.events_table.put_item(Item=result)
+                    self._count("stored")
+                except ValueError:
+                    # DynamoDBv2 action without the key attributes: IoT reports it to the error action
+                    self._count("storage_errors")
+                continue
+            if rule.name == BINARY_STORAGE_RULE:
+                self._begin()
+                self._lambda_pool.submit(self._store_binary, result)
+                continue
+
+            self._count("alerts_matched")
+            if self.alert_ingestion == INGESTION_SQS:
+                self._enqueue_alert(json.dumps(result))
+            else:
+                self._begin()
+                self._lambda_pool.submit(self._invoke, result)
+
+    def _invoke(self, event):
+        try:
+            response = self.notifier.lambda_handler(event, None)
+            self._count("invocations")
+            if response.get("statusCode") != 200:
+                self._count("invocation_errors")
+            return response
+        except Exception:
+            self._count("invocation_errors")
+        finally:
+            self._done()
+
+    def _store_binary(self, event):
+        try:
+            stored = self.binary_store.lambda_handler(event, None)["stored"]
+            self._count("stored" if stored else "storage_errors")
+        except Exception:
+            self._count("storage_errors")
+        finally:
+            self._done()
+
+    def _enqueue_alert(self, body, receive_count=0):
+        self._begin()
+        with self._alert_queue_ready:
+            self._alert_queue.append((body, receive_count))
+            self._alert_queue_ready.notify()
+
+    def _poll_alert_queue(self):
+        sequence = 0
+        while True:
+            with self._alert_queue_ready:
+                while self._running and not self._alert_queue:
+                    self._alert_queue_ready.wait()
+                if not self._running:
+                    return
+                # Batching window: wait for a full batch or until the window closes
+                closes = time.monotonic() + self.batch_window
+                while len(self._alert_queue) < self.batch_size and time.monotonic() < closes:
+                    self._alert_queue_ready.wait(closes - time.monotonic())
+                batch, self._alert_queue = self._alert_queue[:self.batch_size], self._alert_queue[self.batch_size:]
+
+            records = {}
+            for body, receive_count in batch:
+                sequence += 1
+                records[f"msg-{sequence}"] = (body, receive_count + 1)
+            self._lambda_pool.submit(self._invoke_batch, records)
+
+    def _invoke_batch(self, records):
+        event = {"Records": [
+            {"messageId": message_id, "eventSource": "aws:sqs", "body": body}
+            for message_id, (body, _) in records.items()
+        ]}
+        try:
+            response = self.notifier.lambda_handler(event, None)
+            self._count("invocations")
+            failed = {failure["itemIdentifier"] for failure in response.get("batchItemFailures", [])}
+        except Exception:
+            self._count("invocation_errors")
+            failed = set(records)
+
+        for message_id in failed:
+            body, receive_count = records[message_id]
+            if receive_count >= MAX_RECEIVE_COUNT:
+                self._count("dead_lettered")
+            else:
+                self._enqueue_alert(body, receive_count)
+        self._done(len(records))
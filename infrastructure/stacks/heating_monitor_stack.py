@@ -3,16 +3,58 @@ import os
 from aws_cdk import (
     Stack, Duration, aws_sqs as sqs, aws_dynamodb as dynamodb,
     aws_lambda as _lambda, aws_iot as iot, aws_iam as iam,
-    aws_ssm as ssm
+    aws_ssm as ssm, aws_lambda_event_sources as lambda_event_sources,
+    aws_events as events, aws_events_targets as targets
 )
 from constructs import Construct
+from .iot_rules import (
+    STORAGE_RULE_SQL, ALERT_RULE_SQL, BINARY_STORAGE_RULE_SQL, BINARY_ALERT_RULE_SQL, TTL_OFFSET_SECONDS
+)
 
 SSM_PARAM_NAME_TOKEN = "/heating-monitor/telegram-token"
 SSM_PARAM_NAME_CHAT_ID = "/heating-monitor/telegram-chat-id"
 SSM_PARAM_NAME_DISCORD_WEBHOOK = "/heating-monitor/discord-webhook-url"
 
-DATA_RETENTION_DAYS = 90
-TTL_OFFSET_SECONDS = DATA_RETENTION_DAYS * 24 * 60 * 60
+# How long a warm notifier container reuses secrets before re-reading SSM
+SECRET_CACHE_TTL_SECONDS = 300
+
+# Alert ingestion, selected with `cdk deploy -c alert_ingestion=sqs`:
+# "direct" invokes the notifier once per alert; "sqs" queues alerts and the
+# notifier sends one digest per batch (see lambda_functions/notifier/alert_digest.py)
+ALERT_INGESTION_DIRECT = "direct"
+ALERT_INGESTION_SQS = "sqs"
+ALERT_BATCH_SIZE = 100
+ALERT_BATCH_WINDOW_SECONDS = 5
+ALERT_MAX_RECEIVE_COUNT = 5
+
+# Channels an alert did not reach are retried through their own queue, with
+# backoff, before the job lands in the alert DLQ (lambda_functions/notifier/retry_queue.py)
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BATCH_SIZE = 10
+
+# The edge publishes on every state change plus a heartbeat once a day
+# (HEARTBEAT_INTERVAL in hardware/src/monitor.py); silence beyond that and a
+# grace period means the device is down
+HEARTBEAT_INTERVAL_SECONDS = 86400
+LIVENESS_GRACE_SECONDS = 3600
+
+# Hourly and daily runtime rollups maintained from the events table's stream
+# (lambda_functions/rollup); a device silent for longer than the gap is not running
+ROLLUP_BATCH_SIZE = 500
+ROLLUP_BATCH_WINDOW_SECONDS = 10
+ROLLUP_RETRY_ATTEMPTS = 5
+ROLLUP_MAX_GAP_SECONDS = HEARTBEAT_INTERVAL_SECONDS + LIVENESS_GRACE_SECONDS
+
+# One item per device with its latest status and heartbeat (lambda_functions/device_state),
+# from the same stream; small batches keep the view seconds behind the events
+DEVICE_STATE_BATCH_SIZE = 100
+DEVICE_STATE_BATCH_WINDOW_SECONDS = 1
+DEVICE_STATE_RETRY_ATTEMPTS = 5
+
+# Dead man's switch (lambda_functions/device_state/liveness.py): devices not heard
+# from within a heartbeat interval plus grace are alerted as SILENT
+LIVENESS_CHECK_MINUTES = 15
+LIVENESS_SHARDS = 8
 
 class HeatingMonitorStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
@@ -30,7 +72,8 @@ class HeatingMonitorStack(Stack):
             sort_key=dynamodb.Attribute(name="timestamp", type=dynamodb.AttributeType.NUMBER),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
             removal_policy=cdk.RemovalPolicy.RETAIN,
-            time_to_live_attribute="ttl"
+            time_to_live_attribute="ttl",
+            stream=dynamodb.StreamViewType.NEW_IMAGE
         )
         
         this_dir = os.path.dirname(os.path.abspath(__file__))
@@ -47,11 +90,22 @@ class HeatingMonitorStack(Stack):
             environment={
                 "SSM_KEY_TOKEN": SSM_PARAM_NAME_TOKEN,
                 "SSM_KEY_CHAT_ID": SSM_PARAM_NAME_CHAT_ID,
-                "SSM_KEY_DISCORD_WEBHOOK": SSM_PARAM_NAME_DISCORD_WEBHOOK
+                "SSM_KEY_DISCORD_WEBHOOK": SSM_PARAM_NAME_DISCORD_WEBHOOK,
+                "SECRET_CACHE_TTL_SECONDS": str(SECRET_CACHE_TTL_SECONDS)
             }
         )
         self.alert_dlq.grant_send_messages(self.notifier_lambda)
 
+        # Last notified status per device, shared by all notifier containers (alert_state.py)
+        self.alert_state_table = dynamodb.Table(self, "AlertStateTable",
+            partition_key=dynamodb.Attribute(name="alert_key", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=cdk.RemovalPolicy.DESTROY,
+            time_to_live_attribute="ttl"
+        )
+        self.alert_state_table.grant_read_write_data(self.notifier_lambda)
+        self.notifier_lambda.add_environment("ALERT_STATE_TABLE", self.alert_state_table.table_name)
+
         # --- PERMISSIONS FOR SYSTEMS MANAGER (SSM) ---
         token_param = ssm.StringParameter.from_secure_string_parameter_attributes(
             self, "TelegramTokenParam", parameter_name=SSM_PARAM_NAME_TOKEN
@@ -68,18 +122,46 @@ class HeatingMonitorStack(Stack):
         discord_webhook_param.grant_read(self.notifier_lambda)
         # ---------------------------------------------
 
-        # 4. IoT Rules
-        iot_dynamodb_role = self._get_or_create_iot_role()
-        
-        iot_sql_query = (
-            f"SELECT device_id, timestamp, status, sensor_voltage, metadata, "
-            f"(timestamp() / 1000) + {TTL_OFFSET_SECONDS} as ttl "
-            f"FROM 'home/heating/status'"
+        # Retries of failed channels, in both ingestion modes
+        self.retry_queue = sqs.Queue(self, "AlertRetryQueue",
+            visibility_timeout=Duration.seconds(60),
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=ALERT_MAX_RECEIVE_COUNT, queue=self.alert_dlq),
+            queue_name="heating-alert-retry-queue"
         )
+        self.retry_queue.grant_send_messages(self.notifier_lambda)
+        self.notifier_lambda.add_environment("RETRY_QUEUE_URL", self.retry_queue.queue_url)
+        self.notifier_lambda.add_environment("ALERT_DLQ_URL", self.alert_dlq.queue_url)
+        self.notifier_lambda.add_environment("RETRY_MAX_ATTEMPTS", str(RETRY_MAX_ATTEMPTS))
+        self.notifier_lambda.add_event_source(lambda_event_sources.SqsEventSource(self.retry_queue,
+            batch_size=RETRY_BATCH_SIZE,
+            report_batch_item_failures=True
+        ))
+
+        # 4. Alert ingestion
+        self.alert_ingestion = self.node.try_get_context("alert_ingestion") or ALERT_INGESTION_DIRECT
+        if self.alert_ingestion not in (ALERT_INGESTION_DIRECT, ALERT_INGESTION_SQS):
+            raise ValueError(f"Unknown alert_ingestion: {self.alert_ingestion}")
+
+        self.alert_queue = None
+        if self.alert_ingestion == ALERT_INGESTION_SQS:
+            self.alert_queue = sqs.Queue(self, "AlertQueue",
+                # Six times the function timeout, as recommended for SQS event sources
+                visibility_timeout=Duration.seconds(60),
+                dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=ALERT_MAX_RECEIVE_COUNT, queue=self.alert_dlq),
+                queue_name="heating-alert-queue"
+            )
+            self.notifier_lambda.add_event_source(lambda_event_sources.SqsEventSource(self.alert_queue,
+                batch_size=ALERT_BATCH_SIZE,
+                max_batching_window=Duration.seconds(ALERT_BATCH_WINDOW_SECONDS),
+                report_batch_item_failures=True
+            ))
 
+        # 5. IoT Rules
+        iot_dynamodb_role = self._get_or_create_iot_role()
+        
         iot.CfnTopicRule(self, "DynamoDBStorageRule", 
             topic_rule_payload=iot.CfnTopicRule.TopicRulePayloadProperty(
-            sql=iot_sql_query,
+            sql=STORAGE_RULE_SQL,
             actions=[
                 iot.CfnTopicRule.ActionProperty(
                     dynamo_d_bv2=iot.CfnTopicRule.DynamoDBv2ActionProperty(
@@ -91,21 +173,177 @@ class HeatingMonitorStack(Stack):
         ))
         self.heating_table.grant_write_data(iot_dynamodb_role)
 
-        # Hot Path Rule: Trigger Lambda if status is 'INACTIVE'
-        iot_lambda_rule = iot.CfnTopicRule(self, "LambdaAlertRule", topic_rule_payload=iot.CfnTopicRule.TopicRulePayloadProperty(
-            sql="SELECT * FROM 'home/heating/status' WHERE status = 'INACTIVE'",
+        # Binary frames are decoded by a function before they are stored
+        self.binary_store_lambda = _lambda.Function(self, "BinaryStoreFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="binary_store.lambda_handler",
+            code=_lambda.Code.from_asset(lambda_path),
+            timeout=Duration.seconds(10),
+            environment={
+                "EVENTS_TABLE": self.heating_table.table_name,
+                "TTL_OFFSET_SECONDS": str(TTL_OFFSET_SECONDS)
+            }
+        )
+        self.heating_table.grant_write_data(self.binary_store_lambda)
+        binary_storage_rule = iot.CfnTopicRule(self, "BinaryStorageRule",
+            topic_rule_payload=iot.CfnTopicRule.TopicRulePayloadProperty(
+            sql=BINARY_STORAGE_RULE_SQL,
             actions=[
                 iot.CfnTopicRule.ActionProperty(
-                    lambda_=iot.CfnTopicRule.LambdaActionProperty(
-                        function_arn=self.notifier_lambda.function_arn
-                    )
+                    lambda_=iot.CfnTopicRule.LambdaActionProperty(function_arn=self.binary_store_lambda.function_arn)
                 )
             ]
         ))
+        self.binary_store_lambda.add_permission("IoTInvokeBinaryStore",
+            principal=iam.ServicePrincipal("iot.amazonaws.com"),
+            source_arn=f"arn:aws:iot:{self.region}:{self.account}:rule/{binary_storage_rule.ref}"
+        )
+
+        # Hot Path Rule: Trigger Lambda if status is 'INACTIVE'
+        iot_lambda_rule = iot.CfnTopicRule(self, "LambdaAlertRule", topic_rule_payload=iot.CfnTopicRule.TopicRulePayloadProperty(
+            sql=ALERT_RULE_SQL,
+            actions=[self._alert_action(iot_dynamodb_role)]
+        ))
         
-        self.notifier_lambda.add_permission("IoTInvoke", 
-            principal=iam.ServicePrincipal("iot.amazonaws.com"), 
-            source_arn=f"arn:aws:iot:{self.region}:{self.account}:rule/{iot_lambda_rule.ref}"
+        self._allow_rule_invoke("IoTInvoke", iot_lambda_rule)
+
+        # Hot Path Rule for binary frames: forwarded base64-encoded, decoded by the notifier
+        binary_alert_rule = iot.CfnTopicRule(self, "BinaryAlertRule",
+            topic_rule_payload=iot.CfnTopicRule.TopicRulePayloadProperty(
+            sql=BINARY_ALERT_RULE_SQL,
+            actions=[self._alert_action(iot_dynamodb_role)]
+        ))
+
+        self._allow_rule_invoke("IoTInvokeBinary", binary_alert_rule)
+
+        if self.alert_queue is not None:
+            self.alert_queue.grant_send_messages(iot_dynamodb_role)
+
+        # 6. Rollups (Cold Path - Aggregates that outlive the events' TTL)
+        self._add_rollups(os.path.join(this_dir, "..", "..", "lambda_functions", "rollup"))
+
+        # 7. Device state (Latest status per device, for status pages and liveness checks)
+        self._add_device_state(os.path.join(this_dir, "..", "..", "lambda_functions", "device_state"))
+
+    def _add_rollups(self, code_path: str) -> None:
+        self.rollup_table = dynamodb.Table(self, "HeatingRollupsTable",
+            partition_key=dynamodb.Attribute(name="device_id", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="bucket", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=cdk.RemovalPolicy.RETAIN
+        )
+        self.rollup_lambda = _lambda.Function(self, "RollupFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="index.lambda_handler",
+            code=_lambda.Code.from_asset(code_path),
+            timeout=Duration.seconds(60),
+            environment={
+                "ROLLUP_TABLE": self.rollup_table.table_name,
+                "EVENTS_TABLE": self.heating_table.table_name,
+                "MAX_GAP_SECONDS": str(ROLLUP_MAX_GAP_SECONDS)
+            }
+        )
+        self.rollup_table.grant_read_write_data(self.rollup_lambda)
+        # Late events have the days they fall into rebuilt from the raw events
+        self.heating_table.grant_read_data(self.rollup_lambda)
+
+        # Records still failing after the retries are described here, to be replayed from the stream
+        self.rollup_dlq = sqs.Queue(self, "RollupDeadLetterQueue", queue_name="heating-rollup-dlq")
+        self.rollup_lambda.add_event_source(lambda_event_sources.DynamoEventSource(self.heating_table,
+            starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+            batch_size=ROLLUP_BATCH_SIZE,
+            max_batching_window=Duration.seconds(ROLLUP_BATCH_WINDOW_SECONDS),
+            bisect_batch_on_error=True,
+            retry_attempts=ROLLUP_RETRY_ATTEMPTS,
+            report_batch_item_failures=True,
+            on_failure=lambda_event_sources.SqsDlq(self.rollup_dlq),
+            # TTL expiry deletes raw events; the rollups keep them
+            filters=[_lambda.FilterCriteria.filter({"eventName": _lambda.FilterRule.is_equal("INSERT")}),
+                     _lambda.FilterCriteria.filter({"eventName": _lambda.FilterRule.is_equal("MODIFY")})]
+        ))
+
+    def _add_device_state(self, code_path: str) -> None:
+        self.device_state_table = dynamodb.Table(self, "DeviceStateTable",
+            partition_key=dynamodb.Attribute(name="device_id", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=cdk.RemovalPolicy.DESTROY
+        )
+        # Sparse: only devices awaiting a heartbeat have these attributes
+        self.device_state_table.add_global_secondary_index(
+            index_name="liveness",
+            partition_key=dynamodb.Attribute(name="liveness_shard", type=dynamodb.AttributeType.NUMBER),
+            sort_key=dynamodb.Attribute(name="expected_by", type=dynamodb.AttributeType.NUMBER),
+            projection_type=dynamodb.ProjectionType.KEYS_ONLY
+        )
+        liveness_env = {
+            "DEVICE_STATE_TABLE": self.device_state_table.table_name,
+            "LIVENESS_TIMEOUT_SECONDS": str(HEARTBEAT_INTERVAL_SECONDS + LIVENESS_GRACE_SECONDS),
+            "LIVENESS_SHARDS": str(LIVENESS_SHARDS)
+        }
+        code = _lambda.Code.from_asset(code_path)
+        self.device_state_lambda = _lambda.Function(self, "DeviceStateFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="index.lambda_handler",
+            code=code,
+            timeout=Duration.seconds(30),
+            environment=liveness_env
+        )
+        self.device_state_table.grant_read_write_data(self.device_state_lambda)
+
+        self.liveness_lambda = _lambda.Function(self, "LivenessCheckFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="liveness.lambda_handler",
+            code=code,
+            timeout=Duration.seconds(60),
+            environment=dict(liveness_env, NOTIFIER_FUNCTION=self.notifier_lambda.function_name)
+        )
+        self.device_state_table.grant_read_write_data(self.liveness_lambda)
+        if self.alert_queue is not None:
+            # Silent devices join the notifier's digests
+            self.liveness_lambda.add_environment("ALERT_QUEUE_URL", self.alert_queue.queue_url)
+            self.alert_queue.grant_send_messages(self.liveness_lambda)
+        else:
+            self.notifier_lambda.grant_invoke(self.liveness_lambda)
+        events.Rule(self, "LivenessCheckSchedule",
+            schedule=events.Schedule.rate(Duration.minutes(LIVENESS_CHECK_MINUTES)),
+            targets=[targets.LambdaFunction(self.liveness_lambda, retry_attempts=0)]
+        )
+
+        self.device_state_dlq = sqs.Queue(self, "DeviceStateDeadLetterQueue", queue_name="heating-device-state-dlq")
+        self.device_state_lambda.add_event_source(lambda_event_sources.DynamoEventSource(self.heating_table,
+            starting_position=_lambda.StartingPosition.LATEST,
+            batch_size=DEVICE_STATE_BATCH_SIZE,
+            max_batching_window=Duration.seconds(DEVICE_STATE_BATCH_WINDOW_SECONDS),
+            bisect_batch_on_error=True,
+            retry_attempts=DEVICE_STATE_RETRY_ATTEMPTS,
+            report_batch_item_failures=True,
+            on_failure=lambda_event_sources.SqsDlq(self.device_state_dlq),
+            filters=[_lambda.FilterCriteria.filter({"eventName": _lambda.FilterRule.is_equal("INSERT")}),
+                     _lambda.FilterCriteria.filter({"eventName": _lambda.FilterRule.is_equal("MODIFY")})]
+        ))
+
+    def _alert_action(self, role: iam.Role) -> iot.CfnTopicRule.ActionProperty:
+        """Alert rules either invoke the notifier directly or enqueue for batched delivery"""
+        if self.alert_queue is not None:
+            return iot.CfnTopicRule.ActionProperty(
+                sqs=iot.CfnTopicRule.SqsActionProperty(
+                    queue_url=self.alert_queue.queue_url,
+                    role_arn=role.role_arn,
+                    use_base64=False
+                )
+            )
+        return iot.CfnTopicRule.ActionProperty(
+            lambda_=iot.CfnTopicRule.LambdaActionProperty(
+                function_arn=self.notifier_lambda.function_arn
+            )
+        )
+
+    def _allow_rule_invoke(self, permission_id: str, rule: iot.CfnTopicRule) -> None:
+        if self.alert_queue is not None:
+            return  # the queue, not the rule, triggers the function
+        self.notifier_lambda.add_permission(permission_id,
+            principal=iam.ServicePrincipal("iot.amazonaws.com"),
+            source_arn=f"arn:aws:iot:{self.region}:{self.account}:rule/{rule.ref}"
         )
 
     def _get_or_create_iot_role(self) -> iam.Role:
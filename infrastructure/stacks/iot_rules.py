@@ -0,0 +1,59 @@
+# SQL of the IoT topic rules. Kept free of CDK imports so the local pipeline
+# emulator (infrastructure/local_pipeline) evaluates exactly what is deployed.
+
+DATA_RETENTION_DAYS = 90
+TTL_OFFSET_SECONDS = DATA_RETENTION_DAYS * 24 * 60 * 60
+
+# Status messages arrive on home/heating/status (single device) or
+# home/heating/status/<device_id> (gateway, hardware/src/gateway.py).
+# '#' does not reliably match its parent level, so filter one level up on topic(3).
+STATUS_TOPIC_FILTER = "home/heating/#"
+STATUS_TOPIC_CONDITION = "topic(3) = 'status'"
+
+# Compact binary frames (hardware/src/codec.py). An INACTIVE state change always
+# starts with the bytes 0v 00 00 for schema version v, i.e. "AQAA" (v1) or
+# "AgAA" (v2) after base64 encoding, an ACTIVE one with 0v 01 01, i.e. "AQEB"
+# or "AgEB".
+BINARY_STATUS_TOPIC_FILTER = "home/heating/binary/#"
+BINARY_ALERT_PREFIXES = ("AQAA", "AgAA")
+BINARY_RECOVERY_PREFIXES = ("AQEB", "AgEB")
+
+# Sort key of a stored event. Version 1.0 payloads carry whole seconds, so two
+# events of a device within one second overwrite each other. Version 2.0 adds
+# timestamp_ms and a per-boot sequence number (hardware/src/monitor.py); the
+# key becomes seconds with six decimals, milliseconds followed by the sequence
+# modulo SEQUENCE_SLOTS, which only collides for 1000 events in one
+# millisecond. Existing range queries in seconds keep working for both.
+# Binary frames of schema version 2 carry the same fields and are keyed alike
+# by lambda_functions/notifier/binary_store.py.
+SEQUENCE_SLOTS = 1000
+EVENT_KEY = (
+    f"CASE isUndefined(seq) WHEN true THEN timestamp "
+    f"ELSE (timestamp_ms * {SEQUENCE_SLOTS} + seq % {SEQUENCE_SLOTS}) / 1000000.0 END"
+)
+
+# Cold path: every status message is stored, expiring after DATA_RETENTION_DAYS
+STORAGE_RULE_SQL = (
+    f"SELECT device_id, {EVENT_KEY} AS timestamp, timestamp_ms, seq, status, sensor_voltage, metadata, "
+    f"(timestamp() / 1000) + {TTL_OFFSET_SECONDS} as ttl "
+    f"FROM '{STATUS_TOPIC_FILTER}' WHERE {STATUS_TOPIC_CONDITION}"
+)
+
+# Hot path: INACTIVE status messages go to the notifier, and so do ACTIVE ones:
+# it alerts on transitions only, so it has to see the device recover
+ALERT_RULE_SQL = (
+    f"SELECT * FROM '{STATUS_TOPIC_FILTER}' "
+    f"WHERE {STATUS_TOPIC_CONDITION} AND (status = 'INACTIVE' OR status = 'ACTIVE')"
+)
+
+# Cold path for binary frames: every frame is forwarded base64-encoded to a
+# function that decodes it and stores it like STORAGE_RULE_SQL stores JSON
+# (lambda_functions/notifier/binary_store.py)
+BINARY_STORAGE_RULE_SQL = f"SELECT encode(*, 'base64') AS data FROM '{BINARY_STATUS_TOPIC_FILTER}'"
+
+# Hot path for binary frames: forwarded base64-encoded, decoded by the notifier
+BINARY_ALERT_RULE_SQL = (
+    f"SELECT encode(*, 'base64') AS data FROM '{BINARY_STATUS_TOPIC_FILTER}' WHERE "
+    + " OR ".join(f"startswith(encode(*, 'base64'), '{prefix}')"
+                  for prefix in BINARY_ALERT_PREFIXES + BINARY_RECOVERY_PREFIXES)
+)
@@ -66,18 +66,22 @@ def test_end_to_end_data_flow():
         pytest.fail(f"❌ Failed to publish to IoT Core. Check permissions/region. Error: {e}")
 
     # 4. Wait for Ingestion
-    # We wait because the architecture is asynchronous (IoT Rule -> DynamoDB)
-    print("⏳ Waiting 5 seconds for cloud processing...")
-    time.sleep(5)
-
-    # 5. Verify in DynamoDB
-    # Fetch the item using the Partition Key and Sort Key
-    response = table.get_item(
-        Key={
-            'device_id': test_id,
-            'timestamp': timestamp
-        }
-    )
+    # The architecture is asynchronous (IoT Rule -> DynamoDB): poll instead of
+    # sleeping a fixed time. The same flow runs offline in tests/local.
+    print("⏳ Waiting up to 10 seconds for cloud processing...")
+    deadline = time.monotonic() + 10
+    while True:
+        # 5. Verify in DynamoDB
+        # Fetch the item using the Partition Key and Sort Key
+        response = table.get_item(
+            Key={
+                'device_id': test_id,
+                'timestamp': timestamp
+            }
+        )
+        if 'Item' in response or time.monotonic() >= deadline:
+            break
+        time.sleep(0.5)
 
     # Assertions
     if 'Item' not in response:
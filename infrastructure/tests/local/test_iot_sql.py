@@ -0,0 +1,73 @@
+import base64
+import json
+
+from infrastructure.local_pipeline.iot_sql import (
+    CompiledRule, RuleSet, compile_topic_filter, load_traffic, make_message, topic_matches
+)
+from infrastructure.local_pipeline.pipeline import deployed_rules
+
+
+def test_compiled_topic_filters_agree_with_mqtt_matching():
+    topics = ["home/heating", "home/heating/status", "home/heating/status/boiler-a",
+              "home/heatingx/status", "home/heating/binary/status/boiler-a", "other"]
+    for topic_filter in ["home/heating/#", "home/heating/status", "home/+/status", "home/heating/+/status/#", "#"]:
+        matches = compile_topic_filter(topic_filter)
+        assert [matches(t) for t in topics] == [topic_matches(topic_filter, t) for t in topics], topic_filter
+
+
+def test_expressions_follow_iot_sql_semantics():
+    rule = CompiledRule("expressions", (
+        "SELECT device_id, metadata.reason AS reason, sensor_voltage * 2 + 1 AS doubled, missing + 1 AS gone, "
+        "7 / 2 AS whole, 7.0 / 2 AS half, topic(4) AS topic_device "
+        "FROM 'home/+/status/#' WHERE NOT (status = 'ACTIVE') AND (missing = 1 OR sensor_voltage >= 0)"
+    ))
+    payload = {"device_id": "boiler-a", "status": "INACTIVE", "sensor_voltage": 3, "metadata": {"reason": "x"}}
+
+    assert rule.evaluate(make_message("home/heating/status/boiler-a", json.dumps(payload).encode())) == {
+        "device_id": "boiler-a", "reason": "x", "doubled": 7, "whole": 3, "half": 3.5, "topic_device": "boiler-a"
+    }
+    active = json.dumps(dict(payload, status="ACTIVE")).encode()
+    assert rule.evaluate(make_message("home/heating/status/boiler-a", active)) is None
+    # A comparison with a missing field is undefined, so the rule does not fire
+    assert CompiledRule("u", "SELECT * FROM '#' WHERE missing <> 'x'").evaluate(make_message("a", b"{}")) is None
+
+
+def test_case_and_is_undefined():
+    rule = CompiledRule("case", (
+        "SELECT CASE isUndefined(seq) WHEN true THEN 'v1' ELSE 'v2' END AS version, "
+        "CASE status WHEN 'ACTIVE' THEN 1 WHEN 'INACTIVE' THEN 0 END AS voltage FROM '#'"
+    ))
+
+    assert rule.evaluate(make_message("a", b'{"status": "ACTIVE"}')) == {"version": "v1", "voltage": 1}
+    assert rule.evaluate(make_message("a", b'{"seq": 3, "status": "UNKNOWN"}')) == {"version": "v2"}
+
+
+def test_select_star_returns_a_copy():
+    document = {"device_id": "boiler-a", "status": "INACTIVE"}
+    result = CompiledRule("star", "SELECT * FROM 'home/#'").evaluate(make_message("home/x", document))
+
+    result["status"] = "changed"
+    assert document["status"] == "INACTIVE"
+
+
+def test_rule_set_counts_forwarded_messages_over_recorded_traffic(tmp_path):
+    """
+    Cost Estimate Test:
+    Replaying recorded traffic tells how many messages each rule would
+    forward to its action before the rule is deployed.
+    """
+    inactive_frame = bytes([1, 0, 0, 1, 0, 0, 0, 1, 1]) + b"b"
+    records = [
+        {"topic": "home/heating/status", "payload": {"device_id": "a", "timestamp": 1, "status": "ACTIVE"}},
+        {"topic": "home/heating/status/a", "payload": {"device_id": "a", "timestamp": 2, "status": "INACTIVE"}},
+        {"topic": "home/heating/commands/a", "payload": {"command": "report"}},
+        {"topic": "home/heating/binary/status/b", "payload_base64": base64.b64encode(inactive_frame).decode()},
+    ]
+    traffic = tmp_path / "traffic.jsonl"
+    traffic.write_text("\n".join(json.dumps(record) for record in records) + "\n")
+
+    report = RuleSet(deployed_rules()).replay(load_traffic(str(traffic)))
+
+    assert report["DynamoDBStorageRule"] == {"seen": 4, "topic_matched": 4, "forwarded": 2}
+    assert report["LambdaAlertRule"]["forwarded"] == 2  # INACTIVE and the ACTIVE recovery
+    assert report["BinaryAlertRule"] == {"seen": 4, "topic_matched": 1, "forwarded": 1}
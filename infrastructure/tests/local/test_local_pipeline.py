@@ -0,0 +1,168 @@
+import base64
+import json
+import struct
+import time
+
+import pytest
+
+from infrastructure.local_pipeline import LocalPipeline, INGESTION_DIRECT, INGESTION_SQS
+from infrastructure.local_pipeline.iot_sql import CompiledRule, make_message
+from infrastructure.local_pipeline.loadgen import run_load, UNLIMITED_RATE
+from infrastructure.stacks.iot_rules import (
+    STORAGE_RULE_SQL, ALERT_RULE_SQL, BINARY_ALERT_RULE_SQL, TTL_OFFSET_SECONDS
+)
+
+
+def binary_frame(device_id, status_code, timestamp=1700000000):
+    """Schema version 1 frame, as hardware/src/codec.py encodes it"""
+    header = struct.pack(">BBBBI", 1, status_code, status_code, 1, timestamp)
+    return header + bytes([len(device_id)]) + device_id.encode()
+
+
+def binary_frame_v2(device_id, status_code, timestamp_ms, seq):
+    """Schema version 2 frame, for payloads carrying timestamp_ms and seq"""
+    header = struct.pack(">BBBBQI", 2, status_code, status_code, 1, timestamp_ms, seq)
+    return header + bytes([len(device_id)]) + device_id.encode()
+
+
+def test_storage_rule_selects_payload_fields_and_ttl():
+    """
+    Rule Contract Test:
+    The storage rule keeps the known fields, drops the rest, and computes the
+    TTL from the rule's own timestamp() with integer division.
+    """
+    rule = CompiledRule("storage", STORAGE_RULE_SQL)
+    payload = {"device_id": "boiler-a", "timestamp": 1700000000, "status": "ACTIVE", "extra": "dropped"}
+
+    item = rule.evaluate(make_message("home/heating/status/boiler-a", json.dumps(payload).encode(), 1700000000999))
+
+    assert item == {"device_id": "boiler-a", "timestamp": 1700000000, "status": "ACTIVE",
+                    "ttl": 1700000000 + TTL_OFFSET_SECONDS}
+    assert rule.evaluate(make_message("home/heating/status", json.dumps(payload).encode())) is not None
+    assert rule.evaluate(make_message("home/heating/commands/boiler-a", json.dumps(payload).encode())) is None
+
+
+def test_payload_v2_events_within_one_second_are_stored_separately():
+    """
+    Rule Contract Test:
+    A burst of transitions within one second used to overwrite a single item.
+    Version 2.0 payloads are keyed by millisecond time and sequence number,
+    version 1.0 payloads keep their whole-second key.
+    """
+    with LocalPipeline() as pipeline:
+        for seq, (status, ms) in enumerate([("ACTIVE", 100), ("INACTIVE", 100), ("ACTIVE", 950)]):
+            pipeline.bus.publish("home/heating/status/boiler-a", json.dumps({
+                "device_id": "boiler-a", "timestamp": 1700000000, "timestamp_ms": 1700000000000 + ms,
+                "seq": 1000 + seq, "status": status, "metadata": {"version": "2.0"},
+            }))
+        for status in ("ACTIVE", "INACTIVE"):
+            pipeline.bus.publish("home/heating/status/boiler-b", json.dumps({
+                "device_id": "boiler-b", "timestamp": 1700000000, "status": status,
+            }))
+        assert pipeline.drain(10)
+
+        stored = pipeline.events_table.query("boiler-a")
+        assert [item["timestamp"] for item in stored] == [1700000000.1, 1700000000.100001, 1700000000.950002]
+        assert [item["status"] for item in stored] == ["ACTIVE", "INACTIVE", "ACTIVE"]
+        assert [item["timestamp"] for item in pipeline.events_table.query("boiler-b")] == [1700000000]
+
+
+def test_binary_frames_are_decoded_and_stored():
+    """
+    Rule Contract Test:
+    Binary frames, heartbeats included, reach the events table through the
+    binary store function, with the fields a JSON payload would have.
+    """
+    with LocalPipeline() as pipeline:
+        for status_code, timestamp in ((1, 1700000000), (2, 1700086400)):
+            frame = binary_frame("boiler-b", status_code, timestamp)
+            pipeline.bus.publish("home/heating/binary/status/boiler-b", frame)
+        assert pipeline.drain(10)
+
+        stored = pipeline.events_table.query("boiler-b")
+        assert [(item["timestamp"], item["status"], item["sensor_voltage"]) for item in stored] == [
+            (1700000000, "ACTIVE", 1), (1700086400, "HEARTBEAT_OK", 0)
+        ]
+        assert pipeline.stats["stored"] == 2
+
+        # Schema version 2 frames within one second are keyed apart, like payload 2.0
+        for seq, status_code in enumerate((1, 0)):
+            pipeline.bus.publish("home/heating/binary/status/boiler-c",
+                                 binary_frame_v2("boiler-c", status_code, 1700000000100, seq))
+        assert pipeline.drain(10)
+        stored = pipeline.events_table.query("boiler-c")
+        assert [(float(item["timestamp"]), item["status"]) for item in stored] == [
+            (1700000000.1, "ACTIVE"), (1700000000.100001, "INACTIVE")
+        ]
+
+
+def test_alert_rules_match_inactive_and_recovery_status():
+    alert = CompiledRule("alert", ALERT_RULE_SQL)
+    binary = CompiledRule("binary", BINARY_ALERT_RULE_SQL)
+
+    inactive = json.dumps({"device_id": "boiler-a", "status": "INACTIVE"}).encode()
+    active = json.dumps({"device_id": "boiler-a", "status": "ACTIVE"}).encode()
+    heartbeat = json.dumps({"device_id": "boiler-a", "status": "HEARTBEAT_OK"}).encode()
+    assert alert.evaluate(make_message("home/heating/status/boiler-a", inactive)) == json.loads(inactive)
+    assert alert.evaluate(make_message("home/heating/status/boiler-a", active)) == json.loads(active)
+    assert alert.evaluate(make_message("home/heating/status/boiler-a", heartbeat)) is None
+    assert alert.evaluate(make_message("home/heating/status/boiler-a", b"\x01\x00\x00")) is None
+
+    for encode in (binary_frame, lambda device_id, code: binary_frame_v2(device_id, code, 1700000000100, 3)):
+        for status_code in (0, 1):
+            frame = encode("boiler-b", status_code)
+            assert binary.evaluate(make_message("home/heating/binary/status/boiler-b", frame)) == {
+                "data": base64.b64encode(frame).decode()
+            }
+        assert binary.evaluate(make_message("home/heating/binary/status/boiler-b", encode("boiler-b", 2))) is None
+
+
+def test_unsupported_sql_is_rejected_when_compiled():
+    with pytest.raises(ValueError):
+        CompiledRule("unsupported", "SELECT get_thing_shadow(device_id) FROM 'home/#'")
+
+
+@pytest.mark.parametrize("ingestion", [INGESTION_DIRECT, INGESTION_SQS])
+def test_end_to_end_data_flow_offline(ingestion):
+    """
+    End-to-End Test without AWS (the offline counterpart of tests/e2e):
+    a status message is stored in the events table, and an INACTIVE one
+    reaches both chat channels through the real notifier handler.
+    """
+    with LocalPipeline(alert_ingestion=ingestion) as pipeline:
+        timestamp = int(time.time())
+        payload = {"device_id": "e2e-local", "timestamp": timestamp, "status": "TESTING",
+                   "sensor_voltage": 999, "metadata": {"source": "e2e-test-runner"}}
+        pipeline.bus.publish("home/heating/status", json.dumps(payload))
+        pipeline.bus.publish("home/heating/status/e2e-local",
+                             json.dumps(dict(payload, status="INACTIVE", timestamp=timestamp + 1)))
+        assert pipeline.drain(timeout=10)
+
+        item = pipeline.events_table.get_item(Key={"device_id": "e2e-local", "timestamp": timestamp})["Item"]
+        assert item["status"] == "TESTING"
+        assert item["metadata"]["source"] == "e2e-test-runner"
+
+        urls = sorted(delivery.url.split("/")[2] for delivery in pipeline.http.deliveries)
+        assert urls == ["api.telegram.org", "discord.invalid"]
+        assert [device for device, _ in pipeline.http.mentioned_devices()] == ["e2e-local", "e2e-local"]
+
+
+def test_load_generator_reports_throughput_latency_and_drops():
+    with LocalPipeline(rate_limits=UNLIMITED_RATE) as pipeline:
+        report = run_load(pipeline, devices=50, rate=2000, duration=0.5, inactive_ratio=0.1)
+
+    assert report["drained"]
+    assert report["published"] == report["ingested"] == report["stored"] == 1000
+    assert len(pipeline.events_table) == 1000  # 20 messages per device and second, none overwritten
+    assert report["dropped"] == 0
+    assert report["alerts_expected"] > 0
+    assert report["alerts_lost"] == 0
+    assert 0 <= report["latency_ms"]["p50"] <= report["latency_ms"]["p99"]
+
+
+def test_ingress_beyond_max_inflight_is_dropped():
+    with LocalPipeline(rule_workers=0, max_inflight=10) as pipeline:
+        accepted = [pipeline.bus.publish("home/heating/status", b"{}") for _ in range(15)]
+
+        assert accepted.count(False) == 5
+        assert pipeline.stats["dropped"] == 5
@@ -3,8 +3,8 @@ import aws_cdk.assertions as assertions
 from infrastructure.stacks.heating_monitor_stack import HeatingMonitorStack
 
 # Helper function to instantiate the stack and return its synthesized template
-def get_template():
-    app = core.App()
+def get_template(context=None):
+    app = core.App(context=context)
     stack = HeatingMonitorStack(app, "HeatingMonitorStack")
     return assertions.Template.from_stack(stack)
 
@@ -17,8 +17,8 @@ def test_dynamodb_table_created_with_correct_schema():
     """
     template = get_template()
 
-    # 1. Check: Exactly one DynamoDB table should exist
-    template.resource_count_is("AWS::DynamoDB::Table", 1)
+    # 1. Check: the events table, the notifier's alert suppression table, the rollups and device state
+    template.resource_count_is("AWS::DynamoDB::Table", 4)
 
     # 2. Check: Partition key and sort key must match the defined data contract
     template.has_resource_properties("AWS::DynamoDB::Table", {
@@ -76,9 +76,233 @@ def test_iot_rules_created():
     """
     Integration Test:
     Ensures that the required IoT Topic Rules are created.
-    The system uses two rules: one for DynamoDB ingestion and one for alerting.
+    The system uses four rules: two for DynamoDB ingestion and two for alerting,
+    for JSON and compact binary frames each.
     """
     template = get_template()
 
-    # Two IoT rules must exist (one for DynamoDB writes, one for alert notifications)
-    template.resource_count_is("AWS::IoT::TopicRule", 2)
+    # DynamoDB writes, binary frames to the store function, JSON and binary alert notifications
+    template.resource_count_is("AWS::IoT::TopicRule", 4)
+
+
+def test_binary_frames_are_decoded_and_stored():
+    """
+    Data Contract Test:
+    Every binary frame goes to a function that decodes it (with the notifier's
+    payload_codec) and writes it to the events table, so binary devices get a
+    history, device state, rollups and liveness checks like JSON ones.
+    """
+    template = get_template()
+
+    template.has_resource_properties("AWS::IoT::TopicRule", {
+        "TopicRulePayload": {"Sql": "SELECT encode(*, 'base64') AS data FROM 'home/heating/binary/#'"}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "binary_store.lambda_handler",
+        "Environment": {"Variables": {"EVENTS_TABLE": assertions.Match.any_value(), "TTL_OFFSET_SECONDS": "7776000"}}
+    })
+
+
+def test_binary_alert_rule_filters_inactive_frames():
+    """
+    Data Contract Test:
+    Binary frames are forwarded base64-encoded and filtered on the header prefix
+    of an INACTIVE or ACTIVE state change, in either schema version, so the notifier is not invoked for
+    every frame (heartbeats stay out).
+    """
+    template = get_template()
+
+    template.has_resource_properties("AWS::IoT::TopicRule", {
+        "TopicRulePayload": {
+            "Sql": (
+                "SELECT encode(*, 'base64') AS data FROM 'home/heating/binary/#' "
+                "WHERE startswith(encode(*, 'base64'), 'AQAA') OR startswith(encode(*, 'base64'), 'AgAA') "
+                "OR startswith(encode(*, 'base64'), 'AQEB') OR startswith(encode(*, 'base64'), 'AgEB')"
+            )
+        }
+    })
+
+
+def test_status_rules_accept_gateway_device_topics():
+    """
+    Data Contract Test:
+    Gateways publish on home/heating/status/<device_id>; the storage and alert
+    rules must match those as well as the single-device home/heating/status.
+    """
+    template = get_template()
+
+    template.has_resource_properties("AWS::IoT::TopicRule", {
+        "TopicRulePayload": {
+            "Sql": (
+                "SELECT * FROM 'home/heating/#' "
+                "WHERE topic(3) = 'status' AND (status = 'INACTIVE' OR status = 'ACTIVE')"
+            )
+        }
+    })
+    template.has_resource_properties("AWS::IoT::TopicRule", {
+        "TopicRulePayload": {
+            "Sql": assertions.Match.string_like_regexp(r"FROM 'home/heating/#' WHERE topic\(3\) = 'status'$")
+        }
+    })
+
+
+def test_sqs_alert_ingestion_batches_into_the_notifier():
+    """
+    Integration Test:
+    With -c alert_ingestion=sqs both alert rules feed a queue, and the notifier
+    consumes it in batches, reporting partial batch failures. The rules no
+    longer need permission to invoke the function directly (only the binary
+    store function is still invoked by a rule).
+    """
+    template = get_template({"alert_ingestion": "sqs"})
+
+    template.resource_count_is("AWS::SQS::Queue", 5)  # DLQ, retry queue, alert queue, two stream DLQs
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BatchSize": 100,
+        "MaximumBatchingWindowInSeconds": 5,
+        "FunctionResponseTypes": ["ReportBatchItemFailures"]
+    })
+    rules = template.find_resources("AWS::IoT::TopicRule")
+    alert_rules = [r for r in rules.values() if "Sqs" in r["Properties"]["TopicRulePayload"]["Actions"][0]]
+    assert len(alert_rules) == 2
+    invoked = template.find_resources("AWS::Lambda::Permission", {"Properties": {"Principal": "iot.amazonaws.com"}})
+    assert [p["Properties"]["FunctionName"]["Fn::GetAtt"][0].startswith("BinaryStoreFunction")
+            for p in invoked.values()] == [True]
+
+
+def test_alert_state_table_for_cross_container_suppression():
+    """
+    Data Contract Test:
+    The notifier records the last notified status per device with
+    conditional writes keyed by device_id; stale items expire through TTL.
+    """
+    template = get_template()
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [{"AttributeName": "alert_key", "KeyType": "HASH"}],
+        "TimeToLiveSpecification": {"AttributeName": "ttl", "Enabled": True}
+    })
+
+
+def test_retry_queue_feeds_failed_channels_back_to_the_notifier():
+    """
+    Integration Test:
+    Failed channel deliveries are re-enqueued to a retry queue that redrives
+    to the alert DLQ; the notifier consumes it and knows both queue URLs.
+    """
+    template = get_template()
+
+    template.has_resource_properties("AWS::SQS::Queue", {
+        "QueueName": "heating-alert-retry-queue",
+        "RedrivePolicy": {"maxReceiveCount": 5}
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BatchSize": 10,
+        "FunctionResponseTypes": ["ReportBatchItemFailures"]
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Environment": {"Variables": {
+            "RETRY_QUEUE_URL": assertions.Match.any_value(),
+            "ALERT_DLQ_URL": assertions.Match.any_value(),
+            "RETRY_MAX_ATTEMPTS": "5"
+        }}
+    })
+
+
+def test_rollups_are_maintained_from_the_events_stream():
+    """
+    Data Contract Test:
+    The events table streams new images to the rollup function, which keeps
+    per-device hourly and daily buckets in a table without TTL. Failed
+    batches are bisected, retried and finally described in the rollup DLQ.
+    """
+    template = get_template()
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [
+            {"AttributeName": "device_id", "KeyType": "HASH"},
+            {"AttributeName": "timestamp", "KeyType": "RANGE"}
+        ],
+        "StreamSpecification": {"StreamViewType": "NEW_IMAGE"}
+    })
+    rollup_tables = template.find_resources("AWS::DynamoDB::Table", {"Properties": {
+        "KeySchema": [
+            {"AttributeName": "device_id", "KeyType": "HASH"},
+            {"AttributeName": "bucket", "KeyType": "RANGE"}
+        ]
+    }})
+    assert len(rollup_tables) == 1
+    assert "TimeToLiveSpecification" not in list(rollup_tables.values())[0]["Properties"]
+
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "StartingPosition": "TRIM_HORIZON",
+        "BatchSize": 500,
+        "BisectBatchOnFunctionError": True,
+        "MaximumRetryAttempts": 5,
+        "FunctionResponseTypes": ["ReportBatchItemFailures"],
+        "DestinationConfig": {"OnFailure": {"Destination": assertions.Match.any_value()}}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Environment": {"Variables": {
+            "ROLLUP_TABLE": assertions.Match.any_value(),
+            "EVENTS_TABLE": assertions.Match.any_value(),
+            "MAX_GAP_SECONDS": "90000"
+        }}
+    })
+    template.has_resource_properties("AWS::SQS::Queue", {"QueueName": "heating-rollup-dlq"})
+
+
+def test_device_state_view_follows_the_events_stream():
+    """
+    Data Contract Test:
+    One item per device keyed by device_id, kept by a second consumer of the
+    events stream that starts from the latest records.
+    """
+    template = get_template()
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [{"AttributeName": "device_id", "KeyType": "HASH"}]
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "StartingPosition": "LATEST",
+        "BatchSize": 100,
+        "MaximumBatchingWindowInSeconds": 1,
+        "FunctionResponseTypes": ["ReportBatchItemFailures"]
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Environment": {"Variables": {"DEVICE_STATE_TABLE": assertions.Match.any_value()}}
+    })
+
+
+def test_liveness_check_queries_a_sparse_index_on_a_schedule():
+    """
+    Integration Test:
+    Silent devices are found through the "liveness" index keyed by shard and
+    deadline, every 15 minutes, and alerted through the notifier.
+    """
+    template = get_template()
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "GlobalSecondaryIndexes": [{
+            "IndexName": "liveness",
+            "KeySchema": [
+                {"AttributeName": "liveness_shard", "KeyType": "HASH"},
+                {"AttributeName": "expected_by", "KeyType": "RANGE"}
+            ],
+            "Projection": {"ProjectionType": "KEYS_ONLY"}
+        }]
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "liveness.lambda_handler",
+        "Environment": {"Variables": {
+            "NOTIFIER_FUNCTION": assertions.Match.any_value(),
+            "LIVENESS_TIMEOUT_SECONDS": "90000"
+        }}
+    })
+    template.has_resource_properties("AWS::Events::Rule", {"ScheduleExpression": "rate(15 minutes)"})
+
+    sqs_template = get_template({"alert_ingestion": "sqs"})
+    sqs_template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "liveness.lambda_handler",
+        "Environment": {"Variables": {"ALERT_QUEUE_URL": assertions.Match.any_value()}}
+    })
@@ -0,0 +1,157 @@
+import logging
+import os
+from state_client import LIVENESS_TIMEOUT_SECONDS, liveness_shard
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Keeps one item per device in the device state table: the last status, when
+# it last changed and the last heartbeat. Fed by the events table's stream;
+# every write is conditional on being newer than the stored heartbeat, so
+# replayed and out-of-order records never move a device back in time. Each
+# write also re-arms the device's liveness deadline (see liveness.py).
+# HEARTBEAT_OK is a liveness signal, not a status: it only moves the heartbeat.
+
+DEVICE_STATE_TABLE = os.environ.get('DEVICE_STATE_TABLE', '')
+
+HEARTBEAT = "HEARTBEAT_OK"
+
+# Created on first use, like the notifier's clients
+dynamodb = None
+
+
+def get_dynamodb():
+    global dynamodb
+    if dynamodb is None:
+        import boto3
+        dynamodb = boto3.client('dynamodb')
+    return dynamodb
+
+
+def error_code(error):
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def latest_events(records):
+    """
+    {device_id: [(timestamp, status)]} in time order; an overwritten item keeps
+    its newest image. Heartbeats have status None.
+    """
+    devices = {}
+    for record in records:
+        if record.get("eventName") not in ("INSERT", "MODIFY"):
+            continue
+        image = record["dynamodb"]["NewImage"]
+        if "status" not in image:
+            continue
+        sequence = int(record["dynamodb"]["SequenceNumber"])
+        timestamp = float(image["timestamp"]["N"])  # decimals for payload 2.0, see iot_rules.py
+        events = devices.setdefault(image["device_id"]["S"], {})
+        if timestamp not in events or events[timestamp][0] < sequence:
+            status = image["status"]["S"]
+            events[timestamp] = (sequence, None if status == HEARTBEAT else status)
+    return {
+        device_id: [(timestamp, status) for timestamp, (_, status) in sorted(events.items())]
+        for device_id, events in devices.items()
+    }
+
+
+def summarize(events):
+    """
+    (status, heartbeat, change) of a device's events: the final status, the
+    newest timestamp and when the final status began. `changed` tells whether
+    the status changed within the events themselves. Status and change are
+    None when the events are all heartbeats.
+    """
+    statuses = [event for event in events if event[1] is not None]
+    if not statuses:
+        return None, events[-1][0], None, False
+    status = statuses[-1][1]
+    since = len(statuses) - 1
+    while since and statuses[since - 1][1] == status:
+        since -= 1
+    return status, events[-1][0], statuses[since][0], since > 0
+
+
+def update_device(device_id, events):
+    """Applies a device's events; returns False if they were all older than the stored heartbeat"""
+    status, heartbeat, change, changed = summarize(events)
+    client = get_dynamodb()
+    key = {"device_id": {"S": device_id}}
+    values = {
+        ":heartbeat": {"N": str(heartbeat)},
+        ":expected": {"N": str(heartbeat + LIVENESS_TIMEOUT_SECONDS)}, ":shard": {"N": str(liveness_shard(device_id))},
+    }
+    liveness = ", expected_by = :expected, liveness_shard = :shard REMOVE silent_since"
+
+    # Heartbeats only: the status stays as stored; a device is created by its first status
+    if status is None:
+        try:
+            client.update_item(
+                TableName=DEVICE_STATE_TABLE, Key=key,
+                UpdateExpression="SET last_heartbeat = :heartbeat" + liveness,
+                ConditionExpression="last_heartbeat < :heartbeat",
+                ExpressionAttributeValues=values,
+            )
+            return True
+        except Exception as e:
+            if error_code(e) != "ConditionalCheckFailedException":
+                raise
+        return False
+
+    values.update({":status": {"S": status}, ":change": {"N": str(change)}})
+
+    # New device or a status change: everything moves
+    try:
+        client.update_item(
+            TableName=DEVICE_STATE_TABLE, Key=key,
+            UpdateExpression="SET last_status = :status, last_heartbeat = :heartbeat, last_change = :change" + liveness,
+            ConditionExpression="attribute_not_exists(device_id) OR "
+                                "(last_heartbeat < :heartbeat AND last_status <> :status)",
+            ExpressionAttributeValues=values,
+        )
+        return True
+    except Exception as e:
+        if error_code(e) != "ConditionalCheckFailedException":
+            raise
+
+    # Same status as stored: a heartbeat, unless the status flipped and back within the batch
+    expression = "SET last_heartbeat = :heartbeat" + (", last_change = :change" if changed else "") + liveness
+    if not changed:
+        del values[":change"]
+    try:
+        client.update_item(
+            TableName=DEVICE_STATE_TABLE, Key=key,
+            UpdateExpression=expression,
+            ConditionExpression="last_heartbeat < :heartbeat AND last_status = :status",
+            ExpressionAttributeValues=values,
+        )
+        return True
+    except Exception as e:
+        if error_code(e) != "ConditionalCheckFailedException":
+            raise
+    # The stored heartbeat is already as new: a replay, or events delivered late
+    return False
+
+
+def lambda_handler(event, context):
+    records = event.get("Records", [])
+    devices = latest_events(records)
+
+    failures = []
+    stale = 0
+    for device_id, events in devices.items():
+        try:
+            if not update_device(device_id, events):
+                stale += 1
+        except Exception as e:
+            logger.error(f"Device state update of {device_id} failed: {e}")
+            failures.extend(
+                record["dynamodb"]["SequenceNumber"] for record in records
+                if record.get("dynamodb", {}).get("NewImage", {}).get("device_id", {}).get("S") == device_id
+            )
+
+    logger.info(f"Updated state of {len(devices)} devices ({stale} stale, {len(failures)} failed records)")
+    # The stream is retried from the oldest failed record
+    oldest = min(failures, key=int, default=None)
+    return {"batchItemFailures": [] if oldest is None else [{"itemIdentifier": oldest}]}
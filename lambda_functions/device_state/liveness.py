@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from state_client import LIVENESS_INDEX, LIVENESS_SHARDS, liveness_shard
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Dead man's switch: runs on a schedule and alerts on devices whose liveness
+# deadline passed without a message. Only overdue devices are read, from the
+# sparse liveness index, one query per shard; nothing scans the fleet. A
+# device is reported once: the conditional claim removes it from the index
+# until its next message re-arms the deadline (index.py).
+
+DEVICE_STATE_TABLE = os.environ.get('DEVICE_STATE_TABLE', '')
+NOTIFIER_FUNCTION = os.environ.get('NOTIFIER_FUNCTION', '')
+# Set when the stack batches alerts through SQS; silent devices then join the notifier's digests
+ALERT_QUEUE_URL = os.environ.get('ALERT_QUEUE_URL', '')
+
+SILENT = "SILENT"
+QUERY_PAGE_SIZE = 500
+SQS_BATCH_SIZE = 10  # send_message_batch limit
+WORKERS = 16
+# Left for the last alerts in flight when the invocation is about to time out
+DEADLINE_MARGIN_MS = 5000
+
+# Created on first use, like the notifier's clients
+_clients = {}
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="liveness")
+
+
+def get_client(service):
+    if service not in _clients:
+        import boto3
+        _clients[service] = boto3.client(service)
+    return _clients[service]
+
+
+def error_code(error):
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def overdue_devices(shard, now):
+    """(device_id, expected_by) of one shard whose deadline is before `now`, oldest first"""
+    kwargs = {
+        "TableName": DEVICE_STATE_TABLE,
+        "IndexName": LIVENESS_INDEX,
+        "KeyConditionExpression": "liveness_shard = :shard AND expected_by < :now",
+        "ExpressionAttributeValues": {":shard": {"N": str(shard)}, ":now": {"N": str(now)}},
+        "Limit": QUERY_PAGE_SIZE,
+    }
+    while True:
+        response = get_client("dynamodb").query(**kwargs)
+        for item in response.get("Items", []):
+            yield item["device_id"]["S"], float(item["expected_by"]["N"])
+        if "LastEvaluatedKey" not in response:
+            return
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def claim(device_id, expected_by, now):
+    """
+    Takes the device out of the liveness index and marks it silent. False if
+    a message re-armed the deadline meanwhile (the index is eventually
+    consistent) or another run claimed it first.
+    """
+    try:
+        get_client("dynamodb").update_item(
+            TableName=DEVICE_STATE_TABLE,
+            Key={"device_id": {"S": device_id}},
+            UpdateExpression="SET silent_since = :now REMOVE expected_by, liveness_shard",
+            ConditionExpression="expected_by = :expected",
+            ExpressionAttributeValues={":now": {"N": str(now)}, ":expected": {"N": str(expected_by)}},
+        )
+        return True
+    except Exception as e:
+        if error_code(e) == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def release(device_id, expected_by, shard):
+    """Puts a device whose alert could not be handed over back into the index, for the next run"""
+    get_client("dynamodb").update_item(
+        TableName=DEVICE_STATE_TABLE,
+        Key={"device_id": {"S": device_id}},
+        UpdateExpression="SET expected_by = :expected, liveness_shard = :shard REMOVE silent_since",
+        ConditionExpression="attribute_not_exists(expected_by)",
+        ExpressionAttributeValues={":expected": {"N": str(expected_by)}, ":shard": {"N": str(shard)}},
+    )
+
+
+def silent_alert(device_id, expected_by, now):
+    return {"device_id": device_id, "status": SILENT, "timestamp": now, "expected_by": expected_by}
+
+
+def send_alerts(alerts):
+    """Hands alerts to the notifier; returns the device ids that could not be handed over"""
+    if ALERT_QUEUE_URL:
+        failed = []
+        for start in range(0, len(alerts), SQS_BATCH_SIZE):
+            chunk = alerts[start:start + SQS_BATCH_SIZE]
+            try:
+                response = get_client("sqs").send_message_batch(QueueUrl=ALERT_QUEUE_URL, Entries=[
+                    {"Id": str(n), "MessageBody": json.dumps(alert)} for n, alert in enumerate(chunk)
+                ])
+                failed += [chunk[int(entry["Id"])]["device_id"] for entry in response.get("Failed", [])]
+            except Exception as e:
+                logger.error(f"Failed to enqueue {len(chunk)} silent alerts: {e}")
+                failed += [alert["device_id"] for alert in chunk]
+        return failed
+
+    def invoke(alert):
+        try:
+            get_client("lambda").invoke(
+                FunctionName=NOTIFIER_FUNCTION, InvocationType="Event", Payload=json.dumps(alert).encode()
+            )
+            return None
+        except Exception as e:
+            logger.error(f"Failed to invoke the notifier for {alert['device_id']}: {e}")
+            return alert["device_id"]
+
+    return [device_id for device_id in _executor.map(invoke, alerts) if device_id is not None]
+
+
+def check_shard(shard, now, deadline):
+    """Claims the overdue devices of one shard; returns their alerts and whether the shard was finished"""
+    alerts = []
+    for device_id, expected_by in overdue_devices(shard, now):
+        if time.monotonic() >= deadline:
+            return alerts, False
+        if claim(device_id, expected_by, now):
+            alerts.append(silent_alert(device_id, expected_by, now))
+    return alerts, True
+
+
+def lambda_handler(event, context):
+    now = int(time.time())
+    budget = context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS if context else 60000
+    deadline = time.monotonic() + budget / 2000  # half for claiming, half for sending
+
+    alerts, unfinished = [], []
+    for shard, (claimed, finished) in enumerate(_executor.map(lambda s: check_shard(s, now, deadline),
+                                                              range(LIVENESS_SHARDS))):
+        alerts += claimed
+        if not finished:
+            unfinished.append(shard)
+
+    failed = set(send_alerts(alerts))
+    for alert in alerts:
+        if alert["device_id"] in failed:
+            try:
+                release(alert["device_id"], alert["expected_by"], liveness_shard(alert["device_id"]))
+            except Exception as e:
+                # A message from the device re-arms it anyway
+                logger.error(f"Could not release {alert['device_id']}, its silence goes unreported: {e}")
+
+    if unfinished:
+        # The next scheduled run continues where this one stopped
+        logger.warning(f"Deadline reached before finishing shards {unfinished}")
+    logger.info(f"{len(alerts)} devices silent, {len(failed)} alerts released for the next run")
+    return {"silent": len(alerts) - len(failed), "released": len(failed), "unfinished_shards": unfinished}
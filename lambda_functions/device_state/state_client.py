@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+# Read side of the device state table: one GetItem per device, or a
+# BatchGetItem for a page of devices, answered from an in-process cache for
+# `ttl` seconds so a status page or a liveness check polling every few
+# seconds does not turn into a read per request.
+
+DeviceState = namedtuple("DeviceState", ["device_id", "last_status", "last_change", "last_heartbeat", "silent_since"],
+                         defaults=(None,))
+
+# Devices awaiting a heartbeat carry `expected_by` and `liveness_shard`, the
+# keys of the sparse liveness index; a device reported silent loses both until
+# it is heard from again. Shards spread the index over several partitions.
+LIVENESS_INDEX = "liveness"
+LIVENESS_SHARDS = int(os.environ.get('LIVENESS_SHARDS', '8'))
+
+# The edge sends a heartbeat every 24 hours (hardware/src/monitor.py); an hour of grace on top
+LIVENESS_TIMEOUT_SECONDS = int(os.environ.get('LIVENESS_TIMEOUT_SECONDS', str(86400 + 3600)))
+
+DEFAULT_TTL_SECONDS = 30
+
+# BatchGetItem limit
+BATCH_GET_SIZE = 100
+MAX_UNPROCESSED_RETRIES = 5
+
+
+def liveness_shard(device_id, shards=LIVENESS_SHARDS):
+    return zlib.crc32(device_id.encode("utf-8")) % shards
+
+
+def parse_item(item):
+    return DeviceState(
+        item["device_id"]["S"],
+        item["last_status"]["S"],
+        float(item["last_change"]["N"]),
+        float(item["last_heartbeat"]["N"]),
+        int(item["silent_since"]["N"]) if "silent_since" in item else None,
+    )
+
+
+class DeviceStateClient:
+    """
+    Usage:
+        states = DeviceStateClient(os.environ["DEVICE_STATE_TABLE"])
+        states.get("boiler-1")           # DeviceState, or None for an unknown device
+        states.get_many(["a", "b"])      # {device_id: DeviceState} of the known ones
+
+    Unknown devices are cached too. `get(..., max_age=0)` bypasses the cache.
+    """
+
+    def __init__(self, table_name, ttl=DEFAULT_TTL_SECONDS, client=None, clock=time.monotonic, sleep=time.sleep):
+        self.table_name = table_name
+        self.ttl = ttl
+        self.clock = clock
+        self.sleep = sleep
+        self._client = client
+        self._cache = {}  # device_id -> (fetched_at, DeviceState or None)
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('dynamodb')
+        return self._client
+
+    def _cached(self, device_id, max_age):
+        with self._lock:
+            entry = self._cache.get(device_id)
+        if entry is not None and self.clock() - entry[0] < max_age:
+            return entry
+        return None
+
+    def _store(self, states, fetched_at):
+        with self._lock:
+            self._cache.update({device_id: (fetched_at, state) for device_id, state in states.items()})
+
+    def get(self, device_id, max_age=None):
+        entry = self._cached(device_id, self.ttl if max_age is None else max_age)
+        if entry is not None:
+            return entry[1]
+        fetched_at = self.clock()
+        item = self.client.get_item(TableName=self.table_name, Key={"device_id": {"S": device_id}}).get("Item")
+        state = parse_item(item) if item else None
+        self._store({device_id: state}, fetched_at)
+        return state
+
+    def get_many(self, device_ids, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        found = {}
+        missing = []
+        for device_id in dict.fromkeys(device_ids):
+            entry = self._cached(device_id, max_age)
+            if entry is None:
+                missing.append(device_id)
+            elif entry[1] is not None:
+                found[device_id] = entry[1]
+
+        for start in range(0, len(missing), BATCH_GET_SIZE):
+            fetched_at = self.clock()
+            chunk = missing[start:start + BATCH_GET_SIZE]
+            states = dict.fromkeys(chunk)
+            states.update({state.device_id: state for state in self._batch_get(chunk)})
+            self._store(states, fetched_at)
+            found.update({device_id: state for device_id, state in states.items() if state is not None})
+        return found
+
+    def _batch_get(self, device_ids):
+        request = {self.table_name: {"Keys": [{"device_id": {"S": device_id}} for device_id in device_ids]}}
+        for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+            response = self.client.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(self.table_name, []):
+                yield parse_item(item)
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                return
+            self.sleep(min(1.0, 0.05 * 2 ** attempt))
+        raise RuntimeError(f"{len(request[self.table_name]['Keys'])} devices still unprocessed by BatchGetItem")
+
+    def invalidate(self, device_id=None):
+        with self._lock:
+            if device_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(device_id, None)
@@ -0,0 +1,218 @@
+import unittest
+import json
+from unittest.mock import patch
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botocore.exceptions import ClientError
+
+import index
+import liveness
+from state_client import DeviceState, DeviceStateClient, LIVENESS_TIMEOUT_SECONDS
+
+TABLE = "device-state"
+
+
+class InMemoryStateClient:
+    """update_item with the conditions of the state writer and the liveness checker, reads and the index query"""
+
+    def __init__(self):
+        self.items = {}
+        self.reads = 0
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues):
+        device_id = Key["device_id"]["S"]
+        item = self.items.get(device_id)
+        values = ExpressionAttributeValues
+        if ConditionExpression == "expected_by = :expected":
+            holds = item is not None and "expected_by" in item and \
+                float(item["expected_by"]["N"]) == float(values[":expected"]["N"])
+        elif ConditionExpression == "attribute_not_exists(expected_by)":
+            holds = item is not None and "expected_by" not in item
+        else:
+            newer = item is not None and float(item["last_heartbeat"]["N"]) < float(values[":heartbeat"]["N"])
+            if ConditionExpression == "last_heartbeat < :heartbeat":
+                holds = newer
+            elif ConditionExpression.startswith("attribute_not_exists"):
+                holds = item is None or (newer and item["last_status"] != values[":status"])
+            else:
+                holds = newer and item["last_status"] == values[":status"]
+        if not holds:
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+
+        item = self.items.setdefault(device_id, {"device_id": {"S": device_id}})
+        assignments, _, removals = UpdateExpression[len("SET "):].partition(" REMOVE ")
+        for assignment in assignments.split(", "):
+            name, placeholder = assignment.split(" = ")
+            item[name] = values[placeholder]
+        for name in filter(None, removals.split(", ")):
+            item.pop(name, None)
+
+    def get_item(self, TableName, Key):
+        self.reads += 1
+        item = self.items.get(Key["device_id"]["S"])
+        return {"Item": dict(item)} if item else {}
+
+    def query(self, TableName, IndexName, KeyConditionExpression, ExpressionAttributeValues, Limit, **kwargs):
+        shard, now = ExpressionAttributeValues[":shard"], int(ExpressionAttributeValues[":now"]["N"])
+        found = [item for item in self.items.values()
+                 if item.get("liveness_shard") == shard and float(item["expected_by"]["N"]) < now]
+        return {"Items": sorted(found, key=lambda item: float(item["expected_by"]["N"]))}
+
+    def batch_get_item(self, RequestItems):
+        self.reads += 1
+        keys = RequestItems[TABLE]["Keys"]
+        found = [dict(self.items[k["device_id"]["S"]]) for k in keys if k["device_id"]["S"] in self.items]
+        return {"Responses": {TABLE: found}, "UnprocessedKeys": {}}
+
+
+def record(device_id, timestamp, status, sequence):
+    return {
+        "eventName": "INSERT",
+        "dynamodb": {
+            "SequenceNumber": str(sequence),
+            "NewImage": {
+                "device_id": {"S": device_id},
+                "timestamp": {"N": str(timestamp)},
+                "status": {"S": status},
+            },
+        },
+    }
+
+
+class TestDeviceState(unittest.TestCase):
+
+    def setUp(self):
+        self.client = InMemoryStateClient()
+        patcher = patch.multiple(index, dynamodb=self.client, DEVICE_STATE_TABLE=TABLE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.states = DeviceStateClient(TABLE, client=self.client)
+
+    def handle(self, *records):
+        return index.lambda_handler({"Records": list(records)}, None)
+
+    def test_heartbeats_keep_the_change_time(self):
+        self.handle(record("pump-1", 100, "ACTIVE", 1), record("pump-1", 400, "ACTIVE", 2))
+        self.handle(record("pump-1", 700, "ACTIVE", 3))
+
+        self.assertEqual(self.states.get("pump-1"), DeviceState("pump-1", "ACTIVE", 100, 700))
+
+    def test_status_change_moves_the_change_time(self):
+        self.handle(record("pump-1", 100, "ACTIVE", 1))
+        self.handle(record("pump-1", 400, "INACTIVE", 2), record("pump-1", 700, "INACTIVE", 3))
+        self.assertEqual(self.states.get("pump-1", max_age=0), DeviceState("pump-1", "INACTIVE", 400, 700))
+
+        # Flipped and back within one batch: same status, but it did change
+        self.handle(record("pump-1", 800, "ACTIVE", 4), record("pump-1", 900, "INACTIVE", 5))
+        self.assertEqual(self.states.get("pump-1", max_age=0), DeviceState("pump-1", "INACTIVE", 900, 900))
+
+    def test_out_of_order_and_replayed_events_are_rejected(self):
+        self.handle(record("pump-1", 700, "INACTIVE", 2))
+        response = self.handle(record("pump-1", 400, "ACTIVE", 1), record("pump-1", 700, "INACTIVE", 2))
+
+        self.assertEqual(response["batchItemFailures"], [])
+        self.assertEqual(self.states.get("pump-1"), DeviceState("pump-1", "INACTIVE", 700, 700))
+
+    def test_reads_are_cached_for_the_ttl(self):
+        now = [0.0]
+        states = DeviceStateClient(TABLE, ttl=30, client=self.client, clock=lambda: now[0])
+        self.handle(record("pump-1", 100, "ACTIVE", 1), record("pump-2", 100, "INACTIVE", 2))
+
+        self.assertEqual(sorted(states.get_many(["pump-1", "pump-2", "ghost"])), ["pump-1", "pump-2"])
+        self.assertIsNone(states.get("ghost"))
+        self.assertEqual(states.get("pump-1").last_status, "ACTIVE")
+        self.assertEqual(self.client.reads, 1)
+
+        self.handle(record("pump-1", 200, "INACTIVE", 3))
+        now[0] = 31.0
+        self.assertEqual(states.get("pump-1").last_status, "INACTIVE")
+        self.assertEqual(self.client.reads, 2)
+
+    def test_heartbeat_ok_is_not_a_status(self):
+        self.handle(record("pump-1", 1000, "ACTIVE", 1))
+        self.handle(record("pump-1", 87400, "HEARTBEAT_OK", 2))
+        self.assertEqual(self.states.get("pump-1", max_age=0), DeviceState("pump-1", "ACTIVE", 1000, 87400))
+        self.assertEqual(index.summarize([(1000, "ACTIVE"), (87400, None)]), ("ACTIVE", 87400, 1000, False))
+
+        # Behind a change in the same batch, it only moves the heartbeat
+        self.handle(record("pump-1", 90000, "INACTIVE", 3), record("pump-1", 95000, "HEARTBEAT_OK", 4))
+        self.assertEqual(self.states.get("pump-1", max_age=0), DeviceState("pump-1", "INACTIVE", 90000, 95000))
+
+        # A device is not created by a heartbeat, nor moved back in time by a late one
+        self.assertEqual(self.handle(record("pump-2", 1000, "HEARTBEAT_OK", 5),
+                                     record("pump-1", 94000, "HEARTBEAT_OK", 6))["batchItemFailures"], [])
+        self.assertIsNone(self.states.get("pump-2"))
+        self.assertEqual(self.states.get("pump-1", max_age=0).last_heartbeat, 95000)
+
+
+class FakeLambda:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.alerts = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        alert = json.loads(Payload)
+        if alert["device_id"] in self.fail:
+            raise ConnectionError("throttled")
+        self.alerts.append(alert)
+
+
+class TestLiveness(unittest.TestCase):
+
+    def setUp(self):
+        self.client = InMemoryStateClient()
+        self.notifier = FakeLambda()
+        patchers = [
+            patch.multiple(index, dynamodb=self.client, DEVICE_STATE_TABLE=TABLE),
+            patch.multiple(liveness, DEVICE_STATE_TABLE=TABLE, ALERT_QUEUE_URL="", NOTIFIER_FUNCTION="notifier"),
+            patch.dict(liveness._clients, {"dynamodb": self.client, "lambda": self.notifier}),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.states = DeviceStateClient(TABLE, client=self.client, ttl=0)
+
+    def check(self, now):
+        with patch.object(liveness.time, "time", return_value=now):
+            return liveness.lambda_handler({}, None)
+
+    def test_overdue_devices_are_alerted_once(self):
+        index.lambda_handler({"Records": [
+            record(f"pump-{n}", 1000 + n, "ACTIVE", n) for n in range(20)
+        ]}, None)
+        overdue_at = 1000 + LIVENESS_TIMEOUT_SECONDS + 10  # pump-0 ... pump-9 are late
+
+        self.assertEqual(self.check(overdue_at)["silent"], 10)
+        self.assertEqual(sorted(a["device_id"] for a in self.notifier.alerts), sorted(f"pump-{n}" for n in range(10)))
+        self.assertEqual({a["status"] for a in self.notifier.alerts}, {"SILENT"})
+        self.assertEqual(self.states.get("pump-0").silent_since, overdue_at)
+
+        self.assertEqual(self.check(overdue_at + 900)["silent"], 10)  # the other ten, not the first ten again
+        self.assertEqual(len(self.notifier.alerts), 20)
+
+    def test_message_re_arms_a_silent_device(self):
+        index.lambda_handler({"Records": [record("pump-1", 1000, "ACTIVE", 1)]}, None)
+        self.check(1000 + LIVENESS_TIMEOUT_SECONDS + 1)
+
+        index.lambda_handler({"Records": [record("pump-1", 200000, "ACTIVE", 2)]}, None)
+        self.assertIsNone(self.states.get("pump-1").silent_since)
+        self.assertEqual(self.check(200000 + LIVENESS_TIMEOUT_SECONDS - 1)["silent"], 0)
+        self.assertEqual(self.check(200000 + LIVENESS_TIMEOUT_SECONDS + 1)["silent"], 1)
+
+    def test_alert_not_handed_over_is_retried_next_run(self):
+        index.lambda_handler({"Records": [record("pump-1", 1000, "ACTIVE", 1)]}, None)
+        self.notifier.fail = {"pump-1"}
+        now = 1000 + LIVENESS_TIMEOUT_SECONDS + 1
+
+        self.assertEqual(self.check(now)["released"], 1)
+        self.assertIsNone(self.states.get("pump-1").silent_since)
+
+        self.notifier.fail = set()
+        self.assertEqual(self.check(now + 900)["silent"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import logging
+from collections import namedtuple
+from datetime import datetime, timezone
+from payload_codec import decode_event
+
+# Batched ingestion: the alert rules feed an SQS queue and the notifier gets up
+# to a whole batch of alerts per invocation. Alerts are coalesced per device so
+# each channel receives one digest per batch instead of one message per event.
+
+logger = logging.getLogger()
+
+Alert = namedtuple("Alert", ["message_id", "device_id", "status", "timestamp"])
+DeviceAlerts = namedtuple("DeviceAlerts", ["device_id", "status", "count", "first", "last"])
+
+
+def is_sqs_event(event: dict) -> bool:
+    records = event.get("Records")
+    return bool(records) and records[0].get("eventSource") == "aws:sqs"
+
+
+def format_alert(status: str, device_id: str) -> str:
+    if status == 'INACTIVE':
+        return f" <b>ALERT</b> \nThe boiler is inactive!\nDevice: <code>{device_id}</code>"
+    if status == 'SILENT':
+        return f" <b>ALERT</b> \nNo heartbeat from the monitor, it may be offline!\nDevice: <code>{device_id}</code>"
+    return f"Status info: {status} (Device: {device_id})"
+
+
+def parse_records(records: list) -> tuple:
+    """Returns the decoded alerts and the message ids of records that could not be decoded"""
+    alerts, malformed = [], []
+    for record in records:
+        try:
+            payload = decode_event(json.loads(record["body"]))
+            alerts.append(Alert(
+                record["messageId"],
+                payload.get("device_id", "n/a"),
+                payload.get("status", "UNKNOWN"),
+                payload.get("timestamp"),
+            ))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Malformed alert record {record.get('messageId')}: {e}")
+            malformed.append(record.get("messageId"))
+    return alerts, malformed
+
+
+def coalesce(alerts: list) -> list:
+    """One entry per device, in order of first appearance; status is the latest one"""
+    devices = {}
+    for alert in alerts:
+        seen = devices.get(alert.device_id)
+        if seen is None:
+            devices[alert.device_id] = DeviceAlerts(alert.device_id, alert.status, 1, alert.timestamp, alert.timestamp)
+            continue
+        timestamps = [t for t in (seen.first, seen.last, alert.timestamp) if t is not None]
+        latest = alert.timestamp is None or seen.last is None or alert.timestamp >= seen.last
+        devices[alert.device_id] = seen._replace(
+            status=alert.status if latest else seen.status,
+            count=seen.count + 1,
+            first=min(timestamps, default=None),
+            last=max(timestamps, default=None),
+        )
+    return list(devices.values())
+
+
+def _clock(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%H:%M:%S") if timestamp else "?"
+
+
+def format_digest(groups: list) -> str:
+    if len(groups) == 1 and groups[0].count == 1:
+        return format_alert(groups[0].status, groups[0].device_id)
+
+    total = sum(group.count for group in groups)
+    lines = [f" <b>ALERT</b> \n{total} events from {len(groups)} boiler(s):"]
+    for group in groups:
+        window = _clock(group.last) if group.first == group.last else f"{_clock(group.first)}–{_clock(group.last)}"
+        lines.append(f"• <code>{group.device_id}</code>: {group.status} ×{group.count} ({window} UTC)")
+    return "\n".join(lines)
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+
+# Remembers the last status notified for every device, so only state
+# transitions reach humans: a repeated INACTIVE (a replay, a reboot, a
+# re-sent status) is dropped until a recovery or another status came in
+# between. Also keeps every channel below its provider's rate limit.
+
+logger = logging.getLogger()
+
+# A device's last status is forgotten after this long without a transition,
+# so a device stuck INACTIVE for a month is reported again
+STATE_TTL_SECONDS = int(os.environ.get('ALERT_STATE_TTL_SECONDS', str(30 * 86400)))
+
+# (messages per second, burst) per channel. Telegram allows about one message
+# per second to the same chat; Discord webhooks 5 requests per 2 seconds.
+CHANNEL_RATE_LIMITS = {
+    "telegram": (1.0, 3),
+    "discord": (2.5, 5),
+}
+DEFAULT_RATE_LIMIT = (1.0, 3)
+
+
+class InMemoryAlertStore:
+    """Last notified status per device, for one warm container"""
+
+    def __init__(self):
+        self._statuses = {}
+        self._lock = threading.Lock()
+
+    def claim(self, device_id: str, status: str) -> bool:
+        """True if `status` is a transition from the device's last status; records it"""
+        with self._lock:
+            if self._statuses.get(device_id) == status:
+                return False
+            self._statuses[device_id] = status
+            return True
+
+    def release(self, device_id: str, status: str) -> None:
+        """Forgets a transition whose alert could not be delivered, so a retry is not suppressed"""
+        with self._lock:
+            if self._statuses.get(device_id) == status:
+                del self._statuses[device_id]
+
+
+class DynamoAlertStore:
+    """
+    Last notified status per device, shared by all containers: a claim is a
+    conditional put that only succeeds if the stored status is a different
+    one. Items expire through the table's TTL.
+    """
+
+    def __init__(self, table_name, ttl=STATE_TTL_SECONDS, clock=time.time, client=None):
+        self.table_name = table_name
+        self.ttl = ttl
+        self.clock = clock
+        self._client = client
+
+    @property
+    def client(self):
+        # Created on first use: importing boto3 is the bulk of the notifier's cold start
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('dynamodb')
+        return self._client
+
+    def claim(self, device_id: str, status: str) -> bool:
+        now = int(self.clock())
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    "alert_key": {"S": device_id},
+                    "last_status": {"S": status},
+                    "changed_at": {"N": str(now)},
+                    "ttl": {"N": str(now + self.ttl)},
+                },
+                ConditionExpression="attribute_not_exists(alert_key) OR last_status <> :status",
+                ExpressionAttributeValues={":status": {"S": status}},
+            )
+            return True
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+        except Exception as e:
+            # Fail open: a duplicate alert is better than a missed one
+            logger.error(f"Alert state unavailable ({e}), not suppressing {status} of {device_id}")
+            return True
+
+    def release(self, device_id: str, status: str) -> None:
+        try:
+            self.client.delete_item(
+                TableName=self.table_name,
+                Key={"alert_key": {"S": device_id}},
+                ConditionExpression="last_status = :status",
+                ExpressionAttributeValues={":status": {"S": status}},
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            pass  # a newer transition was recorded meanwhile
+        except Exception as e:
+            logger.error(f"Failed to release {status} of {device_id}: {e}")
+
+
+def build_alert_store():
+    """DynamoDB-backed if ALERT_STATE_TABLE is set, otherwise per container"""
+    table_name = os.environ.get('ALERT_STATE_TABLE')
+    if table_name:
+        return DynamoAlertStore(table_name)
+    return InMemoryAlertStore()
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.blocked_until = 0.0
+
+    def try_acquire(self) -> bool:
+        now = self.clock()
+        if now < self.blocked_until:
+            return False
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def block(self, seconds) -> None:
+        """Honours a provider's retry_after: no tokens until it has passed"""
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+        self.tokens = 0
+
+
+class RateLimiter:
+    """One token bucket per channel name"""
+
+    def __init__(self, limits=None, clock=time.monotonic):
+        self.limits = CHANNEL_RATE_LIMITS if limits is None else limits
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, name):
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            rate, capacity = self.limits.get(name, DEFAULT_RATE_LIMIT)
+            bucket = self._buckets[name] = TokenBucket(rate, capacity, self.clock)
+        return bucket
+
+    def try_acquire(self, name: str) -> bool:
+        with self._lock:
+            return self._bucket(name).try_acquire()
+
+    def block(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._bucket(name).block(seconds)
@@ -0,0 +1,64 @@
+"""
+Measures the notifier's cold start in fresh interpreters, like a new Lambda
+container: importing index.py, then serving the first alert with SSM and the
+HTTP layer stubbed out (so the channel modules, TLS and boto3 are loaded on
+that first call, not at import).
+
+Usage: python lambda_functions/notifier/benchmarks/bench_cold_start.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import textwrap
+
+NOTIFIER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = textwrap.dedent("""
+    import json, time
+
+    started = time.perf_counter()
+    import index
+    import_ms = (time.perf_counter() - started) * 1000
+
+    from unittest.mock import MagicMock
+    from channels import http
+    from channels.http import HttpResponse
+    http.default_client.post_json = MagicMock(return_value=HttpResponse(200, b"{}", {}))
+
+    ssm = MagicMock()
+    ssm.get_parameters.side_effect = lambda Names, WithDecryption: {
+        "Parameters": [{"Name": n, "Value": "https://stub"} for n in Names], "InvalidParameters": []}
+    index.ssm = ssm
+
+    started = time.perf_counter()
+    index.lambda_handler({"status": "INACTIVE", "device_id": "cold-start"}, None)
+    first_invocation_ms = (time.perf_counter() - started) * 1000
+
+    print(json.dumps({"import index": import_ms, "first invocation": first_invocation_ms}))
+""")
+
+
+def measure(runs):
+    env = dict(os.environ, SSM_KEY_TOKEN="/t", SSM_KEY_CHAT_ID="/c", SSM_KEY_DISCORD_WEBHOOK="/d",
+               AWS_DEFAULT_REGION=os.environ.get("AWS_DEFAULT_REGION", "eu-west-2"))
+    env.pop("ALERT_STATE_TABLE", None)
+    samples = {}
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=NOTIFIER_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        for step, ms in json.loads(output.strip().splitlines()[-1]).items():
+            samples.setdefault(step, []).append(ms)
+    return samples
+
+
+def run(runs):
+    print(f"{'step':<20} {'median ms':>10} {'max ms':>10}")
+    for step, samples in measure(runs).items():
+        print(f"{step:<20} {statistics.median(samples):>10.1f} {max(samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,67 @@
+import logging
+import os
+import time
+from decimal import Decimal
+from payload_codec import decode_event
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Binary status frames are not JSON, so the storage rule cannot select their
+# fields. BinaryStorageRule forwards every frame base64-encoded and this
+# function writes the decoded event to HeatingEventsTable with the attributes
+# STORAGE_RULE_SQL gives a JSON one (infrastructure/stacks/iot_rules.py), so
+# device state, rollups and liveness see binary devices like any other.
+# Deployed from the notifier's code for payload_codec.
+
+EVENTS_TABLE = os.environ.get('EVENTS_TABLE', '')
+TTL_OFFSET_SECONDS = int(os.environ.get('TTL_OFFSET_SECONDS', str(90 * 86400)))
+
+# As EVENT_KEY in iot_rules.py: schema version 2 frames are keyed by seconds
+# with six decimals, the milliseconds followed by the sequence number modulo
+# SEQUENCE_SLOTS; version 1 frames by whole seconds
+SEQUENCE_SLOTS = 1000
+
+# Created on first use, like the notifier's clients
+table = None
+
+
+def get_table():
+    global table
+    if table is None:
+        import boto3
+        table = boto3.resource('dynamodb').Table(EVENTS_TABLE)
+    return table
+
+
+def event_key(event):
+    if "seq" not in event:
+        return event["timestamp"]
+    return Decimal(event["timestamp_ms"] * SEQUENCE_SLOTS + event["seq"] % SEQUENCE_SLOTS) / Decimal(1000000)
+
+
+def to_item(event, now):
+    """The events table item of a decoded frame, expiring TTL_OFFSET_SECONDS after `now`"""
+    item = {
+        "device_id": event["device_id"],
+        "timestamp": event_key(event),
+        "status": event["status"],
+        "sensor_voltage": event["sensor_voltage"],
+        "metadata": event["metadata"],
+        "ttl": int(now) + TTL_OFFSET_SECONDS,
+    }
+    if "seq" in event:
+        item["timestamp_ms"], item["seq"] = event["timestamp_ms"], event["seq"]
+    return item
+
+
+def lambda_handler(event, context):
+    try:
+        decoded = decode_event(event)
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        # A retry cannot fix a malformed frame
+        logger.error(f"Dropping undecodable frame {event!r}: {e}")
+        return {"stored": False}
+
+    get_table().put_item(Item=to_item(decoded, time.time()))
+    return {"stored": True}
@@ -0,0 +1,29 @@
+import importlib
+from collections import namedtuple
+
+# Channel plugins: name -> where the class lives and which secrets it is built
+# from. Modules are imported on first use, so an invocation only pays for the
+# channels that are actually configured.
+ChannelSpec = namedtuple("ChannelSpec", ["name", "target", "secrets", "validate"])
+
+CHANNELS = {}
+
+
+def register_channel(name, target, secrets, validate=None):
+    """
+    `target` is "module:ClassName"; `secrets` maps constructor arguments to the
+    environment variables naming their SSM parameters, e.g. {"token": "SSM_KEY_TOKEN"}.
+    """
+    CHANNELS[name] = ChannelSpec(name, target, secrets, validate)
+
+
+def load_channel_class(name):
+    module_name, class_name = CHANNELS[name].target.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+register_channel("telegram", "channels.telegram:TelegramNotifier",
+                 {"token": "SSM_KEY_TOKEN", "chat_id": "SSM_KEY_CHAT_ID"})
+register_channel("discord", "channels.discord:DiscordNotifier",
+                 {"webhook_url": "SSM_KEY_DISCORD_WEBHOOK"},
+                 validate=lambda kwargs: kwargs["webhook_url"].startswith("https"))
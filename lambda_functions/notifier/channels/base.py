@@ -1,6 +1,36 @@
 from abc import ABC, abstractmethod
+from collections import namedtuple
+
+AUTH_FAILURE_CODES = (401, 403)
+RATE_LIMITED_CODE = 429
+SEND_TIMEOUT = 5  # seconds, per HTTP request
+
+
+class ChannelAuthError(Exception):
+    """The service rejected the channel's credentials (HTTP 401/403)"""
+
+
+class ChannelRateLimited(Exception):
+    """The service throttled the channel (HTTP 429); don't send again for `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SendResult(namedtuple("SendResult", ["ok", "timing"], defaults=[None])):
+    """
+    Outcome of one send, truthy if the message was delivered. `timing` is the
+    HTTP request's timing (see http.py), None if no response was received.
+    Returned rather than kept on the channel, which is shared between threads.
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return bool(self.ok)
+
 
 class NotificationChannel(ABC):
     @abstractmethod
-    def send(self, message: str) -> bool:
+    def send(self, message: str, timeout: float = SEND_TIMEOUT) -> SendResult:
         pass
\ No newline at end of file
@@ -1,39 +1,46 @@
-import json
+from http.client import HTTPException
 import logging
-import urllib.request
-import urllib.error
-from .base import NotificationChannel
+from .base import (
+    NotificationChannel, ChannelAuthError, ChannelRateLimited, AUTH_FAILURE_CODES, RATE_LIMITED_CODE, SEND_TIMEOUT,
+    SendResult,
+)
+from .http import default_client, retry_after
 
 logger = logging.getLogger()
 
 class DiscordNotifier(NotificationChannel):
-    def __init__(self, webhook_url: str):
+    def __init__(self, webhook_url: str, http=None):
         self.webhook_url = webhook_url
+        self.http = http or default_client
 
-    def send(self, message: str) -> bool:
+    def send(self, message: str, timeout: float = SEND_TIMEOUT) -> SendResult:
         if not self.webhook_url:
             logger.warning("Discord Webhook URL missing.")
-            return False
+            return SendResult(False)
 
         payload = {
             "content": message,
             "username": "Boiler Monitor"
         }
 
-        data = json.dumps(payload).encode('utf-8')
         headers = {
-            'Content-Type': 'application/json',
             'User-Agent': 'Mozilla/5.0' 
         }
-        
-        req = urllib.request.Request(self.webhook_url, data=data, headers=headers)
 
         try:
-            with urllib.request.urlopen(req, timeout=5) as response:
-                if 200 <= response.getcode() < 300:
-                    logger.info("Discord message sent successfully.")
-                    return True
-        except urllib.error.URLError as e:
+            response = self.http.post_json(self.webhook_url, payload, timeout, headers=headers)
+        except (OSError, HTTPException) as e:
             logger.error(f"Discord error: {e}")
-            
-        return False
\ No newline at end of file
+            return SendResult(False)
+
+        if response.status in AUTH_FAILURE_CODES:
+            raise ChannelAuthError(f"Discord rejected the credentials: HTTP {response.status}")
+        if response.status == RATE_LIMITED_CODE:
+            wait = retry_after(response)
+            raise ChannelRateLimited(f"Discord rate limit hit, retry after {wait}s", wait)
+        if 200 <= response.status < 300:
+            logger.info("Discord message sent successfully.")
+            return SendResult(True, response.timing)
+
+        logger.error(f"Discord error: HTTP {response.status} {response.body[:200]!r}")
+        return SendResult(False, response.timing)
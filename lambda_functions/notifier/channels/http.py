@@ -0,0 +1,133 @@
+import http.client
+import json
+import ssl
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+HttpResponse = namedtuple("HttpResponse", ["status", "body", "timing", "headers"], defaults=[None])
+
+MAX_IDLE_PER_HOST = 4
+DEFAULT_RETRY_AFTER = 5
+
+# A pooled connection the server has already closed fails like this on reuse
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class HttpClient:
+    """
+    Keep-alive connections per host, shared by every channel in the container.
+
+    Connections go back to the pool after each request, so repeated alerts to
+    the same API skip DNS, TCP and TLS set-up. A pooled connection the server
+    has closed in the meantime is replaced once, transparently. Each response
+    carries its timing: `handshake_ms` is 0 when a connection was reused.
+    """
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST):
+        self.max_idle_per_host = max_idle_per_host
+        self._ssl_context = None  # loading the CA bundle is deferred to the first HTTPS connection
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def post_json(self, url, payload, timeout, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        return self.request("POST", url, body, timeout, {"Content-Type": "application/json", **(headers or {})})
+
+    def request(self, method, url, body, timeout, headers):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        connection, reused = self._checkout(key, timeout)
+        try:
+            return self._send(key, connection, reused, method, path, body, timeout, headers)
+        except STALE_CONNECTION_ERRORS:
+            if not reused:
+                raise
+            connection, reused = self._new_connection(key, timeout), False
+            return self._send(key, connection, reused, method, path, body, timeout, headers)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _send(self, key, connection, reused, method, path, body, timeout, headers):
+        started = time.monotonic()
+        handshake_ms = 0.0
+        try:
+            if connection.sock is None:
+                connection.connect()
+                handshake_ms = (time.monotonic() - started) * 1000
+            else:
+                connection.sock.settimeout(timeout)
+            request_started = time.monotonic()
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._checkin(key, connection)
+
+        timing = {
+            "handshake_ms": round(handshake_ms, 1),
+            "request_ms": round((time.monotonic() - request_started) * 1000, 1),
+            "reused": reused,
+        }
+        return HttpResponse(response.status, data, timing, dict(response.getheaders()))
+
+    def _checkout(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._new_connection(key, timeout), False
+
+    def _checkin(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _context(self):
+        # Channels connect from several worker threads: load the CA bundle once
+        with self._lock:
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            return self._ssl_context
+
+    def _new_connection(self, key, timeout):
+        scheme, netloc = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=timeout, context=self._context())
+        return http.client.HTTPConnection(netloc, timeout=timeout)
+
+
+def retry_after(response, default=DEFAULT_RETRY_AFTER):
+    """
+    Seconds to wait after a 429: Telegram sends parameters.retry_after, Discord
+    a top-level retry_after (seconds, float); both may set a Retry-After header.
+    """
+    try:
+        body = json.loads(response.body or b"{}")
+        value = body.get("retry_after", body.get("parameters", {}).get("retry_after"))
+        if value is None:
+            value = (response.headers or {}).get("Retry-After")
+        return float(value) if value is not None else default
+    except (ValueError, TypeError, AttributeError):
+        return default
+
+
+# Created once per Lambda container and reused across warm invocations
+default_client = HttpClient()
@@ -1,20 +1,23 @@
-import json
+from http.client import HTTPException
 import logging
-import urllib.request
-import urllib.error
-from .base import NotificationChannel
+from .base import (
+    NotificationChannel, ChannelAuthError, ChannelRateLimited, AUTH_FAILURE_CODES, RATE_LIMITED_CODE, SEND_TIMEOUT,
+    SendResult,
+)
+from .http import default_client, retry_after
 
 logger = logging.getLogger()
 
 class TelegramNotifier(NotificationChannel):
-    def __init__(self, token: str, chat_id: str):
+    def __init__(self, token: str, chat_id: str, http=None):
         self.token = token
         self.chat_id = chat_id
+        self.http = http or default_client
 
-    def send(self, message: str) -> bool:
+    def send(self, message: str, timeout: float = SEND_TIMEOUT) -> SendResult:
         if not self.token or not self.chat_id:
             logger.warning("Telegram config missing (token or chat_id).")
-            return False
+            return SendResult(False)
 
         url = f"https://api.telegram.org/bot{self.token}/sendMessage"
         payload = {
@@ -22,16 +25,21 @@ class TelegramNotifier(NotificationChannel):
             "text": message,
             "parse_mode": "Markdown"
         }
-        
-        data = json.dumps(payload).encode('utf-8')
-        req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
 
         try:
-            with urllib.request.urlopen(req, timeout=5) as response:
-                if response.getcode() == 200:
-                    logger.info("Telegram message sent successfully.")
-                    return True
-        except urllib.error.URLError as e:
+            response = self.http.post_json(url, payload, timeout)
+        except (OSError, HTTPException) as e:
             logger.error(f"Telegram error: {e}")
-        
-        return False
\ No newline at end of file
+            return SendResult(False)
+
+        if response.status in AUTH_FAILURE_CODES:
+            raise ChannelAuthError(f"Telegram rejected the credentials: HTTP {response.status}")
+        if response.status == RATE_LIMITED_CODE:
+            wait = retry_after(response)
+            raise ChannelRateLimited(f"Telegram rate limit hit, retry after {wait}s", wait)
+        if response.status == 200:
+            logger.info("Telegram message sent successfully.")
+            return SendResult(True, response.timing)
+
+        logger.error(f"Telegram error: HTTP {response.status} {response.body[:200]!r}")
+        return SendResult(False, response.timing)
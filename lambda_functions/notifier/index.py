@@ -1,78 +1,347 @@
 import json
 import logging
 import os
-import boto3
-from channels.telegram import TelegramNotifier
-from channels.discord import DiscordNotifier
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from payload_codec import decode_event
+from alert_digest import is_sqs_event, format_alert, parse_records, coalesce, format_digest
+from alert_state import build_alert_store, RateLimiter
+from retry_queue import RetryQueue, retry_job
+from channels import CHANNELS, load_channel_class
+from channels.base import ChannelAuthError, ChannelRateLimited, SEND_TIMEOUT
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-ssm = boto3.client('ssm')
+# Created on first use: importing boto3 is the bulk of the cold start
+ssm = None
 
-def get_secret(env_var_key):
-    path = os.environ.get(env_var_key)
-    if not path:
+SECRET_ENV_KEYS = tuple(key for spec in CHANNELS.values() for key in spec.secrets.values())
+SECRET_CACHE_TTL = int(os.environ.get('SECRET_CACHE_TTL_SECONDS', '300'))
+SSM_BATCH_SIZE = 10  # get_parameters limit
+
+# Stop waiting for channels this long before Lambda would kill the invocation
+DEADLINE_MARGIN_MS = 500
+MIN_SEND_TIMEOUT = 0.5
+
+# Routed here only so the alert state sees a device recover (see iot_rules.py);
+# recorded as the device's status, never sent
+RECOVERY_STATUSES = ("ACTIVE",)
+# Already alerted once per silence by the liveness check (device_state/liveness.py);
+# a device back from one may only send heartbeats, which never reach the notifier
+UNTRACKED_STATUSES = ("SILENT",)
+
+# Created once per container; every channel is sent to on its own worker
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="notify")
+
+alert_store = build_alert_store()
+rate_limiter = RateLimiter()
+retry_queue = RetryQueue.from_env()
+
+class DeliveryFailed(Exception):
+    """No channel got the alert and no retry could be scheduled: fail the invocation so Lambda retries it"""
+
+def get_ssm():
+    global ssm
+    if ssm is None:
+        import boto3
+        ssm = boto3.client('ssm')
+    return ssm
+
+class SecretCache:
+    """
+    Secrets shared by warm invocations of the same container.
+
+    All configured parameters are fetched in one get_parameters call and
+    kept for `ttl` seconds. If a refresh fails, the previous values are
+    served rather than dropping every channel during an SSM hiccup.
+    """
+
+    def __init__(self, env_keys, ttl):
+        self.env_keys = env_keys
+        self.ttl = ttl
+        self.values = None
+        self.fetched_at = 0.0
+
+    def get_all(self, force_refresh=False):
+        if force_refresh or self.values is None or time.monotonic() - self.fetched_at >= self.ttl:
+            self.refresh()
+        return self.values or {}
+
+    def refresh(self):
+        paths = {key: os.environ.get(key) for key in self.env_keys if os.environ.get(key)}
+        names = sorted(set(paths.values()))
+        try:
+            found = {}
+            for start in range(0, len(names), SSM_BATCH_SIZE):
+                response = get_ssm().get_parameters(Names=names[start:start + SSM_BATCH_SIZE], WithDecryption=True)
+                found.update({p['Name']: p['Value'] for p in response.get('Parameters', [])})
+                for name in response.get('InvalidParameters', []):
+                    logger.error(f"SSM parameter not found: {name}")
+        except Exception as e:
+            logger.error(f"Failed to fetch secrets from SSM ({', '.join(names)}): {e}")
+            return
+
+        self.values = {key: found.get(path) for key, path in paths.items()}
+        self.fetched_at = time.monotonic()
+
+    def clear(self):
+        self.values = None
+        self.fetched_at = 0.0
+
+secrets = SecretCache(SECRET_ENV_KEYS, SECRET_CACHE_TTL)
+# name -> (secrets the instance was built from, instance); rebuilt only when those change
+_channels = {}
+
+def clear_secret_cache():
+    secrets.clear()
+    _channels.clear()
+
+def claim_transition(device_id, status):
+    return status in UNTRACKED_STATUSES or alert_store.claim(device_id, status)
+
+def release_transition(device_id, status):
+    if status not in UNTRACKED_STATUSES:
+        alert_store.release(device_id, status)
+
+def reset_alert_state():
+    global alert_store, rate_limiter
+    alert_store = build_alert_store()
+    rate_limiter = RateLimiter()
+
+def get_secret(env_var_key, force_refresh=False):
+    return secrets.get_all(force_refresh).get(env_var_key)
+
+def _cached_channel(name, kwargs):
+    key = tuple(sorted(kwargs.items()))
+    cached = _channels.get(name)
+    if cached is None or cached[0] != key:
+        cached = _channels[name] = (key, load_channel_class(name)(**kwargs))
+    return cached[1]
+
+def get_channel_map(force_refresh=False):
+    """Instances of every registered channel whose secrets are configured"""
+    values = secrets.get_all(force_refresh)
+    channels = {}
+    for spec in CHANNELS.values():
+        kwargs = {arg: values.get(env_key) for arg, env_key in spec.secrets.items()}
+        if not all(kwargs.values()) or (spec.validate and not spec.validate(kwargs)):
+            logger.warning(f"{spec.name} secrets missing or invalid in SSM.")
+            continue
+        channels[spec.name] = _cached_channel(spec.name, kwargs)
+    return channels
+
+def get_active_channels(force_refresh=False):
+    return list(get_channel_map(force_refresh).values())
+
+def invocation_deadline(context):
+    """Monotonic time by which all sends must finish, or None outside Lambda"""
+    if context is None:
         return None
-        
+    remaining_ms = context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS
+    return time.monotonic() + max(0, remaining_ms) / 1000
+
+def _timed_send(name, channel, message, timeout):
+    started = time.monotonic()
+    timing = None
     try:
-        response = ssm.get_parameter(Name=path, WithDecryption=True)
-        return response['Parameter']['Value']
+        sent = channel.send(message, timeout=timeout)
+        outcome = "sent" if sent else "failed"
+        # Connection reuse and handshake time, for channels that talk HTTP
+        timing = getattr(sent, "timing", None)
+    except ChannelAuthError as e:
+        logger.warning(f"{type(channel).__name__}: {e}")
+        outcome = "rejected"
+    except ChannelRateLimited as e:
+        logger.warning(f"{type(channel).__name__}: {e}")
+        rate_limiter.block(name, e.retry_after)
+        outcome = "rate_limited"
     except Exception as e:
-        logger.error(f"Failed to fetch secret for {env_var_key} (path: {path}): {e}")
+        logger.error(f"ERROR sending to {type(channel).__name__}: {e}")
+        outcome = "error"
+    result = {"outcome": outcome, "ms": round((time.monotonic() - started) * 1000, 1)}
+    if isinstance(timing, dict):
+        result.update(timing)
+    return result
+
+def send_to_channels(channels, message, deadline=None):
+    """
+    Sends to all channels concurrently, so the invocation takes as long as the
+    slowest channel rather than the sum. Returns {name: {"outcome", "ms", ...}};
+    channels still running at the deadline are reported as "timeout", and
+    channels over their rate limit are skipped as "rate_limited".
+    """
+    timeout = SEND_TIMEOUT
+    if deadline is not None:
+        timeout = max(MIN_SEND_TIMEOUT, min(SEND_TIMEOUT, deadline - time.monotonic()))
+
+    started = time.monotonic()
+    results = {}
+    futures = {}
+    for name, channel in channels.items():
+        if rate_limiter.try_acquire(name):
+            futures[name] = _executor.submit(_timed_send, name, channel, message, timeout)
+        else:
+            logger.warning(f"{name} is over its rate limit, not sending")
+            results[name] = {"outcome": "rate_limited", "ms": 0.0}
+    wait(futures.values(), timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+
+    for name, future in futures.items():
+        if future.done():
+            results[name] = future.result()
+        else:
+            future.cancel()
+            results[name] = {"outcome": "timeout", "ms": round((time.monotonic() - started) * 1000, 1)}
+            logger.error(f"{name} did not finish before the invocation deadline")
+    return results
+
+def deliver(message, context):
+    """Sends one message to every channel; returns the per-channel results, or None if none are configured"""
+    active_channels = get_channel_map()
+    if not active_channels:
+        logger.error("No notification channels configured!")
         return None
 
-def get_active_channels():
-    channels = []
+    deadline = invocation_deadline(context)
+    results = send_to_channels(active_channels, message, deadline)
 
-    token = get_secret('SSM_KEY_TOKEN')
-    chat_id = get_secret('SSM_KEY_CHAT_ID')
-    discord_url = get_secret('SSM_KEY_DISCORD_WEBHOOK')
+    rejected = [name for name, result in results.items() if result["outcome"] == "rejected"]
+    if rejected:
+        # Credentials were probably rotated: bypass the cache and retry the rejected channels once
+        refreshed = get_channel_map(force_refresh=True)
+        retry = {name: refreshed[name] for name in rejected
+                 if name in refreshed and refreshed[name] is not active_channels[name]}
+        results.update(send_to_channels(retry, message, deadline))
+    return results
 
-    if token and chat_id:
-        channels.append(TelegramNotifier(token=token, chat_id=chat_id))
-    else:
-        logger.warning("Telegram secrets missing from SSM.")
+def was_delivered(results):
+    return results is not None and any(r["outcome"] == "sent" for r in results.values())
 
-    if discord_url and discord_url.startswith("https"):
-        channels.append(DiscordNotifier(webhook_url=discord_url))
-    else:
-        logger.warning("Discord URL missing or invalid in SSM.")
+def schedule_retry(message, results, attempt=0):
+    """
+    Re-enqueues `message` for the channels that did not get it. Returns the
+    names scheduled for a retry, or None if they could not be (no retry queue,
+    or SQS failed); if no channel got it either, the caller must fail so the
+    event is redelivered (by SQS, or by Lambda's async retries and its DLQ).
+    """
+    failed = sorted(name for name, result in results.items() if result["outcome"] != "sent")
+    if not failed:
+        return []
+    if retry_queue is None or not retry_queue.schedule(message, failed, attempt):
+        return None
+    return failed
 
-    return channels
+def handle_retry(record, job, context):
+    """Sends a retry job to its channels only; returns False if the record must be redelivered"""
+    active_channels = get_channel_map()
+    channels = {name: active_channels[name] for name in job.get("channels", []) if name in active_channels}
+    dropped = set(job.get("channels", [])) - set(channels)
+    if dropped:
+        logger.warning(f"Dropping retry for unconfigured channels {sorted(dropped)}")
+    if not channels:
+        return True
+
+    attempt = job.get("attempt", 0) + 1
+    results = send_to_channels(channels, job["message"], invocation_deadline(context))
+    logger.info(f"Retry {attempt} of {record['messageId']}: {json.dumps(results)}")
+    return schedule_retry(job["message"], results, attempt) is not None
+
+def handle_alert_batch(event, context):
+    """
+    SQS ingestion: all alerts of a batch become one digest per channel.
+    Only devices whose latest status is a transition into an alert status are
+    included; recoveries are recorded, not sent. Channels the digest did not
+    reach get it through the retry queue; records are reported as failed (and
+    redelivered by SQS) only if that is not possible and the digest reached
+    no channel at all, or if they could not be decoded.
+    Retry jobs from the retry queue are sent to their own channels.
+    """
+    records, failed = [], []
+    for record in event["Records"]:
+        job = retry_job(record.get("body", ""))
+        if job is None:
+            records.append(record)
+        elif not handle_retry(record, job, context):
+            failed.append(record["messageId"])
+    if not records:
+        return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed]}
+
+    alerts, malformed = parse_records(records)
+    failed += malformed
+
+    groups = coalesce(alerts)
+    changed = [g for g in groups if claim_transition(g.device_id, g.status)]
+    claimed = [g for g in changed if g.status not in RECOVERY_STATUSES]
+    if claimed:
+        alerting = {group.device_id for group in claimed}
+        message = format_digest(coalesce(
+            [alert for alert in alerts if alert.device_id in alerting and alert.status not in RECOVERY_STATUSES]
+        ))
+        results = deliver(message, context)
+        delivered = was_delivered(results)
+        if results is not None and schedule_retry(message, results) is not None:
+            delivered = True
+        if not delivered:
+            for group in claimed:
+                release_transition(group.device_id, group.status)
+            failed += [alert.message_id for alert in alerts if alert.device_id in alerting]
+        logger.info(f"Batch of {len(records)}: {len(alerts)} events from {len(groups)} devices "
+                    f"({len(groups) - len(changed)} unchanged, {len(changed) - len(claimed)} recovered), "
+                    f"delivered={delivered} {json.dumps(results)}")
+    elif groups:
+        logger.info(f"Batch of {len(records)}: no transition into an alert status among {len(groups)} devices")
+
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed]}
 
 def lambda_handler(event, context):
+    if is_sqs_event(event):
+        return handle_alert_batch(event, context)
+
     logger.info(f"Event received: {json.dumps(event)}")
-    
+    event = decode_event(event)
+
     status = event.get('status', 'UNKNOWN')
     device_id = event.get('device_id', 'n/a')
-    
-    if status == 'INACTIVE':
-        message = f" <b>ALERT</b> \nThe boiler is inactive!\nDevice: <code>{device_id}</code>"
-    else:
-        message = f"Status info: {status} (Device: {device_id})"
-
-    active_channels = get_active_channels()
-    
-    if not active_channels:
-        logger.error("No notification channels configured!")
+    message = format_alert(status, device_id)
+
+    if not claim_transition(device_id, status):
+        logger.info(f"Suppressed repeated {status} alert for {device_id}, no state change")
+        return {
+            "statusCode": 200,
+            "body": json.dumps({"message": "Repeated alert suppressed.", "suppressed": True})
+        }
+    if status in RECOVERY_STATUSES:
+        logger.info(f"{device_id} recovered ({status})")
+        return {
+            "statusCode": 200,
+            "body": json.dumps({"message": "Recovery recorded.", "suppressed": True})
+        }
+
+    started = time.monotonic()
+    results = deliver(message, context)
+    if results is None:
+        release_transition(device_id, status)  # let the next occurrence through
         return {
             "statusCode": 500, 
             "body": json.dumps("No notification channels configured")
         }
 
-    success_count = 0
-    for channel in active_channels:
-        try:
-            if channel.send(message):
-                success_count += 1
-        except Exception as e:
-            logger.error(f"ERROR sending to {type(channel).__name__}: {e}")
+    retrying = schedule_retry(message, results)
+    if retrying is None and not was_delivered(results):
+        release_transition(device_id, status)
+        logger.error(f"{status} alert for {device_id} reached no channel: {json.dumps(results)}")
+        raise DeliveryFailed(f"{status} alert for {device_id} reached no channel and could not be re-enqueued")
 
-    result_msg = f"Message sent to {success_count}/{len(active_channels)} channels."
-    logger.info(result_msg)
+    success_count = sum(1 for result in results.values() if result["outcome"] == "sent")
+    result_msg = f"Message sent to {success_count}/{len(results)} channels."
+    logger.info(f"{result_msg} {json.dumps(results)}")
 
     return {
         "statusCode": 200,
-        "body": json.dumps(result_msg)
-    }
\ No newline at end of file
+        "body": json.dumps({
+            "message": result_msg,
+            "channels": results,
+            "retrying": retrying or [],
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+        })
+    }
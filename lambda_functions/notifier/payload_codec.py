@@ -0,0 +1,50 @@
+import base64
+import struct
+
+# Decoder for the compact binary status frames published by the edge device
+# (see hardware/src/codec.py for the encoder; both must agree on the layout,
+# which tests/test_payload_codec.py checks).
+#
+# B schema version | B status | B real state | B reason | <stamp> | B id length | device_id
+# where <stamp> is I timestamp (version 1) or Q timestamp_ms, I seq (version 2)
+SCHEMA_V1 = 1
+SCHEMA_V2 = 2
+HEADERS = {SCHEMA_V1: struct.Struct(">BBBBI"), SCHEMA_V2: struct.Struct(">BBBBQI")}
+
+STATUS_NAMES = {0: "INACTIVE", 1: "ACTIVE", 2: "HEARTBEAT_OK", 3: "UNKNOWN"}
+REASON_NAMES = {0: "heartbeat", 1: "event_change"}
+
+
+def decode_binary(frame: bytes) -> dict:
+    header = HEADERS.get(frame[0]) if frame else None
+    if header is None:
+        raise ValueError(f"Unsupported binary schema version: {frame[:1].hex() or 'empty'}")
+
+    version, status, real_state, reason, *stamp = header.unpack_from(frame)
+    id_length = frame[header.size]
+    device_id = frame[header.size + 1:header.size + 1 + id_length].decode("utf-8")
+
+    event = {
+        "device_id": device_id,
+        "timestamp": stamp[0] if version == SCHEMA_V1 else stamp[0] // 1000,
+        "status": STATUS_NAMES[status],
+        "real_state": STATUS_NAMES[real_state],
+        "sensor_voltage": 1 if STATUS_NAMES[real_state] == "ACTIVE" else 0,
+        "metadata": {
+            "reason": REASON_NAMES.get(reason, "other"),
+            "version": f"{version}.0"
+        }
+    }
+    if version == SCHEMA_V2:
+        event["timestamp_ms"], event["seq"] = stamp
+    return event
+
+
+def decode_event(event: dict) -> dict:
+    """
+    Normalises a Lambda event to the JSON payload shape.
+    Binary frames arrive from the IoT rule as {"data": "<base64>"}.
+    """
+    if "data" in event and "status" not in event:
+        return decode_binary(base64.b64decode(event["data"]))
+    return event
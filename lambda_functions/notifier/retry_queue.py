@@ -0,0 +1,142 @@
+import argparse
+import json
+import logging
+import os
+import random
+
+# Failed channel deliveries are re-enqueued to a retry queue, for the failed
+# channels only, so a webhook outage neither loses the alert nor re-sends it
+# to the channels that already got it. After RETRY_MAX_ATTEMPTS the job goes
+# to the alert DLQ, from where `python retry_queue.py replay` puts it back.
+
+logger = logging.getLogger()
+
+MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '5'))
+BASE_DELAY = 30
+MAX_DELAY = 900  # SQS DelaySeconds limit
+SQS_BATCH_SIZE = 10
+
+
+def retry_delay(attempt, base=BASE_DELAY, cap=MAX_DELAY):
+    """Exponential backoff with equal jitter, in whole seconds for DelaySeconds"""
+    delay = min(cap, base * 2 ** attempt)
+    return int(delay / 2 + random.uniform(0, delay / 2))
+
+
+def retry_job(body):
+    """The retry job in an SQS message body, or None for a plain alert"""
+    try:
+        job = json.loads(body).get("retry")
+    except (ValueError, AttributeError):
+        return None
+    return job if isinstance(job, dict) else None
+
+
+class RetryQueue:
+    def __init__(self, queue_url, dlq_url=None, max_attempts=MAX_ATTEMPTS, sqs=None):
+        self.queue_url = queue_url
+        self.dlq_url = dlq_url
+        self.max_attempts = max_attempts
+        self._sqs = sqs
+
+    @classmethod
+    def from_env(cls):
+        """None unless RETRY_QUEUE_URL is set"""
+        queue_url = os.environ.get('RETRY_QUEUE_URL')
+        if not queue_url:
+            return None
+        return cls(queue_url, os.environ.get('ALERT_DLQ_URL'))
+
+    @property
+    def sqs(self):
+        # Created on first use, like the notifier's other AWS clients
+        if self._sqs is None:
+            import boto3
+            self._sqs = boto3.client('sqs')
+        return self._sqs
+
+    def schedule(self, message, channels, attempt):
+        """
+        Enqueues `message` for `channels`; `attempt` counts the retries already
+        made. Returns False if the job could not be stored anywhere.
+        """
+        body = json.dumps({"retry": {"message": message, "channels": sorted(channels), "attempt": attempt}})
+        try:
+            if attempt >= self.max_attempts:
+                if not self.dlq_url:
+                    logger.error(f"Giving up on {channels} after {attempt} retries (no DLQ configured)")
+                    return True
+                logger.error(f"Giving up on {channels} after {attempt} retries, moving to DLQ")
+                self.sqs.send_message(QueueUrl=self.dlq_url, MessageBody=body)
+                return True
+
+            delay = retry_delay(attempt)
+            self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=body, DelaySeconds=delay)
+            logger.info(f"Retry {attempt + 1}/{self.max_attempts} for {channels} in {delay}s")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to enqueue retry for {channels}: {e}")
+            return False
+
+
+def receive_dlq(sqs, dlq_url, limit):
+    """Yields up to `limit` DLQ messages; the caller deletes the ones it handled"""
+    received = 0
+    while received < limit:
+        response = sqs.receive_message(
+            QueueUrl=dlq_url,
+            MaxNumberOfMessages=min(SQS_BATCH_SIZE, limit - received),
+            WaitTimeSeconds=1,
+        )
+        messages = response.get('Messages', [])
+        if not messages:
+            return
+        for message in messages:
+            received += 1
+            yield message
+
+
+def replay(sqs, dlq_url, queue_url, limit=100, dry_run=False):
+    """
+    Moves DLQ messages back to the retry queue. Exhausted retry jobs start
+    again at attempt 0; anything else (an alert the notifier failed on) is
+    re-sent as it is. Returns the number of messages replayed.
+    """
+    replayed = 0
+    for message in receive_dlq(sqs, dlq_url, limit):
+        body = message['Body']
+        job = retry_job(body)
+        if job is not None:
+            body = json.dumps({"retry": dict(job, attempt=0)})
+
+        print(f"{'Would replay' if dry_run else 'Replaying'}: {body[:120]}")
+        if dry_run:
+            continue
+        sqs.send_message(QueueUrl=queue_url, MessageBody=body)
+        sqs.delete_message(QueueUrl=dlq_url, ReceiptHandle=message['ReceiptHandle'])
+        replayed += 1
+    return replayed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and replay the heating alert DLQ")
+    parser.add_argument("command", choices=["peek", "replay"])
+    parser.add_argument("--dlq-url", default=os.environ.get('ALERT_DLQ_URL'),
+                        required='ALERT_DLQ_URL' not in os.environ)
+    parser.add_argument("--queue-url", default=os.environ.get('RETRY_QUEUE_URL'))
+    parser.add_argument("--max", type=int, default=100, help="maximum number of messages to handle")
+    args = parser.parse_args(argv)
+
+    import boto3
+    sqs = boto3.client('sqs')
+    if args.command == "peek":
+        # Messages become visible again after the DLQ's visibility timeout
+        replay(sqs, args.dlq_url, args.queue_url, limit=args.max, dry_run=True)
+        return
+    if not args.queue_url:
+        parser.error("--queue-url (or RETRY_QUEUE_URL) is required for replay")
+    print(f"Replayed {replay(sqs, args.dlq_url, args.queue_url, limit=args.max)} messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_state import DynamoAlertStore, InMemoryAlertStore, RateLimiter
+
+
+class FakeClock:
+    def __init__(self, now=1700000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestAlertStores(unittest.TestCase):
+
+    def test_only_transitions_are_claimed(self):
+        store = InMemoryAlertStore()
+
+        self.assertTrue(store.claim("boiler-a", "INACTIVE"))
+        self.assertFalse(store.claim("boiler-a", "INACTIVE"))
+        self.assertTrue(store.claim("boiler-b", "INACTIVE"))
+
+        # Recovered in between: the next INACTIVE is a new transition
+        self.assertTrue(store.claim("boiler-a", "ACTIVE"))
+        self.assertTrue(store.claim("boiler-a", "INACTIVE"))
+
+    def test_released_claim_lets_the_retry_through(self):
+        store = InMemoryAlertStore()
+        store.claim("boiler-a", "INACTIVE")
+        store.release("boiler-a", "INACTIVE")
+
+        self.assertTrue(store.claim("boiler-a", "INACTIVE"))
+
+    def test_dynamo_claim_is_a_conditional_put(self):
+        """
+        Scenario:
+            Another container already recorded INACTIVE for the device.
+
+        Expectation:
+            The conditional put fails and the alert is suppressed; any other
+            DynamoDB error fails open so the alert is still sent.
+        """
+        client = MagicMock()
+        client.exceptions.ConditionalCheckFailedException = type("ConditionalCheckFailed", (Exception,), {})
+        store = DynamoAlertStore("alert-state", ttl=600, clock=FakeClock(), client=client)
+
+        self.assertTrue(store.claim("boiler-a", "INACTIVE"))
+        kwargs = client.put_item.call_args.kwargs
+        self.assertEqual(kwargs["ConditionExpression"], "attribute_not_exists(alert_key) OR last_status <> :status")
+        self.assertEqual(kwargs["Item"]["last_status"], {"S": "INACTIVE"})
+        self.assertEqual(kwargs["Item"]["ttl"], {"N": "1700000600"})
+
+        client.put_item.side_effect = client.exceptions.ConditionalCheckFailedException()
+        self.assertFalse(store.claim("boiler-a", "INACTIVE"))
+
+        client.put_item.side_effect = RuntimeError("throttled")
+        self.assertTrue(store.claim("boiler-a", "INACTIVE"))
+
+        # Released only while no newer status was recorded
+        store.release("boiler-a", "INACTIVE")
+        kwargs = client.delete_item.call_args.kwargs
+        self.assertEqual(kwargs["ConditionExpression"], "last_status = :status")
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_bucket_refills_at_channel_rate(self):
+        clock = FakeClock(0.0)
+        limiter = RateLimiter({"telegram": (1.0, 2)}, clock=clock)
+
+        self.assertEqual([limiter.try_acquire("telegram") for _ in range(3)], [True, True, False])
+        clock.now += 1.0
+        self.assertTrue(limiter.try_acquire("telegram"))
+
+    def test_retry_after_blocks_the_channel(self):
+        clock = FakeClock(0.0)
+        limiter = RateLimiter({"discord": (2.5, 5)}, clock=clock)
+
+        limiter.block("discord", 30)
+        clock.now += 29
+        self.assertFalse(limiter.try_acquire("discord"))
+        clock.now += 2
+        self.assertTrue(limiter.try_acquire("discord"))
+
+
+if __name__ == '__main__':
+    unittest.main()
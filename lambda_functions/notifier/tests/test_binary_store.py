@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import base64
+import os
+import struct
+import sys
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import binary_store
+
+
+def frame_event(status_code, timestamp=1700000000, device_id="boiler-b"):
+    header = struct.pack(">BBBBI", 1, status_code, status_code, 1, timestamp)
+    frame = header + bytes([len(device_id)]) + device_id.encode()
+    return {"data": base64.b64encode(frame).decode()}
+
+
+class TestBinaryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.table = MagicMock()
+        patcher = patch.object(binary_store, "table", self.table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_frame_is_stored_like_a_json_event(self):
+        with patch.object(binary_store.time, "time", return_value=1700000000.9):
+            self.assertEqual(binary_store.lambda_handler(frame_event(0), None), {"stored": True})
+
+        self.table.put_item.assert_called_once_with(Item={
+            "device_id": "boiler-b",
+            "timestamp": 1700000000,
+            "status": "INACTIVE",
+            "sensor_voltage": 0,
+            "metadata": {"reason": "event_change", "version": "1.0"},
+            "ttl": 1700000000 + binary_store.TTL_OFFSET_SECONDS,
+        })
+
+    def test_schema_v2_frames_are_keyed_by_milliseconds_and_sequence(self):
+        """
+        Test: Two version 2 frames within one millisecond get distinct sort
+        keys, the same EVENT_KEY a payload 2.0 JSON event gets.
+        """
+        for seq in (41, 42):
+            header = struct.pack(">BBBBQI", 2, 0, 0, 1, 1700000000123, seq)
+            frame = header + bytes([8]) + b"boiler-b"
+            binary_store.lambda_handler({"data": base64.b64encode(frame).decode()}, None)
+
+        items = [c.kwargs["Item"] for c in self.table.put_item.call_args_list]
+        self.assertEqual([item["timestamp"] for item in items],
+                         [Decimal("1700000000.123041"), Decimal("1700000000.123042")])
+        self.assertEqual((items[0]["timestamp_ms"], items[0]["seq"]), (1700000000123, 41))
+        self.assertEqual(items[0]["metadata"]["version"], "2.0")
+
+    def test_undecodable_frame_is_dropped(self):
+        self.assertEqual(binary_store.lambda_handler({"data": base64.b64encode(b"\x09").decode()}, None),
+                         {"stored": False})
+        self.table.put_item.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
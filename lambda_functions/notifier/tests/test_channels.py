@@ -0,0 +1,136 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channels.base import ChannelAuthError, ChannelRateLimited
+from channels.discord import DiscordNotifier
+from channels.http import HttpClient, HttpResponse
+from channels.telegram import TelegramNotifier
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 keep-alive endpoint that counts the TCP connections it accepts"""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    timeout = None
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def start_server(self, idle_timeout=None):
+        handler = type("Handler", (WebhookHandler,), {"connections": 0, "timeout": idle_timeout})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return handler, f"http://127.0.0.1:{server.server_address[1]}/webhook"
+
+    def test_connection_is_reused_across_requests(self):
+        """
+        Scenario:
+            Two alerts are sent to the same host from one warm container.
+
+        Expectation:
+            The second request reuses the pooled connection and reports no handshake time.
+        """
+        handler, url = self.start_server()
+        client = HttpClient()
+        self.addCleanup(client.close)
+
+        first = client.post_json(url, {"content": "a"}, timeout=2)
+        second = client.post_json(url, {"content": "b"}, timeout=2)
+
+        self.assertEqual((first.status, second.status), (204, 204))
+        self.assertFalse(first.timing["reused"])
+        self.assertTrue(second.timing["reused"])
+        self.assertEqual(second.timing["handshake_ms"], 0)
+        self.assertEqual(handler.connections, 1)
+
+    def test_stale_pooled_connection_is_replaced(self):
+        """
+        Scenario:
+            The server closed the idle keep-alive connection between two alerts.
+
+        Expectation:
+            The request is retried once on a fresh connection instead of failing.
+        """
+        handler, url = self.start_server(idle_timeout=0.1)
+        client = HttpClient()
+        self.addCleanup(client.close)
+
+        client.post_json(url, {"content": "a"}, timeout=2)
+        time.sleep(0.3)
+        response = client.post_json(url, {"content": "b"}, timeout=2)
+
+        self.assertEqual(response.status, 204)
+        self.assertFalse(response.timing["reused"])
+        self.assertEqual(handler.connections, 2)
+
+
+class TestChannels(unittest.TestCase):
+
+    def fake_client(self, status):
+        client = MagicMock()
+        timing = {"handshake_ms": 0, "request_ms": 12.5, "reused": True}
+        client.post_json.return_value = HttpResponse(status, b"", timing)
+        return client
+
+    def test_telegram_reports_timing_of_successful_send(self):
+        client = self.fake_client(200)
+        notifier = TelegramNotifier(token="123:abc", chat_id="42", http=client)
+
+        result = notifier.send("hello", timeout=3)
+        self.assertTrue(result)
+        url, payload, timeout = client.post_json.call_args[0]
+        self.assertEqual(url, "https://api.telegram.org/bot123:abc/sendMessage")
+        self.assertEqual((payload["chat_id"], timeout), ("42", 3))
+        self.assertTrue(result.timing["reused"])
+
+    def test_rejected_credentials_raise_auth_error(self):
+        notifier = DiscordNotifier(webhook_url="https://discord.example/hook", http=self.fake_client(401))
+
+        with self.assertRaises(ChannelAuthError):
+            notifier.send("hello")
+
+    def test_rate_limit_reports_retry_after(self):
+        client = self.fake_client(429)
+        client.post_json.return_value = client.post_json.return_value._replace(
+            body=b'{"ok": false, "error_code": 429, "parameters": {"retry_after": 17}}')
+        notifier = TelegramNotifier(token="123:abc", chat_id="42", http=client)
+
+        with self.assertRaises(ChannelRateLimited) as raised:
+            notifier.send("hello")
+        self.assertEqual(raised.exception.retry_after, 17)
+
+    def test_network_error_is_reported_as_failure(self):
+        client = MagicMock()
+        client.post_json.side_effect = ConnectionRefusedError("refused")
+        notifier = DiscordNotifier(webhook_url="https://discord.example/hook", http=client)
+
+        result = notifier.send("hello")
+        self.assertFalse(result)
+        self.assertIsNone(result.timing)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+NOTIFIER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter, like a Lambda cold start: import the handler,
+# then serve the first alert with SSM and the HTTP layer stubbed out.
+# Timing it is left to benchmarks/bench_cold_start.py.
+COLD_START_PROBE = textwrap.dedent("""
+    import json, sys
+
+    import index
+    loaded_at_import = sorted(m for m in ("boto3", "botocore", "ssl", "channels.telegram", "channels.discord")
+                              if m in sys.modules)
+
+    from unittest.mock import MagicMock
+    from channels import http
+    from channels.http import HttpResponse
+    http.default_client.post_json = MagicMock(return_value=HttpResponse(200, b"{}", {}))
+
+    ssm = MagicMock()
+    ssm.get_parameters.side_effect = lambda Names, WithDecryption: {
+        "Parameters": [{"Name": n, "Value": "https://stub"} for n in Names], "InvalidParameters": []}
+    index.ssm = ssm
+
+    response = index.lambda_handler({"status": "INACTIVE", "device_id": "cold-start"}, None)
+
+    print(json.dumps({
+        "loaded_at_import": loaded_at_import,
+        "body": json.loads(response["body"]),
+    }))
+""")
+
+
+class TestColdStart(unittest.TestCase):
+
+    def test_import_is_light_and_first_invocation_loads_the_rest(self):
+        """
+        Regression guard:
+            Importing the handler must not pull in boto3, TLS or any channel
+            module; those are loaded when the first alert actually needs them.
+        """
+        env = dict(os.environ, SSM_KEY_TOKEN="/t", SSM_KEY_CHAT_ID="/c", SSM_KEY_DISCORD_WEBHOOK="/d",
+                   AWS_DEFAULT_REGION=os.environ.get("AWS_DEFAULT_REGION", "eu-west-2"))
+        env.pop("ALERT_STATE_TABLE", None)
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_PROBE], cwd=NOTIFIER_DIR, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+
+        self.assertEqual(result["loaded_at_import"], [])
+        self.assertEqual(result["body"]["message"], "Message sent to 2/2 channels.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@ from unittest.mock import patch, MagicMock
 import os
 import sys
 import json
+import threading
+import time
 
 # --- Path injection ---
 # Add the parent directory (notifier/) to the Python path
@@ -13,6 +15,17 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Note: If the 'channels' package is missing in CI/CD environments,
 # this import may fail. We assume the full repo is available.
 import index
+from channels.base import ChannelAuthError, SendResult
+
+
+def fake_get_parameters(values):
+    """get_parameters stand-in: returns the known names, reports the rest as invalid"""
+    def get_parameters(Names, WithDecryption):
+        return {
+            'Parameters': [{'Name': n, 'Value': values[n]} for n in Names if n in values],
+            'InvalidParameters': [n for n in Names if n not in values],
+        }
+    return get_parameters
 
 
 class TestNotifierLambda(unittest.TestCase):
@@ -28,6 +41,8 @@ class TestNotifierLambda(unittest.TestCase):
             "SSM_KEY_DISCORD_WEBHOOK": "/test/discord"
         })
         self.env_patcher.start()
+        index.clear_secret_cache()
+        index.reset_alert_state()
 
     def tearDown(self):
         """
@@ -36,8 +51,8 @@ class TestNotifierLambda(unittest.TestCase):
         self.env_patcher.stop()
 
     @patch('index.ssm')
-    @patch('index.TelegramNotifier')
-    @patch('index.DiscordNotifier')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
     def test_inactive_status_sends_alert_to_both_channels(self, MockDiscord, MockTelegram, mock_ssm):
         """
         Scenario:
@@ -50,10 +65,9 @@ class TestNotifierLambda(unittest.TestCase):
 
         # 1. Configure the SSM mock
         # FIX: Return a value starting with 'https://' so that Discord webhook validation passes.
-        def get_parameter_side_effect(Name, WithDecryption):
-            return {'Parameter': {'Value': 'https://secret_value_123'}}
-
-        mock_ssm.get_parameter.side_effect = get_parameter_side_effect
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
 
         # Both notifier mocks should return True when .send() is called
         MockTelegram.return_value.send.return_value = True
@@ -91,18 +105,332 @@ class TestNotifierLambda(unittest.TestCase):
 
         # SSM behavior:
         # - Telegram parameters succeed
-        # - Discord parameter raises an exception
-        def side_effect(Name, WithDecryption):
-            if "discord" in Name:
-                raise Exception("ParameterNotFound")
-            return {'Parameter': {'Value': 'valid_token'}}
-
-        mock_ssm.get_parameter.side_effect = side_effect
+        # - Discord parameter is not found
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            "/test/token": "valid_token", "/test/chat_id": "valid_token"
+        })
 
         # Test get_active_channels() in isolation (white-box test)
-        with patch('index.TelegramNotifier') as MockTelegram:
+        with patch('channels.telegram.TelegramNotifier') as MockTelegram:
             channels = index.get_active_channels()
 
             # Only Telegram should be active
             self.assertEqual(len(channels), 1)
             self.assertIsInstance(channels[0], MagicMock)  # The mocked Telegram instance
+
+    @patch('index.ssm')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
+    def test_binary_frame_event_is_decoded(self, MockDiscord, MockTelegram, mock_ssm):
+        """
+        Scenario:
+            The binary alert rule forwards a base64-encoded status frame.
+
+        Expectation:
+            The frame is decoded and an alert for the encoded device is sent.
+        """
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
+        MockTelegram.return_value.send.return_value = True
+        MockDiscord.return_value.send.return_value = True
+
+        # INACTIVE state change of heating-pump-pi-01 at 1700000000
+        frame = "AQAAAWVT8QASaGVhdGluZy1wdW1wLXBpLTAx"
+        response = index.lambda_handler({"data": frame}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        message = MockTelegram.return_value.send.call_args[0][0]
+        self.assertIn("inactive", message)
+        self.assertIn("heating-pump-pi-01", message)
+
+    @patch('index.ssm')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
+    def test_secrets_and_channels_are_reused_across_invocations(self, MockDiscord, MockTelegram, mock_ssm):
+        """
+        Scenario:
+            Several alerts arrive in the same warm container.
+
+        Expectation:
+            All secrets are fetched in a single batch call and the notifier
+            instances are built once; the cache is bypassed after the TTL.
+        """
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
+        MockTelegram.return_value.send.return_value = True
+        MockDiscord.return_value.send.return_value = True
+
+        for device in ("test-device-01", "test-device-02"):
+            response = index.lambda_handler({"status": "INACTIVE", "device_id": device}, None)
+            self.assertIn("2/2 channels", response['body'])
+
+        mock_ssm.get_parameters.assert_called_once()
+        self.assertEqual(len(mock_ssm.get_parameters.call_args.kwargs['Names']), 3)
+        MockTelegram.assert_called_once()
+        self.assertEqual(MockTelegram.return_value.send.call_count, 2)
+
+        with patch.object(index.secrets, 'ttl', 0):
+            index.lambda_handler({"status": "INACTIVE", "device_id": "test-device-03"}, None)
+        self.assertEqual(mock_ssm.get_parameters.call_count, 2)
+
+    @patch('index.ssm')
+    @patch('channels.discord.DiscordNotifier')
+    def test_auth_failure_forces_secret_refresh(self, MockDiscord, mock_ssm):
+        """
+        Scenario:
+            The Telegram token was rotated while the old one is still cached.
+
+        Expectation:
+            The 401 bypasses the cache, the notifier is rebuilt with the new
+            token and the alert is retried once on that channel only.
+        """
+        values = {"/test/token": "old-token", "/test/chat_id": "42", "/test/discord": "https://hook"}
+        mock_ssm.get_parameters.side_effect = fake_get_parameters(values)
+        MockDiscord.return_value.send.return_value = True
+
+        def telegram_factory(token, chat_id):
+            notifier = MagicMock(token=token)
+            if token == "old-token":
+                notifier.send.side_effect = ChannelAuthError("HTTP 401")
+            else:
+                notifier.send.return_value = True
+            return notifier
+
+        with patch('channels.telegram.TelegramNotifier', side_effect=telegram_factory) as MockTelegram:
+            index.get_active_channels()
+            values["/test/token"] = "new-token"
+
+            response = index.lambda_handler({"status": "INACTIVE", "device_id": "test-device-01"}, None)
+
+        self.assertIn("2/2 channels", response['body'])
+        self.assertEqual(mock_ssm.get_parameters.call_count, 2)
+        self.assertEqual(MockTelegram.call_args.kwargs['token'], "new-token")
+        MockDiscord.assert_called_once()
+        MockDiscord.return_value.send.assert_called_once()
+
+    @patch('index.ssm')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
+    def test_slow_channel_is_bounded_by_invocation_deadline(self, MockDiscord, MockTelegram, mock_ssm):
+        """
+        Scenario:
+            The Discord webhook hangs while Telegram answers immediately.
+
+        Expectation:
+            Channels are sent to concurrently; the handler returns at the
+            deadline derived from the Lambda context with a per-channel
+            outcome, instead of waiting for the hanging webhook.
+        """
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
+        release = threading.Event()
+        self.addCleanup(release.set)
+        MockTelegram.return_value.send.return_value = SendResult(True, {"handshake_ms": 0, "reused": True})
+        MockDiscord.return_value.send.side_effect = lambda message, timeout: release.wait(timeout)
+
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = index.DEADLINE_MARGIN_MS + 300
+
+        started = time.monotonic()
+        response = index.lambda_handler({"status": "INACTIVE", "device_id": "test-device-01"}, context)
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 1.0)
+        body = json.loads(response['body'])
+        self.assertEqual(body['message'], "Message sent to 1/2 channels.")
+        self.assertEqual(body['channels']['telegram']['outcome'], "sent")
+        self.assertTrue(body['channels']['telegram']['reused'])
+        self.assertEqual(body['channels']['discord']['outcome'], "timeout")
+        self.assertLessEqual(MockDiscord.return_value.send.call_args.kwargs['timeout'], index.SEND_TIMEOUT)
+
+    def sqs_event(self, bodies):
+        return {"Records": [
+            {"messageId": f"msg-{n}", "eventSource": "aws:sqs", "body": body} for n, body in enumerate(bodies)
+        ]}
+
+    @patch('index.ssm')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
+    def test_sqs_batch_is_coalesced_into_one_digest(self, MockDiscord, MockTelegram, mock_ssm):
+        """
+        Scenario:
+            A flapping pump storm delivers a batch of alerts from two devices,
+            plus one record that cannot be decoded.
+
+        Expectation:
+            Each channel receives a single digest listing both devices; only
+            the malformed record is reported back as a batch item failure.
+        """
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
+        MockTelegram.return_value.send.return_value = True
+        MockDiscord.return_value.send.return_value = True
+
+        bodies = [json.dumps({"status": "INACTIVE", "device_id": device, "timestamp": 1700000000 + n})
+                  for n, device in enumerate(["boiler-a", "boiler-b", "boiler-a", "boiler-a"])]
+        bodies.append("not json")
+
+        response = index.lambda_handler(self.sqs_event(bodies), None)
+
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "msg-4"}]})
+        MockTelegram.return_value.send.assert_called_once()
+        MockDiscord.return_value.send.assert_called_once()
+        digest = MockTelegram.return_value.send.call_args[0][0]
+        self.assertIn("4 events from 2 boiler(s)", digest)
+        self.assertIn("<code>boiler-a</code>: INACTIVE ×3", digest)
+
+    @patch('index.ssm')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
+    def test_sqs_batch_is_retried_when_no_channel_delivered(self, MockDiscord, MockTelegram, mock_ssm):
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
+        MockTelegram.return_value.send.return_value = False
+        MockDiscord.return_value.send.side_effect = ConnectionError("down")
+
+        # A binary frame forwarded through the queue is decoded as well
+        bodies = [json.dumps({"data": "AQAAAWVT8QASaGVhdGluZy1wdW1wLXBpLTAx"})]
+        response = index.lambda_handler(self.sqs_event(bodies), None)
+
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "msg-0"}]})
+        self.assertIn("heating-pump-pi-01", MockTelegram.return_value.send.call_args[0][0])
+
+    @patch('index.ssm')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
+    def test_repeated_alert_is_suppressed_and_429_pauses_channel(self, MockDiscord, MockTelegram, mock_ssm):
+        """
+        Scenario:
+            The same device reports INACTIVE twice; then Discord answers 429
+            for an alert from another device.
+
+        Expectation:
+            The repeat reaches no channel. After the 429 Discord is skipped
+            until its retry_after has passed, while Telegram keeps sending.
+        """
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
+        MockTelegram.return_value.send.return_value = True
+        MockDiscord.return_value.send.return_value = True
+
+        index.lambda_handler({"status": "INACTIVE", "device_id": "boiler-a"}, None)
+        response = index.lambda_handler({"status": "INACTIVE", "device_id": "boiler-a"}, None)
+
+        self.assertTrue(json.loads(response['body'])['suppressed'])
+        self.assertEqual(MockTelegram.return_value.send.call_count, 1)
+
+        MockDiscord.return_value.send.side_effect = index.ChannelRateLimited("HTTP 429", 60)
+        index.lambda_handler({"status": "INACTIVE", "device_id": "boiler-b"}, None)
+        response = index.lambda_handler({"status": "INACTIVE", "device_id": "boiler-c"}, None)
+
+        channels = json.loads(response['body'])['channels']
+        self.assertEqual(channels['discord']['outcome'], "rate_limited")
+        self.assertEqual(channels['telegram']['outcome'], "sent")
+        self.assertEqual(MockDiscord.return_value.send.call_count, 2)
+
+    @patch('index.ssm')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
+    def test_only_transitions_reach_humans(self, MockDiscord, MockTelegram, mock_ssm):
+        """
+        Scenario:
+            A device reports INACTIVE, INACTIVE again, recovers (ACTIVE),
+            then goes INACTIVE once more; later a batch repeats INACTIVE.
+
+        Expectation:
+            The first and the last INACTIVE are sent. The repeats and the
+            recovery reach no channel, however much time passed in between.
+        """
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
+        MockTelegram.return_value.send.return_value = True
+        MockDiscord.return_value.send.return_value = True
+
+        for status in ("INACTIVE", "INACTIVE", "ACTIVE", "INACTIVE"):
+            index.lambda_handler({"status": status, "device_id": "boiler-a"}, None)
+        self.assertEqual(MockTelegram.return_value.send.call_count, 2)
+
+        response = index.lambda_handler(self.sqs_event([
+            json.dumps({"status": "INACTIVE", "device_id": "boiler-a"}),
+            json.dumps({"status": "ACTIVE", "device_id": "boiler-b"}),
+        ]), None)
+        self.assertEqual(response, {"batchItemFailures": []})
+        self.assertEqual(MockTelegram.return_value.send.call_count, 2)
+
+        # Every silence is alerted: the liveness check reports each one once
+        for _ in range(2):
+            response = index.lambda_handler({"status": "SILENT", "device_id": "boiler-a"}, None)
+            self.assertNotIn('suppressed', json.loads(response['body']))
+
+    @patch('index.ssm')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
+    def test_failed_channel_alone_is_retried_through_the_queue(self, MockDiscord, MockTelegram, mock_ssm):
+        """
+        Scenario:
+            Discord's webhook is down while Telegram works; later the retry
+            job comes back from the retry queue and Discord has recovered.
+
+        Expectation:
+            Only Discord is re-enqueued, and the retry is sent to Discord
+            alone, so Telegram does not get the alert twice.
+        """
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
+        MockTelegram.return_value.send.return_value = True
+        MockDiscord.return_value.send.return_value = False
+        sqs = MagicMock()
+
+        with patch('index.retry_queue', index.RetryQueue("https://sqs/retry", "https://sqs/dlq", sqs=sqs)):
+            response = index.lambda_handler({"status": "INACTIVE", "device_id": "boiler-r"}, None)
+            self.assertEqual(json.loads(response['body'])['retrying'], ["discord"])
+
+            enqueued = sqs.send_message.call_args.kwargs
+            self.assertEqual(enqueued['QueueUrl'], "https://sqs/retry")
+            job = json.loads(enqueued['MessageBody'])['retry']
+            self.assertEqual((job['channels'], job['attempt']), (["discord"], 0))
+
+            MockDiscord.return_value.send.return_value = True
+            response = index.lambda_handler(self.sqs_event([enqueued['MessageBody']]), None)
+
+        self.assertEqual(response, {"batchItemFailures": []})
+        self.assertEqual(MockTelegram.return_value.send.call_count, 1)
+        self.assertEqual(MockDiscord.return_value.send.call_count, 2)
+        self.assertEqual(sqs.send_message.call_count, 1)
+
+    @patch('index.ssm')
+    @patch('channels.telegram.TelegramNotifier')
+    @patch('channels.discord.DiscordNotifier')
+    def test_alert_reaching_no_channel_nor_the_retry_queue_fails_the_invocation(self, MockDiscord, MockTelegram,
+                                                                                 mock_ssm):
+        """
+        Scenario:
+            Every channel fails and the retry queue cannot be written to.
+
+        Expectation:
+            The handler raises, so Lambda's async retries and its DLQ take
+            over, and the claim is released for that redelivery.
+        """
+        mock_ssm.get_parameters.side_effect = fake_get_parameters({
+            name: 'https://secret_value_123' for name in ("/test/token", "/test/chat_id", "/test/discord")
+        })
+        MockTelegram.return_value.send.return_value = False
+        MockDiscord.return_value.send.side_effect = ConnectionError("down")
+        sqs = MagicMock()
+        sqs.send_message.side_effect = ConnectionError("SQS unavailable")
+
+        with patch('index.retry_queue', index.RetryQueue("https://sqs/retry", "https://sqs/dlq", sqs=sqs)):
+            with self.assertRaises(index.DeliveryFailed):
+                index.lambda_handler({"status": "INACTIVE", "device_id": "boiler-x"}, None)
+
+        MockTelegram.return_value.send.return_value = True
+        response = index.lambda_handler({"status": "INACTIVE", "device_id": "boiler-x"}, None)
+        self.assertNotIn('suppressed', json.loads(response['body']))
@@ -0,0 +1,51 @@
+import unittest
+import base64
+import itertools
+import os
+import sys
+
+NOTIFIER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HARDWARE_SRC = os.path.join(os.path.dirname(os.path.dirname(NOTIFIER_DIR)), "hardware", "src")
+sys.path.append(NOTIFIER_DIR)
+sys.path.append(HARDWARE_SRC)
+
+from codec import STATUS_CODES, REASON_CODES, encode_binary
+from payload_codec import decode_event
+
+
+class TestEdgeCodecAgreement(unittest.TestCase):
+    """
+    DATA CONTRACT TEST:
+    Frames from the edge encoder (hardware/src/codec.py), base64-encoded as the
+    IoT rules forward them, decode to the payload the device meant to send.
+    """
+
+    def event(self, payload):
+        return {"data": base64.b64encode(encode_binary(payload)).decode()}
+
+    def test_every_status_and_reason_in_both_schema_versions(self):
+        stamps = ({"timestamp": 1700000000},
+                  {"timestamp": 1700000000, "timestamp_ms": 1700000000123, "seq": 4294967295})
+        for status, real_state, reason, stamp in itertools.product(STATUS_CODES, STATUS_CODES,
+                                                                  list(REASON_CODES) + ["command"], stamps):
+            payload = dict(stamp, device_id="heating-pump-pi-01", status=status, real_state=real_state,
+                           metadata={"reason": reason})
+            with self.subTest(status=status, real_state=real_state, reason=reason, version=2 if "seq" in stamp else 1):
+                decoded = decode_event(self.event(payload))
+
+                self.assertEqual((decoded["device_id"], decoded["status"], decoded["real_state"]),
+                                 ("heating-pump-pi-01", status, real_state))
+                self.assertEqual(decoded["metadata"]["reason"], reason if reason in REASON_CODES else "other")
+                self.assertEqual(decoded["sensor_voltage"], int(real_state == "ACTIVE"))
+                for key in stamp:
+                    self.assertEqual(decoded[key], stamp[key])
+
+    def test_non_ascii_device_id(self):
+        payload = {"device_id": "chaudière-01", "timestamp": 1700000000, "status": "INACTIVE",
+                   "real_state": "INACTIVE", "metadata": {"reason": "event_change"}}
+
+        self.assertEqual(decode_event(self.event(payload))["device_id"], "chaudière-01")
+
+
+if __name__ == '__main__':
+    unittest.main()
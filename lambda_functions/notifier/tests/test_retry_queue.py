@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retry_queue import RetryQueue, replay, retry_delay, retry_job
+
+
+class TestRetryQueue(unittest.TestCase):
+
+    def test_delay_grows_with_jitter_up_to_the_sqs_limit(self):
+        with patch('retry_queue.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(retry_delay(0), 30)
+            self.assertEqual(retry_delay(2), 120)
+            self.assertEqual(retry_delay(10), 900)
+        with patch('retry_queue.random.uniform', side_effect=lambda low, high: low):
+            self.assertEqual(retry_delay(2), 60)
+
+    def test_job_goes_to_dlq_after_max_attempts(self):
+        sqs = MagicMock()
+        queue = RetryQueue("https://sqs/retry", "https://sqs/dlq", max_attempts=3, sqs=sqs)
+
+        self.assertTrue(queue.schedule("hello", ["discord"], 2))
+        self.assertEqual(sqs.send_message.call_args.kwargs['QueueUrl'], "https://sqs/retry")
+        self.assertIn('DelaySeconds', sqs.send_message.call_args.kwargs)
+
+        self.assertTrue(queue.schedule("hello", ["discord"], 3))
+        self.assertEqual(sqs.send_message.call_args.kwargs['QueueUrl'], "https://sqs/dlq")
+
+        sqs.send_message.side_effect = Exception("throttled")
+        self.assertFalse(queue.schedule("hello", ["discord"], 0))
+
+    def test_replay_resets_attempts_and_deletes_from_dlq(self):
+        sqs = MagicMock()
+        exhausted = json.dumps({"retry": {"message": "hello", "channels": ["discord"], "attempt": 5}})
+        alert = json.dumps({"status": "INACTIVE", "device_id": "boiler-a"})
+        sqs.receive_message.side_effect = [
+            {"Messages": [{"Body": exhausted, "ReceiptHandle": "r1"}, {"Body": alert, "ReceiptHandle": "r2"}]},
+            {"Messages": []},
+        ]
+
+        self.assertEqual(replay(sqs, "https://sqs/dlq", "https://sqs/retry"), 2)
+
+        bodies = [call.kwargs['MessageBody'] for call in sqs.send_message.call_args_list]
+        self.assertEqual(retry_job(bodies[0])['attempt'], 0)
+        self.assertEqual(bodies[1], alert)
+        self.assertIsNone(retry_job(alert))
+        self.assertEqual([c.kwargs['ReceiptHandle'] for c in sqs.delete_message.call_args_list], ["r1", "r2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from rollups import (
+    CURSOR, DAILY, HOURLY, MAX_GAP_SECONDS, Cursor, Event, accumulate, changed_rows, event_state, read_rollups,
+    rebuild, rebuild_range, rewrite_transactions, transaction_items,
+)
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+ROLLUP_TABLE = os.environ.get('ROLLUP_TABLE', '')
+EVENTS_TABLE = os.environ.get('EVENTS_TABLE', '')
+
+# A cursor moved by a concurrent invocation is re-read this many times
+MAX_CURSOR_CONFLICTS = 3
+
+# Created on first use, like the notifier's clients
+dynamodb = None
+
+# Devices of one batch are independent and updated in parallel
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rollup")
+
+
+def get_dynamodb():
+    global dynamodb
+    if dynamodb is None:
+        import boto3
+        dynamodb = boto3.client('dynamodb')
+    return dynamodb
+
+
+def error_code(error):
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def read_cursor(device_id):
+    response = get_dynamodb().get_item(
+        TableName=ROLLUP_TABLE,
+        Key={"device_id": {"S": device_id}, "bucket": {"S": CURSOR}},
+        ConsistentRead=True,
+    )
+    item = response.get("Item")
+    if item is None:
+        return None
+    until = item.get("runtime_until")
+    return Cursor(float(item["last_timestamp"]["N"]), item["last_state"]["S"], float(until["N"]) if until else None)
+
+
+def _raw_event(item):
+    return Event(float(item["timestamp"]["N"]), event_state(item), 0)
+
+
+def read_events(device_id, start, end):
+    """
+    The raw events of [start, end] from the events table, oldest first, and
+    the last one before `start` (or None), which the range continues from.
+    """
+    client = get_dynamodb()
+    names = {"#ts": "timestamp", "#st": "status"}
+    before = client.query(
+        TableName=EVENTS_TABLE,
+        KeyConditionExpression="device_id = :d AND #ts < :start",
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={":d": {"S": device_id}, ":start": {"N": str(start)}},
+        ProjectionExpression="#ts, #st, sensor_voltage",
+        ScanIndexForward=False,
+        Limit=1,
+    ).get("Items", [])
+    kwargs = {
+        "TableName": EVENTS_TABLE,
+        "KeyConditionExpression": "device_id = :d AND #ts BETWEEN :lo AND :hi",
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": {":d": {"S": device_id}, ":lo": {"N": str(start)}, ":hi": {"N": str(end)}},
+        "ProjectionExpression": "#ts, #st, sensor_voltage",
+    }
+    events = []
+    while True:
+        response = client.query(**kwargs)
+        events.extend(_raw_event(item) for item in response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    seed = _raw_event(before[0]) if before else None
+    return (Cursor(seed.timestamp, seed.state) if seed else None), events
+
+
+def parse_records(records):
+    """
+    {device_id: [Event]} from the inserts and overwrites of a stream batch; TTL
+    deletions are ignored. Timestamps are whole seconds (payload 1.0) or carry
+    milliseconds and a sequence number as decimals (2.0, see iot_rules.py).
+    """
+    devices = {}
+    for record in records:
+        if record.get("eventName") not in ("INSERT", "MODIFY"):
+            continue
+        image = record["dynamodb"]["NewImage"]
+        event = Event(float(image["timestamp"]["N"]), event_state(image), int(record["dynamodb"]["SequenceNumber"]))
+        # An overwrite of the same (device, timestamp) item supersedes the earlier image
+        latest = devices.setdefault(image["device_id"]["S"], {})
+        if event.timestamp not in latest or latest[event.timestamp].sequence < event.sequence:
+            latest[event.timestamp] = event
+    return {device_id: sorted(events.values()) for device_id, events in devices.items()}
+
+
+def rebuild_late(device_id, late):
+    """
+    Rebuilds the buckets that events at or before the cursor can change from
+    the raw events, and overwrites those that differ; returns how many did.
+    A replay changes nothing and writes nothing.
+    """
+    conflicts = 0
+    while True:
+        cursor = read_cursor(device_id)
+        start, end = rebuild_range([event.timestamp for event in late], cursor)
+        seed, events = read_events(device_id, start, min(cursor.timestamp, end + MAX_GAP_SECONDS))
+        stored = {
+            row["bucket"]: row
+            for granularity in (HOURLY, DAILY)
+            for row in read_rollups(get_dynamodb(), ROLLUP_TABLE, device_id, granularity, start, end)
+        }
+        rows = changed_rows(rebuild(seed, events, start, end, cursor), stored)
+        try:
+            for items in rewrite_transactions(ROLLUP_TABLE, device_id, cursor, rows):
+                get_dynamodb().transact_write_items(TransactItems=items)
+        except Exception as e:
+            if error_code(e) != "TransactionCanceledException" or conflicts >= MAX_CURSOR_CONFLICTS:
+                raise
+            # New events were applied meanwhile: rebuild against the moved cursor
+            conflicts += 1
+            continue
+        return len(rows)
+
+
+def apply_device(device_id, events):
+    """
+    Applies the events newer than the device's cursor, then rebuilds the
+    buckets of the others (late or replayed); returns (applied, rebuilt buckets)
+    """
+    cursor = read_cursor(device_id)
+    applied = set()
+    conflicts = 0
+    while True:
+        pending = [event for event in events if cursor is None or event.timestamp > cursor.timestamp]
+        if not pending:
+            break
+
+        deltas, new_cursor, consumed = accumulate(cursor, pending)
+        try:
+            get_dynamodb().transact_write_items(
+                TransactItems=transaction_items(ROLLUP_TABLE, device_id, cursor, new_cursor, deltas)
+            )
+        except Exception as e:
+            if error_code(e) != "TransactionCanceledException" or conflicts >= MAX_CURSOR_CONFLICTS:
+                raise
+            # Another invocation (or an earlier attempt of this batch) moved the cursor
+            conflicts += 1
+            cursor = read_cursor(device_id)
+            continue
+
+        applied.update(pending[:consumed])
+        cursor = new_cursor
+
+    late = [event for event in events if event not in applied]
+    return len(applied), rebuild_late(device_id, late) if late else 0
+
+
+def lambda_handler(event, context):
+    devices = parse_records(event.get("Records", []))
+    futures = {device_id: _executor.submit(apply_device, device_id, events) for device_id, events in devices.items()}
+
+    failures = []
+    applied = rebuilt = 0
+    for device_id, future in futures.items():
+        try:
+            device_applied, device_rebuilt = future.result()
+            applied += device_applied
+            rebuilt += device_rebuilt
+        except Exception as e:
+            logger.error(f"Rollup of {device_id} failed: {e}")
+            # The stream is retried from the oldest failed record; replays change nothing
+            failures.append(min(event.sequence for event in devices[device_id]))
+
+    late = sum(len(events) for events in devices.values()) - applied
+    logger.info(f"Applied {applied} events of {len(devices)} devices; "
+                f"{late} late or replayed, {rebuilt} buckets rebuilt from the raw events")
+    return {"batchItemFailures": [{"itemIdentifier": str(sequence)} for sequence in sorted(failures)]}
@@ -0,0 +1,272 @@
+import math
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# Hourly and daily per-device rollups of the raw events, kept in their own
+# table so they outlive the events' 90-day TTL. Every device has a cursor
+# item recording the last event applied; updates are committed together
+# with a conditional write of that cursor, which keeps concurrent invocations
+# from double counting. Events at or before the cursor (replays, and events
+# the edge's outbox delivers after newer ones) instead have the days they can
+# affect rebuilt from the raw events, and the buckets that differ overwritten.
+
+HOUR = 3600
+DAY = 86400
+
+# The edge publishes on state changes plus a daily heartbeat, so an "on"
+# interval can last hours. Only one longer than the heartbeat interval plus
+# grace means the device went silent, and is not counted.
+MAX_GAP_SECONDS = int(os.environ.get('MAX_GAP_SECONDS', str(DAY + HOUR)))
+
+CURSOR = "CURSOR"
+HOURLY = "H"
+DAILY = "D"
+GRANULARITIES = {HOURLY: (HOUR, "%Y-%m-%dT%H"), DAILY: (DAY, "%Y-%m-%d")}
+
+# TransactWriteItems limit; one slot is the cursor
+MAX_TRANSACTION_ITEMS = 100
+
+STATE_ON = "ON"
+STATE_OFF = "OFF"
+STATE_UNKNOWN = "UNKNOWN"
+
+Event = namedtuple("Event", ["timestamp", "state", "sequence"])
+# `runtime_until`: how far the runtime after the last applied event has been
+# added already, when one long interval was split over several transactions
+Cursor = namedtuple("Cursor", ["timestamp", "state", "runtime_until"], defaults=(None,))
+
+
+def event_state(image):
+    """Pump state of a stream NewImage: sensor_voltage is 1 while the pump runs, heartbeats included"""
+    if image.get("status", {}).get("S") == "UNKNOWN" or "sensor_voltage" not in image:
+        return STATE_UNKNOWN
+    return STATE_ON if image["sensor_voltage"].get("N") == "1" else STATE_OFF
+
+
+def bucket_key(granularity, timestamp):
+    size, pattern = GRANULARITIES[granularity]
+    start = timestamp - timestamp % size
+    return f"{granularity}#{datetime.fromtimestamp(start, tz=timezone.utc).strftime(pattern)}"
+
+
+def split_interval(start, end, size):
+    """(bucket start, seconds) pieces of [start, end) at multiples of `size`"""
+    while start < end:
+        boundary = start - start % size + size
+        piece_end = min(end, boundary)
+        yield start, piece_end - start
+        start = piece_end
+
+
+def _event_buckets(timestamp):
+    return [bucket_key(granularity, timestamp) for granularity in GRANULARITIES]
+
+
+def _runtime(start, end):
+    """(bucket, seconds) pieces of an "on" interval in every granularity"""
+    return [
+        (bucket_key(granularity, piece_start), seconds)
+        for granularity, (size, _) in GRANULARITIES.items()
+        for piece_start, seconds in split_interval(start, end, size)
+    ]
+
+
+def accumulate(cursor, events, max_gap=MAX_GAP_SECONDS, max_buckets=MAX_TRANSACTION_ITEMS - 1):
+    """
+    Folds events (sorted, all newer than the cursor) into per-bucket deltas.
+    Stops before an event whose buckets would exceed `max_buckets`, so the
+    result fits one transaction; if the first event alone does not fit, only
+    the runtime up to the end of its first day (or fewer hours) is added and
+    the cursor records how far.
+    Returns (deltas, new cursor, events consumed).
+    """
+    deltas = {}
+    consumed = 0
+    for event in events:
+        runtime = []
+        gap = cursor is None or event.timestamp - cursor.timestamp > max_gap
+        if cursor is not None and cursor.state == STATE_ON and not gap:
+            start = cursor.timestamp if cursor.runtime_until is None else cursor.runtime_until
+            runtime = _runtime(start, event.timestamp)
+
+        buckets = {key for key, _ in runtime} | set(_event_buckets(event.timestamp))
+        if len(buckets | deltas.keys()) > max_buckets:
+            if consumed:
+                break
+            # One hourly bucket per hour plus the day's bucket, never past the day
+            hours = max(1, max_buckets - 2)
+            until = min(start - start % DAY + DAY, start - start % HOUR + hours * HOUR)
+            for key, seconds in _runtime(start, until):
+                deltas.setdefault(key, _empty_delta())["runtime_seconds"] += seconds
+            return deltas, cursor._replace(runtime_until=until), 0
+
+        for key, seconds in runtime:
+            deltas.setdefault(key, _empty_delta())["runtime_seconds"] += seconds
+        starts_cycle = event.state == STATE_ON and (gap or cursor.state != STATE_ON)
+        for key in _event_buckets(event.timestamp):
+            delta = deltas.setdefault(key, _empty_delta())
+            delta["event_count"] += 1
+            delta["cycles"] += 1 if starts_cycle else 0
+            delta["last_state"] = event.state
+            delta["last_timestamp"] = event.timestamp
+
+        cursor = Cursor(event.timestamp, event.state)
+        consumed += 1
+    return deltas, cursor, consumed
+
+
+def _empty_delta():
+    return {"runtime_seconds": 0, "cycles": 0, "event_count": 0, "last_state": None, "last_timestamp": None}
+
+
+def _cursor_condition(previous):
+    """Condition that the cursor item is still `previous` (None: that it does not exist yet)"""
+    if previous is None:
+        return {"ConditionExpression": "attribute_not_exists(device_id)"}
+    if previous.runtime_until is None:
+        return {
+            "ConditionExpression": "last_timestamp = :previous AND attribute_not_exists(runtime_until)",
+            "ExpressionAttributeValues": {":previous": {"N": str(previous.timestamp)}},
+        }
+    return {
+        "ConditionExpression": "last_timestamp = :previous AND runtime_until = :until",
+        "ExpressionAttributeValues": {
+            ":previous": {"N": str(previous.timestamp)}, ":until": {"N": str(previous.runtime_until)},
+        },
+    }
+
+
+def transaction_items(table_name, device_id, previous, cursor, deltas):
+    """The cursor write, conditional on the cursor still being `previous`, plus one ADD update per bucket"""
+    cursor_put = {
+        "TableName": table_name,
+        "Item": {
+            "device_id": {"S": device_id}, "bucket": {"S": CURSOR},
+            "last_timestamp": {"N": str(cursor.timestamp)}, "last_state": {"S": cursor.state},
+        },
+        **_cursor_condition(previous),
+    }
+    if cursor.runtime_until is not None:
+        cursor_put["Item"]["runtime_until"] = {"N": str(cursor.runtime_until)}
+
+    items = [{"Put": cursor_put}]
+    for key, delta in sorted(deltas.items()):
+        expression = "ADD runtime_seconds :runtime, cycles :cycles, event_count :events"
+        values = {
+            ":runtime": {"N": str(round(delta["runtime_seconds"], 6))},
+            ":cycles": {"N": str(delta["cycles"])},
+            ":events": {"N": str(delta["event_count"])},
+        }
+        if delta["last_state"] is not None:
+            expression += " SET last_state = :state, last_timestamp = :timestamp"
+            values[":state"] = {"S": delta["last_state"]}
+            values[":timestamp"] = {"N": str(delta["last_timestamp"])}
+        items.append({"Update": {
+            "TableName": table_name,
+            "Key": {"device_id": {"S": device_id}, "bucket": {"S": key}},
+            "UpdateExpression": expression,
+            "ExpressionAttributeValues": values,
+        }})
+    return items
+
+
+def rebuild_range(timestamps, cursor, max_gap=MAX_GAP_SECONDS):
+    """
+    [start, end) of the whole days whose buckets events at `timestamps`, all
+    at or before the cursor, can change: the intervals they open or close
+    reach at most `max_gap` either side, and never past what has been applied.
+    """
+    applied = cursor.timestamp if cursor.runtime_until is None else cursor.runtime_until
+    start = min(timestamps) - max_gap
+    end = min(max(timestamps) + max_gap, applied)
+    return start - start % DAY, end - end % DAY + DAY
+
+
+def rebuild(seed, events, start, end, cursor, max_gap=MAX_GAP_SECONDS):
+    """
+    The buckets of [start, end) folded again from the raw events, as far as
+    `cursor` has applied them. `seed` is the last event before `start` (or
+    None) and `events` the ones from `start` on, sorted and none past the cursor.
+    """
+    deltas, last, _ = accumulate(seed, events, max_gap, max_buckets=math.inf)
+    if cursor.runtime_until is not None and last is not None and last.state == STATE_ON:
+        for key, seconds in _runtime(last.timestamp, cursor.runtime_until):
+            deltas.setdefault(key, _empty_delta())["runtime_seconds"] += seconds
+    keys = {
+        bucket_key(granularity, bucket)
+        for granularity, (size, _) in GRANULARITIES.items() for bucket in range(int(start), int(end), size)
+    }
+    return {key: delta for key, delta in deltas.items() if key in keys}
+
+
+def changed_rows(rebuilt, stored):
+    """
+    The rebuilt rows that differ from the `stored` ones ({bucket: read_rollups
+    row}); stored buckets no event or runtime falls into any more are zeroed.
+    """
+    def same(row, other):
+        return round(row["runtime_seconds"], 6) == round(other["runtime_seconds"], 6) and all(
+            row[name] == other[name] for name in ("cycles", "event_count", "last_state", "last_timestamp"))
+
+    changed = {}
+    for key in rebuilt.keys() | stored.keys():
+        row = rebuilt.get(key, _empty_delta())
+        if not same(row, stored.get(key, _empty_delta())):
+            changed[key] = row
+    return changed
+
+
+def rewrite_transactions(table_name, device_id, cursor, rows, max_items=MAX_TRANSACTION_ITEMS - 1):
+    """Puts of whole bucket rows, in transactions that each check the cursor is still `cursor`"""
+    check = {"ConditionCheck": {
+        "TableName": table_name,
+        "Key": {"device_id": {"S": device_id}, "bucket": {"S": CURSOR}},
+        **_cursor_condition(cursor),
+    }}
+    puts = []
+    for key, row in sorted(rows.items()):
+        item = {
+            "device_id": {"S": device_id}, "bucket": {"S": key},
+            "runtime_seconds": {"N": str(round(row["runtime_seconds"], 6))},
+            "cycles": {"N": str(row["cycles"])},
+            "event_count": {"N": str(row["event_count"])},
+        }
+        if row["last_state"] is not None:
+            item["last_state"] = {"S": row["last_state"]}
+            item["last_timestamp"] = {"N": str(row["last_timestamp"])}
+        puts.append({"Put": {"TableName": table_name, "Item": item}})
+    return [[check] + puts[first:first + max_items] for first in range(0, len(puts), max_items)]
+
+
+def read_rollups(client, table_name, device_id, granularity, start, end):
+    """
+    Rollups of one device for the buckets covering [start, end), oldest first:
+    one query over O(buckets) items, however many raw events they summarize.
+    """
+    size, _ = GRANULARITIES[granularity]
+    kwargs = {
+        "TableName": table_name,
+        "KeyConditionExpression": "device_id = :d AND #b BETWEEN :lo AND :hi",
+        "ExpressionAttributeNames": {"#b": "bucket"},
+        "ExpressionAttributeValues": {
+            ":d": {"S": device_id},
+            ":lo": {"S": bucket_key(granularity, start)},
+            ":hi": {"S": bucket_key(granularity, max(start, end - 1))},
+        },
+    }
+    rows = []
+    while True:
+        response = client.query(**kwargs)
+        for item in response.get("Items", []):
+            rows.append({
+                "bucket": item["bucket"]["S"],
+                "runtime_seconds": float(item.get("runtime_seconds", {}).get("N", "0")),
+                "cycles": int(item.get("cycles", {}).get("N", "0")),
+                "event_count": int(item.get("event_count", {}).get("N", "0")),
+                "last_state": item.get("last_state", {}).get("S"),
+                "last_timestamp": float(item["last_timestamp"]["N"]) if "last_timestamp" in item else None,
+            })
+        if "LastEvaluatedKey" not in response:
+            return rows
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
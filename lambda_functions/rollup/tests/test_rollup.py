@@ -0,0 +1,259 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+from functools import partial
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botocore.exceptions import ClientError
+
+import index
+import rollups
+from rollups import CURSOR, HOURLY, DAILY, read_rollups
+
+TABLE = "rollups"
+EVENTS = "events"
+START = 1700000000 - 1700000000 % 86400  # midnight UTC
+
+
+class InMemoryRollupClient:
+    """The DynamoDB client calls of the rollup Lambda, conditions included, and the events it reads back"""
+
+    def __init__(self):
+        self.items = {}
+        self.events = {}
+        self.transactions = 0
+
+    def store_events(self, records):
+        """What the events table holds for the stream records it emitted"""
+        for record in records:
+            image = record["dynamodb"]["NewImage"]
+            self.events.setdefault(image["device_id"]["S"], {})[float(image["timestamp"]["N"])] = image
+
+    def get_item(self, TableName, Key, ConsistentRead=False):
+        item = self.items.get((Key["device_id"]["S"], Key["bucket"]["S"]))
+        return {"Item": dict(item)} if item else {}
+
+    def cursor_holds(self, device_id, condition):
+        current = self.items.get((device_id, CURSOR))
+        if condition["ConditionExpression"] == "attribute_not_exists(device_id)":
+            return current is None
+        values = condition["ExpressionAttributeValues"]
+        holds = current is not None and float(current["last_timestamp"]["N"]) == float(values[":previous"]["N"])
+        if ":until" in values:
+            return holds and float(current.get("runtime_until", {"N": "nan"})["N"]) == float(values[":until"]["N"])
+        return holds and "runtime_until" not in current
+
+    def transact_write_items(self, TransactItems):
+        first = TransactItems[0].get("Put") or TransactItems[0]["ConditionCheck"]
+        if not self.cursor_holds((first.get("Item") or first["Key"])["device_id"]["S"], first):
+            raise ClientError({"Error": {"Code": "TransactionCanceledException"}}, "TransactWriteItems")
+
+        self.transactions += 1
+        for entry in TransactItems:
+            if "Put" in entry:
+                item = entry["Put"]["Item"]
+                self.items[(item["device_id"]["S"], item["bucket"]["S"])] = dict(item)
+            if "Update" not in entry:
+                continue
+            update = entry["Update"]
+            key = (update["Key"]["device_id"]["S"], update["Key"]["bucket"]["S"])
+            item = self.items.setdefault(key, dict(update["Key"]))
+            values = update["ExpressionAttributeValues"]
+            for name, placeholder in (
+                ("runtime_seconds", ":runtime"), ("cycles", ":cycles"), ("event_count", ":events")
+            ):
+                item[name] = {"N": str(Decimal(item.get(name, {"N": "0"})["N"]) + Decimal(values[placeholder]["N"]))}
+            if ":state" in values:
+                item["last_state"], item["last_timestamp"] = values[":state"], values[":timestamp"]
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, **kwargs):
+        values = ExpressionAttributeValues
+        device_id = values[":d"]["S"]
+        if TableName == EVENTS:
+            events = sorted(self.events.get(device_id, {}).items())
+            if ":start" in values:  # the last event before the range
+                return {"Items": [image for ts, image in events if ts < float(values[":start"]["N"])][-1:]}
+            low, high = float(values[":lo"]["N"]), float(values[":hi"]["N"])
+            return {"Items": [image for ts, image in events if low <= ts <= high]}
+        low, high = values[":lo"]["S"], values[":hi"]["S"]
+        rows = [item for (pk, sk), item in sorted(self.items.items()) if pk == device_id and low <= sk <= high]
+        return {"Items": rows}
+
+
+def record(device_id, timestamp, voltage, sequence, event_name="INSERT"):
+    return {
+        "eventName": event_name,
+        "dynamodb": {
+            "SequenceNumber": str(sequence),
+            "NewImage": {
+                "device_id": {"S": device_id},
+                "timestamp": {"N": timestamp if isinstance(timestamp, str) else str(timestamp)},
+                "status": {"S": "ACTIVE" if voltage else "INACTIVE"},
+                "sensor_voltage": {"N": str(voltage)},
+            },
+        },
+    }
+
+
+class TestRollup(unittest.TestCase):
+
+    def setUp(self):
+        self.client = InMemoryRollupClient()
+        patcher = patch.multiple(index, dynamodb=self.client, ROLLUP_TABLE=TABLE, EVENTS_TABLE=EVENTS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def handle(self, event, context=None):
+        self.client.store_events(event["Records"])
+        return index.lambda_handler(event, context)
+
+    def rows(self, granularity, start, end, device_id="pump-1"):
+        return {row["bucket"]: row for row in read_rollups(self.client, TABLE, device_id, granularity, start, end)}
+
+    def test_runtime_and_cycles_are_split_across_hour_buckets(self):
+        # On 00:50-01:10 and 02:00-02:05 (heartbeats every 10 min), off otherwise
+        events = [(50, 1), (60, 1), (70, 0), (120, 1), (125, 0)]
+        self.handle({"Records": [
+            record("pump-1", START + minute * 60, voltage, n) for n, (minute, voltage) in enumerate(events)
+        ]}, None)
+
+        hours = self.rows(HOURLY, START, START + 86400)
+        self.assertEqual([hours[key]["runtime_seconds"] for key in sorted(hours)], [600, 600, 300])
+        self.assertEqual([hours[key]["cycles"] for key in sorted(hours)], [1, 0, 1])
+        self.assertEqual(hours[sorted(hours)[-1]]["last_state"], "OFF")
+
+        day = self.rows(DAILY, START, START + 86400)
+        self.assertEqual(len(day), 1)
+        self.assertEqual(list(day.values())[0]["runtime_seconds"], 1500)
+        self.assertEqual(list(day.values())[0]["cycles"], 2)
+        self.assertEqual(list(day.values())[0]["event_count"], 5)
+
+    def test_redelivered_batches_are_not_double_counted(self):
+        batch = {"Records": [record("pump-1", START, 1, 1), record("pump-1", START + 600, 0, 2)]}
+        self.handle(batch, None)
+        self.handle(batch, None)
+        # A retried batch overlapping new records only applies the new ones
+        self.handle({"Records": batch["Records"] + [record("pump-1", START + 900, 1, 3)]}, None)
+
+        day = list(self.rows(DAILY, START, START + 86400).values())[0]
+        self.assertEqual(day["runtime_seconds"], 600)
+        self.assertEqual(day["cycles"], 2)
+        self.assertEqual(day["event_count"], 3)
+        self.assertEqual(self.client.transactions, 2)
+
+    def test_late_events_are_folded_in_as_if_they_came_in_order(self):
+        # Live: on at 08:00, off at 10:00. The outbox backlog then replays
+        # off at 08:30 and on again at 09:00, sent while the edge was offline
+        live = [record("pump-1", START + 8 * 3600, 1, 1), record("pump-1", START + 10 * 3600, 0, 2)]
+        backlog = [record("pump-1", START + 8 * 3600 + 1800, 0, 3), record("pump-1", START + 9 * 3600, 1, 4)]
+        self.handle({"Records": live}, None)
+        self.handle({"Records": backlog}, None)
+
+        hours = self.rows(HOURLY, START, START + 86400)
+        self.assertEqual([row["runtime_seconds"] for row in hours.values()], [1800, 3600, 0])
+        self.assertEqual([row["cycles"] for row in hours.values()], [1, 1, 0])
+        day = list(self.rows(DAILY, START, START + 86400).values())[0]
+        self.assertEqual((day["runtime_seconds"], day["cycles"], day["event_count"]), (5400, 2, 4))
+
+        in_order = InMemoryRollupClient()
+        with patch.object(index, "dynamodb", in_order):
+            index.lambda_handler({"Records": [live[0], backlog[0], backlog[1], live[1]]}, None)
+        expected = read_rollups(in_order, TABLE, "pump-1", HOURLY, START, START + 86400)
+        self.assertEqual(list(hours.values()), expected)
+
+        # A redelivered backlog changes nothing and writes nothing
+        transactions = self.client.transactions
+        self.handle({"Records": backlog}, None)
+        self.assertEqual(self.client.transactions, transactions)
+
+    def test_silence_longer_than_the_gap_is_not_runtime(self):
+        self.handle({"Records": [
+            record("pump-1", START, 1, 1),
+            record("pump-1", START + 2 * 86400, 1, 2),  # a missed daily heartbeat
+            record("pump-1", START + 2 * 86400 + 300, 0, 3),
+        ]}, None)
+
+        days = list(self.rows(DAILY, START, START + 3 * 86400).values())
+        self.assertEqual([day["runtime_seconds"] for day in days], [0, 300])
+        self.assertEqual([day["cycles"] for day in days], [1, 1])
+
+    def test_events_within_one_second_are_all_applied(self):
+        # Payload 2.0 keys: milliseconds and sequence number as decimals
+        self.handle({"Records": [
+            record("pump-1", f"{START}.250000", 1, 1),
+            record("pump-1", f"{START}.250001", 0, 2),
+            record("pump-1", f"{START}.750002", 1, 3),
+        ]}, None)
+        self.handle({"Records": [record("pump-1", START + 1, 0, 4)]}, None)
+
+        day = list(self.rows(DAILY, START, START + 86400).values())[0]
+        self.assertEqual(day["event_count"], 4)
+        self.assertEqual(day["cycles"], 2)
+        self.assertAlmostEqual(day["runtime_seconds"], 0.249999)
+
+    def test_change_only_run_of_hours_is_counted(self):
+        # As the edge publishes: on at 08:00, off at 10:00, nothing in between
+        self.handle({"Records": [
+            record("pump-1", START + 8 * 3600, 1, 1), record("pump-1", START + 10 * 3600, 0, 2),
+        ]}, None)
+
+        hours = self.rows(HOURLY, START, START + 86400)
+        self.assertEqual([row["runtime_seconds"] for row in hours.values()], [3600, 3600, 0])
+        self.assertEqual(list(self.rows(DAILY, START, START + 86400).values())[0]["runtime_seconds"], 7200)
+
+    def test_run_over_too_many_buckets_is_split_across_transactions(self):
+        # 22 hours on, with room for 10 buckets per transaction
+        with patch.object(index, "accumulate", partial(rollups.accumulate, max_buckets=10)):
+            self.handle({"Records": [
+                record("pump-1", START + 8 * 3600, 1, 1), record("pump-1", START + 30 * 3600, 0, 2),
+            ]}, None)
+
+        hours = self.rows(HOURLY, START, START + 2 * 86400)
+        self.assertEqual(len(hours), 23)
+        self.assertEqual(sum(row["runtime_seconds"] for row in hours.values()), 22 * 3600)
+        self.assertEqual([row["runtime_seconds"] for row in self.rows(DAILY, START, START + 2 * 86400).values()],
+                         [16 * 3600, 6 * 3600])
+        self.assertGreater(self.client.transactions, 3)
+        self.assertIsNone(index.read_cursor("pump-1").runtime_until)
+
+    def test_failed_device_is_reported_from_its_oldest_record(self):
+        original = self.client.transact_write_items
+
+        def flaky(TransactItems):
+            if TransactItems[0]["Put"]["Item"]["device_id"]["S"] == "pump-2":
+                raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "TransactWriteItems")
+            return original(TransactItems)
+
+        self.client.transact_write_items = flaky
+        response = self.handle({"Records": [
+            record("pump-1", START, 1, 10), record("pump-2", START, 1, 11), record("pump-2", START + 60, 0, 12),
+        ]}, None)
+
+        self.assertEqual(response["batchItemFailures"], [{"itemIdentifier": "11"}])
+        self.assertEqual(len(self.rows(DAILY, START, START + 86400)), 1)
+
+    def test_cursor_moved_concurrently_is_reread(self):
+        self.handle({"Records": [record("pump-1", START, 1, 1)]}, None)
+        stale = index.read_cursor("pump-1")
+        original = index.read_cursor
+        reads = []
+
+        def stale_once(device_id):
+            reads.append(device_id)
+            return stale if len(reads) == 1 else original(device_id)
+
+        # Another invocation applies START+300 between this one's read and write
+        with patch.object(index, "read_cursor", side_effect=stale_once):
+            self.client.transact_write_items(TransactItems=index.transaction_items(
+                TABLE, "pump-1", stale, index.Cursor(START + 300, "ON"), {}))
+            self.handle({"Records": [record("pump-1", START + 600, 0, 2)]}, None)
+
+        self.assertEqual(len(reads), 2)
+        self.assertEqual(index.read_cursor("pump-1"), index.Cursor(START + 600, "OFF"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,14 @@
-import boto3
+import argparse
+import csv
 import json
 import os
+import random
+import re
+import shutil
+import threading
+import time
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # --- CONFIGURATION ---
 THING_NAME = "heating-pump-pi-01"
@@ -9,40 +16,93 @@ POLICY_NAME = "HeatingSystemPolicy"
 REGION = "eu-west-2"  # London region
 CERTS_DIR = "hardware/certs"
 
-iot_client = boto3.client('iot', region_name=REGION)
+# --- BULK MODE (--manifest) ---
+FLEET_POLICY_NAME = "HeatingFleetPolicy"
+FLEET_CERTS_DIR = "hardware/certs/fleet"
+STATE_FILE = "provision_state.json"
+DEFAULT_WORKERS = 8
+
+ROOT_CA_URL = "https://www.amazontrust.com/repository/AmazonRootCA1.pem"
+ROOT_CA_FILE = "AmazonRootCA1.pem"
+
+# IoT control-plane APIs throttle at a few to a few dozen calls per second
+THROTTLING_CODES = {"ThrottlingException", "TooManyRequestsException", "RequestLimitExceeded",
+                    "LimitExceededException", "ServiceUnavailableException"}
+MAX_RETRIES = 6
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 20.0
+
+THING_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9:_-]{1,128}$")
+
+# Created on first use, so the bulk mode can be driven by a stubbed client
+iot_client = None
+
+
+def get_iot_client():
+    global iot_client
+    if iot_client is None:
+        import boto3
+        iot_client = boto3.client('iot', region_name=REGION)
+    return iot_client
 
 def create_directory():
     if not os.path.exists(CERTS_DIR):
         os.makedirs(CERTS_DIR)
         print(f"Directory created: {CERTS_DIR}")
 
-def create_policy():
-    """Creates the policy (with least privilege permissions)"""
-    policy_document = {
+def policy_document(client_resources):
+    """Least privilege: connect as the given client ids, publish status, receive commands"""
+    return {
         "Version": "2012-10-17",
         "Statement": [
             {
                 "Effect": "Allow",
                 "Action": ["iot:Connect"],
-                "Resource": f"arn:aws:iot:{REGION}:*:client/{THING_NAME}"
+                "Resource": client_resources
             },
             {
                 "Effect": "Allow",
                 "Action": ["iot:Publish"],
-                "Resource": f"arn:aws:iot:{REGION}:*:topic/home/heating/status"
+                "Resource": [
+                    f"arn:aws:iot:{REGION}:*:topic/home/heating/status",
+                    f"arn:aws:iot:{REGION}:*:topic/home/heating/status/*",
+                    f"arn:aws:iot:{REGION}:*:topic/home/heating/binary/status",
+                    f"arn:aws:iot:{REGION}:*:topic/home/heating/binary/status/*",
+                    f"arn:aws:iot:{REGION}:*:topic/home/heating/telemetry"
+                ]
+            },
+            {
+                "Effect": "Allow",
+                "Action": ["iot:Subscribe"],
+                "Resource": [
+                    f"arn:aws:iot:{REGION}:*:topicfilter/home/heating/commands",
+                    f"arn:aws:iot:{REGION}:*:topicfilter/home/heating/commands/*"
+                ]
             },
             {
                 "Effect": "Allow",
-                "Action": ["iot:Subscribe", "iot:Receive"],
-                "Resource": f"arn:aws:iot:{REGION}:*:topicfilter/home/heating/commands" 
+                "Action": ["iot:Receive"],
+                "Resource": [
+                    f"arn:aws:iot:{REGION}:*:topic/home/heating/commands",
+                    f"arn:aws:iot:{REGION}:*:topic/home/heating/commands/*"
+                ]
             }
         ]
     }
-    
+
+def create_policy():
+    """Creates the policy (with least privilege permissions)"""
+    document = policy_document([
+        f"arn:aws:iot:{REGION}:*:client/{THING_NAME}",
+        # Gateway mode: pooled connections are <thing>-0, <thing>-1, ...
+        f"arn:aws:iot:{REGION}:*:client/{THING_NAME}-*"
+    ])
+
+    iot_client = get_iot_client()
     try:
         iot_client.create_policy(
             policyName=POLICY_NAME,
-            policyDocument=json.dumps(policy_document)
+            policyDocument=json.dumps(document)
         )
         print(f"Policy created: {POLICY_NAME}")
     except iot_client.exceptions.ResourceAlreadyExistsException:
@@ -50,54 +110,237 @@ def create_policy():
 
 def create_thing():
     """Creates the digital device (Thing)"""
+    iot_client = get_iot_client()
     try:
         iot_client.create_thing(thingName=THING_NAME)
         print(f"Thing created: {THING_NAME}")
     except iot_client.exceptions.ResourceAlreadyExistsException:
         print(f"Thing already exists: {THING_NAME}")
 
+def write_certificate_files(directory, response):
+    """Saves what create_keys_and_certificate returned; the private key is only ever returned once"""
+    with open(f"{directory}/certificate.pem.crt", "w") as f:
+        f.write(response['certificatePem'])
+    with open(f"{directory}/private.pem.key", "w") as f:
+        f.write(response['keyPair']['PrivateKey'])
+    os.chmod(f"{directory}/private.pem.key", 0o600)
+    with open(f"{directory}/public.pem.key", "w") as f:
+        f.write(response['keyPair']['PublicKey'])
+
 def create_certificates():
     """Generates keys and certificate, then saves them"""
-    response = iot_client.create_keys_and_certificate(setAsActive=True)
-    certificate_arn = response['certificateArn']
-    certificate_pem = response['certificatePem']
-    key_public = response['keyPair']['PublicKey']
-    key_private = response['keyPair']['PrivateKey']
-
-    with open(f"{CERTS_DIR}/certificate.pem.crt", "w") as f:
-        f.write(certificate_pem)
-    with open(f"{CERTS_DIR}/private.pem.key", "w") as f:
-        f.write(key_private)
-    with open(f"{CERTS_DIR}/public.pem.key", "w") as f:
-        f.write(key_public)
-        
+    response = get_iot_client().create_keys_and_certificate(setAsActive=True)
+    write_certificate_files(CERTS_DIR, response)
     print(f"Certificates saved to: {CERTS_DIR}")
-    return certificate_arn
+    return response['certificateArn']
 
 def attach_everything(cert_arn):
     """Attaches Policy, Thing, and Cert"""
+    iot_client = get_iot_client()
     iot_client.attach_policy(policyName=POLICY_NAME, target=cert_arn)
     print("Policy attached to certificate")
 
     iot_client.attach_thing_principal(thingName=THING_NAME, principal=cert_arn)
     print("Thing attached to certificate")
 
-def download_root_ca():
-    """Downloads Amazon Root CA 1 (required for TLS handshake)"""
-    url = "https://www.amazontrust.com/repository/AmazonRootCA1.pem"
-    destination = f"{CERTS_DIR}/AmazonRootCA1.pem"
-    urllib.request.urlretrieve(url, destination)
+def download_root_ca(destination=f"{CERTS_DIR}/{ROOT_CA_FILE}"):
+    """Downloads Amazon Root CA 1 (required for TLS handshake), unless it is already there"""
+    if os.path.exists(destination) and os.path.getsize(destination) > 0:
+        print(f"Root CA already present: {destination}")
+        return destination
+    urllib.request.urlretrieve(ROOT_CA_URL, destination)
     print(f"Root CA downloaded: {destination}")
+    return destination
 
 def get_iot_endpoint():
     """Retrieves the unique IoT endpoint"""
-    response = iot_client.describe_endpoint(endpointType='iot:Data-ATS')
+    response = get_iot_client().describe_endpoint(endpointType='iot:Data-ATS')
     endpoint = response['endpointAddress']
     print(f"\nYOUR ENDPOINT (Save it!): {endpoint}")
     with open(f"{CERTS_DIR}/iot_config.json", "w") as f:
         json.dump({"endpoint": endpoint, "thing_name": THING_NAME}, f, indent=4)
 
-if __name__ == "__main__":
+
+# --- BULK PROVISIONING ---
+
+def error_code(error):
+    """The AWS error code of a botocore ClientError, or None for anything else"""
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+def call_with_backoff(operation, *args, sleep=time.sleep, **kwargs):
+    """Calls an IoT API, retrying throttled calls with exponential backoff and full jitter"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return operation(*args, **kwargs)
+        except Exception as e:
+            if error_code(e) not in THROTTLING_CODES or attempt == MAX_RETRIES:
+                raise
+            sleep(random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt)))
+
+def read_manifest(path):
+    """
+    Devices to provision, from CSV (a `thing_name` column, other columns are
+    optional, e.g. location,pin) or JSON (a list of names or of objects).
+    """
+    with open(path, newline="") as f:
+        if path.endswith(".json"):
+            devices = [{"thing_name": d} if isinstance(d, str) else d for d in json.load(f)]
+        else:
+            devices = [{k: v for k, v in row.items() if v not in (None, "")} for row in csv.DictReader(f)]
+
+    seen = set()
+    for device in devices:
+        name = device.get("thing_name", "")
+        if not THING_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid thing name in manifest: {name!r}")
+        if name in seen:
+            raise ValueError(f"Duplicate thing name in manifest: {name}")
+        seen.add(name)
+    return devices
+
+
+class ProvisioningState:
+    """
+    Progress of a bulk run, saved after every step so an interrupted run
+    resumes where it stopped instead of creating a second certificate.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"endpoint": None, "devices": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data.update(json.load(f))
+
+    def device(self, name):
+        with self._lock:
+            return dict(self.data["devices"].get(name, {}))
+
+    def update(self, name, **fields):
+        with self._lock:
+            self.data["devices"].setdefault(name, {}).update(fields)
+            self._save()
+
+    def set_endpoint(self, endpoint):
+        with self._lock:
+            self.data["endpoint"] = endpoint
+            self._save()
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class FleetProvisioner:
+    """
+    Provisions many things concurrently, at most `workers` at a time. Every
+    device gets its own certificate, attached to one shared fleet policy, and
+    a bundle directory (`out_dir/<thing_name>`) with its keys, the root CA and
+    an iot_config.json ready to copy to the device.
+    """
+
+    def __init__(self, client, state, out_dir=FLEET_CERTS_DIR, policy_name=FLEET_POLICY_NAME,
+                 workers=DEFAULT_WORKERS, sleep=time.sleep, root_ca_path=None):
+        self.client = client
+        self.state = state
+        self.out_dir = out_dir
+        self.policy_name = policy_name
+        self.workers = workers
+        self.sleep = sleep
+        self.root_ca_path = root_ca_path or os.path.join(out_dir, ROOT_CA_FILE)
+        self.endpoint = None
+
+    def call(self, operation, **kwargs):
+        return call_with_backoff(getattr(self.client, operation), sleep=self.sleep, **kwargs)
+
+    def prepare(self):
+        """Fleet policy, endpoint and root CA, each fetched once and reused on later runs"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        # The client id must be the thing name, or start with it for gateway connections
+        document = policy_document([
+            f"arn:aws:iot:{REGION}:*:client/${{iot:Connection.Thing.ThingName}}",
+            f"arn:aws:iot:{REGION}:*:client/${{iot:Connection.Thing.ThingName}}-*"
+        ])
+        try:
+            self.call("create_policy", policyName=self.policy_name, policyDocument=json.dumps(document))
+            print(f"Policy created: {self.policy_name}")
+        except Exception as e:
+            if error_code(e) != "ResourceAlreadyExistsException":
+                raise
+            print(f"Policy already exists: {self.policy_name}")
+
+        self.endpoint = self.state.data.get("endpoint")
+        if not self.endpoint:
+            self.endpoint = self.call("describe_endpoint", endpointType='iot:Data-ATS')['endpointAddress']
+            self.state.set_endpoint(self.endpoint)
+        download_root_ca(self.root_ca_path)
+
+    def provision(self, device):
+        """Runs the missing steps for one device; returns "done" or "skipped" (already complete)"""
+        name = device["thing_name"]
+        bundle = os.path.join(self.out_dir, name)
+        record = self.state.device(name)
+        if record.get("status") == "done" and os.path.exists(os.path.join(bundle, "iot_config.json")):
+            return "skipped"
+        os.makedirs(bundle, exist_ok=True)
+
+        if not record.get("thing"):
+            attributes = {k: str(v) for k, v in device.items() if k != "thing_name"}
+            try:
+                self.call("create_thing", thingName=name, attributePayload={"attributes": attributes})
+            except Exception as e:
+                if error_code(e) != "ResourceAlreadyExistsException":
+                    raise
+            self.state.update(name, thing=True)
+
+        certificate_arn = record.get("certificate_arn")
+        if not certificate_arn:
+            response = self.call("create_keys_and_certificate", setAsActive=True)
+            write_certificate_files(bundle, response)
+            certificate_arn = response['certificateArn']
+            self.state.update(name, certificate_arn=certificate_arn, certificate_id=response['certificateId'])
+        elif not os.path.exists(os.path.join(bundle, "private.pem.key")):
+            raise RuntimeError(f"Private key of {record.get('certificate_id')} is lost: "
+                               f"revoke that certificate and remove {name} from {self.state.path}")
+
+        if not record.get("attached"):
+            # Both calls succeed again if the attachment already exists
+            self.call("attach_policy", policyName=self.policy_name, target=certificate_arn)
+            self.call("attach_thing_principal", thingName=name, principal=certificate_arn)
+            self.state.update(name, attached=True)
+
+        shutil.copyfile(self.root_ca_path, os.path.join(bundle, ROOT_CA_FILE))
+        config = {"endpoint": self.endpoint, "thing_name": name, "device_id": name}
+        config.update({k: device[k] for k in ("location", "pin") if k in device})
+        if "pin" in config:
+            config["pin"] = int(config["pin"])
+        with open(os.path.join(bundle, "iot_config.json"), "w") as f:
+            json.dump(config, f, indent=4)
+        self.state.update(name, status="done", error=None)
+        return "done"
+
+    def run(self, devices):
+        """Provisions all devices; failures are recorded per device and do not stop the others"""
+        self.prepare()
+        summary = {"done": 0, "skipped": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.provision, device): device["thing_name"] for device in devices}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    self.state.update(name, status="failed", error=str(e))
+                    print(f"❌ {name}: {e}")
+                    outcome = "failed"
+                summary[outcome] += 1
+        return summary
+
+
+def provision_single():
     print("Starting IoT Provisioning...")
     create_directory()
     create_policy()
@@ -106,4 +349,27 @@ if __name__ == "__main__":
     attach_everything(cert_arn)
     download_root_ca()
     get_iot_endpoint()
-    print("\nSUCCESS! Hardware keys are ready in the 'hardware/certs' folder.")
\ No newline at end of file
+    print("\nSUCCESS! Hardware keys are ready in the 'hardware/certs' folder.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Provision heating monitor devices in AWS IoT")
+    parser.add_argument("--manifest", help="CSV or JSON list of devices; provisions the single THING_NAME if omitted")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="devices provisioned in parallel")
+    parser.add_argument("--state", default=STATE_FILE, help="progress file that makes reruns resume")
+    parser.add_argument("--out", default=FLEET_CERTS_DIR, help="directory for the per-device bundles")
+    args = parser.parse_args(argv)
+
+    if not args.manifest:
+        provision_single()
+        return
+
+    devices = read_manifest(args.manifest)
+    print(f"Provisioning {len(devices)} devices with {args.workers} workers...")
+    provisioner = FleetProvisioner(get_iot_client(), ProvisioningState(args.state), args.out, workers=args.workers)
+    summary = provisioner.run(devices)
+    print(f"\nDone: {summary['done']}, already provisioned: {summary['skipped']}, failed: {summary['failed']}")
+    if summary["failed"]:
+        print(f"Rerun the same command to retry the failed devices (progress is kept in {args.state}).")
+
+if __name__ == "__main__":
+    main()
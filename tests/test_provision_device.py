@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+import threading
+from collections import Counter
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import provision_device
+from provision_device import FleetProvisioner, ProvisioningState, read_manifest
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "operation")
+
+
+class StubIotClient:
+    """Just the IoT calls the bulk mode makes; `throttle` makes the first N calls of an API fail"""
+
+    def __init__(self, throttle=None, fail_things=()):
+        self.calls = Counter()
+        self.throttle = Counter(throttle or {})
+        self.fail_things = set(fail_things)
+        self.things = set()
+        self.attachments = set()
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+            if self.throttle[operation] > 0:
+                self.throttle[operation] -= 1
+                raise client_error("ThrottlingException")
+            return self.calls[operation]
+
+    def create_policy(self, policyName, policyDocument):
+        self._call("create_policy")
+        raise client_error("ResourceAlreadyExistsException")
+
+    def describe_endpoint(self, endpointType):
+        self._call("describe_endpoint")
+        return {"endpointAddress": "abc-ats.iot.eu-west-2.amazonaws.com"}
+
+    def create_thing(self, thingName, attributePayload):
+        self._call("create_thing")
+        if thingName in self.fail_things:
+            raise client_error("InvalidRequestException")
+        self.things.add(thingName)
+
+    def create_keys_and_certificate(self, setAsActive):
+        n = self._call("create_keys_and_certificate")
+        return {
+            "certificateArn": f"arn:aws:iot:eu-west-2:1:cert/{n}",
+            "certificateId": str(n),
+            "certificatePem": f"CERT {n}",
+            "keyPair": {"PublicKey": f"PUB {n}", "PrivateKey": f"KEY {n}"},
+        }
+
+    def attach_policy(self, policyName, target):
+        self._call("attach_policy")
+
+    def attach_thing_principal(self, thingName, principal):
+        self._call("attach_thing_principal")
+        self.attachments.add((thingName, principal))
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    manifest = tmp_path / "devices.csv"
+    manifest.write_text("thing_name,location,pin\n" + "".join(f"boiler-{n:03d},Flat {n},17\n" for n in range(40)))
+    out = tmp_path / "bundles"
+    out.mkdir()
+    (out / "AmazonRootCA1.pem").write_text("ROOT CA")  # cached: nothing is downloaded
+    return read_manifest(str(manifest)), str(out), str(tmp_path / "state.json")
+
+
+def test_bulk_run_provisions_every_device_with_its_own_bundle(fleet):
+    devices, out, state_path = fleet
+    client = StubIotClient(throttle={"create_keys_and_certificate": 5, "attach_policy": 3})
+    provisioner = FleetProvisioner(client, ProvisioningState(state_path), out, workers=8, sleep=lambda s: None)
+
+    summary = provisioner.run(devices)
+
+    assert summary == {"done": 40, "skipped": 0, "failed": 0}
+    assert client.calls["create_keys_and_certificate"] == 40 + 5  # throttled calls were retried
+    assert client.calls["describe_endpoint"] == 1
+    assert len(client.attachments) == 40
+
+    bundle = os.path.join(out, "boiler-007")
+    assert sorted(os.listdir(bundle)) == ["AmazonRootCA1.pem", "certificate.pem.crt", "iot_config.json",
+                                          "private.pem.key", "public.pem.key"]
+    with open(os.path.join(bundle, "iot_config.json")) as f:
+        config = json.load(f)
+    assert config == {"endpoint": "abc-ats.iot.eu-west-2.amazonaws.com", "thing_name": "boiler-007",
+                      "device_id": "boiler-007", "location": "Flat 7", "pin": 17}
+
+
+def test_rerun_resumes_failed_devices_without_new_certificates(fleet):
+    devices, out, state_path = fleet
+    client = StubIotClient(fail_things={"boiler-003"})
+    summary = FleetProvisioner(client, ProvisioningState(state_path), out, sleep=lambda s: None).run(devices)
+    assert summary["failed"] == 1
+
+    client.fail_things.clear()
+    client.calls.clear()
+    summary = FleetProvisioner(client, ProvisioningState(state_path), out, sleep=lambda s: None).run(devices)
+
+    assert summary == {"done": 1, "skipped": 39, "failed": 0}
+    assert client.calls["create_keys_and_certificate"] == 1
+    assert client.calls["describe_endpoint"] == 0  # endpoint cached in the state file
+
+
+def test_persistent_throttling_gives_up_after_max_retries(fleet, monkeypatch):
+    devices, out, state_path = fleet
+    monkeypatch.setattr(provision_device, "MAX_RETRIES", 2)
+    client = StubIotClient(throttle={"create_thing": 1000})
+
+    summary = FleetProvisioner(client, ProvisioningState(state_path), out, sleep=lambda s: None).run(devices[:2])
+
+    assert summary["failed"] == 2
+    assert client.calls["create_thing"] == 2 * 3
+    assert "ThrottlingException" in ProvisioningState(state_path).device("boiler-000")["error"]
+
+
+def test_manifest_rejects_duplicates(tmp_path):
+    manifest = tmp_path / "devices.json"
+    manifest.write_text(json.dumps(["boiler-a", {"thing_name": "boiler-a"}]))
+
+    with pytest.raises(ValueError):
+        read_manifest(str(manifest))